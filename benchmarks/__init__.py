@@ -0,0 +1,6 @@
+"""
+benchmarks of the ha_mqtt package, run them with `python -m benchmarks.<name>`
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
@@ -0,0 +1,72 @@
+"""
+in-process stand-in for the paho client, so the benchmarks measure the library and not the network
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+from typing import Any, Optional
+
+from ha_mqtt.publisher import PayloadType
+
+
+class FakeInfo:
+    """
+    message info of a message that is acknowledged right away
+    """
+
+    __slots__ = ("mid",)
+
+    def __init__(self, mid: int):
+        self.mid = mid
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        """
+        returns immediately, the message is already acknowledged
+        """
+
+    def is_published(self) -> bool:
+        """
+        :return: always True
+        """
+        return True
+
+
+class FakeClient:  # pylint: disable=W0613
+    """
+    client that counts and discards all messages
+    """
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.subscribed = 0
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> FakeInfo:
+        """
+        counts the message
+        """
+        self.published += 1
+        return FakeInfo(self.published & 0xFFFF)
+
+    def subscribe(self, topic: Any) -> Any:
+        """
+        counts the subscription
+        """
+        self.subscribed += 1
+        return 0, self.subscribed
+
+    def unsubscribe(self, topic: Any) -> Any:
+        """
+        discards the unsubscription
+        """
+        return 0, self.subscribed
+
+    def message_callback_add(self, sub: str, callback: Any) -> None:
+        """
+        discards the callback
+        """
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        discards the callback
+        """
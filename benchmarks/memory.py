@@ -0,0 +1,70 @@
+"""
+measures the memory used per entity, in the default and in the compact mode.
+
+run with `python -m benchmarks.memory [number of entities]`
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import gc
+import itertools
+import sys
+import tracemalloc
+from typing import List
+
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.util import HaSensorDeviceClass
+
+from .fake_client import FakeClient
+
+# entity names are unique per run, as loggers created by an earlier run would not be counted otherwise
+_runs = itertools.count()
+
+
+def bytes_per_entity(count: int, compact: bool) -> float:
+    """
+    creates and starts `count` sensors and measures the memory allocated for them
+
+    :param count: number of entities to create
+    :param compact: True to enable the compact mode
+    :return: allocated bytes per entity
+    """
+    MqttDeviceBase.set_compact(compact)
+    # the client doubles as publisher, which skips the throttling sleep after each message
+    client = FakeClient()
+    run = next(_runs)
+    devices = [HaDevice(f"device {i}", f"bench_device_{i}") for i in range(max(1, count // 10))]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    entities: List[MqttSensor] = []
+    for i in range(count):
+        settings = MqttDeviceSettings(f"sensor {run} {i}", f"bench_sensor_{run}_{i}", client,
+                                      devices[i % len(devices)], publisher=client)
+        entity = MqttSensor(settings, HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+        entity.start()
+        entities.append(entity)
+
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    MqttDeviceBase.set_compact(False)
+    return used / count
+
+
+def main() -> None:
+    """
+    prints the memory per entity for both modes
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    for compact in (False, True):
+        print(f"compact={compact!s:5} entities={count}: {bytes_per_entity(count, compact):8.0f} bytes/entity")
+
+
+if __name__ == "__main__":
+    main()
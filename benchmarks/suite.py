@@ -0,0 +1,266 @@
+"""
+benchmark suite measuring discovery, state updates, command dispatch and memory at different entity counts.
+
+run with `python -m benchmarks.suite`, see `--help` for the options.
+The results are stored as json, so runs of different releases can be compared with `--compare`
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import argparse
+import json
+import platform
+import threading
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from ha_mqtt.bulk import update_states
+from ha_mqtt.discovery import start_all
+from ha_mqtt.executor import CallbackExecutor
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.loopback import LoopbackBroker
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.util import HaSensorDeviceClass
+
+from .fake_client import FakeClient
+from .memory import bytes_per_entity
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_SIZES = (10, 1_000, 100_000)
+MAX_COMMANDS = 1_000
+"""
+commands sent per measurement, one per switch at most
+"""
+MAX_THROTTLED = 100
+"""
+entities started per measurement without a publisher, each of them sleeps after its discovery message
+"""
+
+Results = Dict[str, Dict[str, float]]
+
+
+def _version() -> str:
+    """
+    :return: installed version of the package, 'dev' if it runs from a checkout
+    """
+    try:
+        return metadata.version("homeassistant-mqtt-binding")
+    except metadata.PackageNotFoundError:
+        return "dev"
+
+
+class _FakeMessage:  # pylint: disable=R0903
+    """
+    received message as handed to the paho callbacks
+    """
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+def _sensors(count: int, prefix: str, publisher: bool = True) -> List[MqttSensor]:
+    """
+    creates sensors on a fake client, spread over devices with ten sensors each.
+    By default the client doubles as publisher, which skips the throttling sleep after each message
+
+    :param publisher: False to publish on the client without a publisher, like the entities do by default
+    """
+    client = FakeClient()
+    devices = [HaDevice(f"device {i}", f"{prefix}_device_{i}") for i in range(max(1, count // 10))]
+    return [
+        MqttSensor(MqttDeviceSettings(f"sensor {i}", f"{prefix}_sensor_{i}", client, devices[i % len(devices)],
+                                      publisher=client if publisher else None),
+                   HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+        for i in range(count)
+    ]
+
+
+def _rate(count: int, func: Callable[[], object]) -> float:
+    """
+    :return: number of operations per second, when `func` executes `count` operations
+    """
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def bench_start(count: int, publisher: bool = True) -> float:
+    """
+    :param count: number of entities
+    :param publisher: False to start the entities without a publisher, as by default.
+        Then at most :data:`MAX_THROTTLED` entities are started
+    :return: entities started per second with :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.start`
+    """
+    if not publisher:
+        count = min(count, MAX_THROTTLED)
+    entities = _sensors(count, "start", publisher)
+
+    def loop() -> None:
+        for entity in entities:
+            entity.start()
+    return _rate(count, loop)
+
+
+def bench_start_all(count: int) -> float:
+    """
+    :return: entities started per second with :func:`~ha_mqtt.discovery.start_all`
+    """
+    entities = _sensors(count, "start_all")
+    return _rate(count, lambda: start_all(entities))
+
+
+def bench_update_state(count: int, rounds: int = 3) -> float:
+    """
+    :return: state updates per second, every entity is updated `rounds` times with a new value
+    """
+    entities = _sensors(count, "update")
+    for entity in entities:
+        entity.start()
+
+    def loop() -> None:
+        for value in range(rounds):
+            for entity in entities:
+                entity.update_state(value)
+    return _rate(count * rounds, loop)
+
+
+def bench_bulk_update(count: int, rounds: int = 3) -> float:
+    """
+    :return: state updates per second with :func:`~ha_mqtt.bulk.update_states`, one call per round.
+        The entities and values are the same as in :func:`bench_update_state`
+    """
+    entities = _sensors(count, "bulk")
+    for entity in entities:
+        entity.start()
+
+    def loop() -> None:
+        for value in range(rounds):
+            update_states(entities, [value] * count)
+    return _rate(count * rounds, loop)
+
+
+def bench_loopback(count: int, rounds: int = 3) -> float:
+    """
+    :return: state updates per second delivered to a subscriber through the :class:`~ha_mqtt.loopback.LoopbackBroker`
+    """
+    broker = LoopbackBroker()
+    subscriber = broker.client("homeassistant")
+    subscriber.subscribe("#")
+    client = broker.client("app")
+    entities = [MqttSensor(MqttDeviceSettings(f"sensor {i}", f"loopback_sensor_{i}", client, publisher=client),
+                           HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+                for i in range(count)]
+    for entity in entities:
+        entity.start()
+
+    def loop() -> None:
+        for value in range(rounds):
+            for entity in entities:
+                entity.update_state(value)
+    return _rate(count * rounds, loop)
+
+
+def bench_command_latency(count: int, executor: Optional[CallbackExecutor] = None) -> float:
+    """
+    sends commands to the switches one after another and waits until their callback ran
+
+    :param count: number of switches
+    :param executor: executor the callbacks run on, by default each callback starts a new thread
+    :return: mean latency in microseconds from receiving a command until its callback ran
+    """
+    client = FakeClient()
+    switches = [MqttSwitch(MqttDeviceSettings(f"switch {i}", f"command_switch_{i}", client, publisher=client))
+                for i in range(count)]
+    done = threading.Event()
+    for switch in switches:
+        switch.command_executor = executor
+        switch.callback_on = done.set
+        switch.start()
+
+    commands = switches[:MAX_COMMANDS]
+    total = 0.0
+    for switch in commands:
+        done.clear()
+        start = time.perf_counter()
+        switch.command_callback(client, None, _FakeMessage(switch.cmd_topic, b"on"))  # type: ignore
+        done.wait()
+        total += time.perf_counter() - start
+    if executor is not None:
+        executor.stop()
+    return total / len(commands) * 1e6
+
+
+def run(sizes: List[int]) -> Results:
+    """
+    runs all benchmarks
+
+    :param sizes: entity counts to run the benchmarks with
+    :return: results per benchmark and entity count
+    """
+    benchmarks: Dict[str, Callable[[int], float]] = {
+        "start [entities/s]": bench_start,
+        "start without publisher [entities/s]": lambda count: bench_start(count, False),
+        "start_all [entities/s]": bench_start_all,
+        "update_state [updates/s]": bench_update_state,
+        "update_states bulk [updates/s]": bench_bulk_update,
+        "update_state loopback [updates/s]": bench_loopback,
+        "command thread [us]": bench_command_latency,
+        "command executor [us]": lambda count: bench_command_latency(count, CallbackExecutor()),
+        "memory [bytes/entity]": lambda count: bytes_per_entity(count, False),
+        "memory compact [bytes/entity]": lambda count: bytes_per_entity(count, True),
+    }
+    results: Results = {}
+    for name, bench in benchmarks.items():
+        results[name] = {}
+        for size in sizes:
+            results[name][str(size)] = round(bench(size), 1)
+            print(f"{name:34} {size:>8} {results[name][str(size)]:>14.1f}", flush=True)
+    return results
+
+
+def compare(results: Results, baseline: Results) -> None:
+    """
+    prints the relative change of all results to a previous run
+
+    :param results: results of this run
+    :param baseline: results of the previous run
+    """
+    print("\nchange to baseline:")
+    for name, values in results.items():
+        for size, value in values.items():
+            old = baseline.get(name, {}).get(size)
+            if old:
+                print(f"{name:34} {size:>8} {(value - old) / old * 100:>+13.1f}%")
+
+
+def main() -> None:
+    """
+    runs the benchmarks and stores the results
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="entity counts to run the benchmarks with")
+    parser.add_argument("--output", type=Path, help="file to store the results in, by default a file "
+                                                    "per package and python version in benchmarks/results")
+    parser.add_argument("--compare", type=Path, help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = run(args.sizes)
+    output = args.output or RESULTS_DIR / f"{_version()}-python{platform.python_version()}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"version": _version(), "python": platform.python_version(), "results": results},
+                                 indent=2) + "\n")
+    print(f"\nresults stored in {output}")
+
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text())["results"])
+
+
+if __name__ == "__main__":
+    main()
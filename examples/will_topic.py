@@ -20,6 +20,7 @@ from paho.mqtt.client import Client, CallbackAPIVersion
 
 from ha_mqtt.mqtt_device_base import MqttDeviceSettings
 from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.registry import EntityRegistry
 from ha_mqtt.util import HaSwitchDeviceClass
 
 # instantiate a paho mqtt client and connect to the mqtt server
@@ -49,11 +50,11 @@ sw = MqttSwitch(settings, HaSwitchDeviceClass.SWITCH)
 sw.callback_on = on
 sw.callback_off = off
 
-# this time use the on connect callback to initialize the device
-# the methods in the other example files should also work
-# use the lambda to mask of the arguments supplied by the callback
-
-client.on_connect = lambda *args: sw.start()
+# this time use a registry hooking the on connect callback to initialize the device.
+# After reconnects, it restores the subscriptions and availability of all registered devices
+registry = EntityRegistry(client)
+registry.register(sw)
+registry.attach()
 client.connect("localhost", 1883)
 client.loop_start()
 
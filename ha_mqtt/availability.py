@@ -0,0 +1,85 @@
+"""
+this module contains the AvailabilityGroup, that tracks the availability of entities sharing one topic
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+from typing import Dict, Set
+
+from .transport import MqttClient
+
+
+class AvailabilityGroup:
+    """
+    availability topic shared by multiple entities.
+    The group is online as long as at least one of its members is online,
+    so only the first member going online and the last one going offline publish a message.
+
+    :param topic: the shared availability topic
+    """
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self._members: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def is_online(self) -> bool:
+        """
+        :return: True, if at least one member is online
+        """
+        return bool(self._members)
+
+    def join(self, unique_id: str) -> bool:
+        """
+        marks a member as online
+
+        :param unique_id: unique id of the member
+        :return: True, if the group went online and the online message has to be published
+        """
+        with self._lock:
+            went_online = not self._members
+            self._members.add(unique_id)
+            return went_online
+
+    def leave(self, unique_id: str) -> bool:
+        """
+        marks a member as offline
+
+        :param unique_id: unique id of the member
+        :return: True, if the group went offline and the offline message has to be published
+        """
+        with self._lock:
+            if unique_id not in self._members:
+                return False
+            self._members.discard(unique_id)
+            return not self._members
+
+    def publish(self, client: MqttClient, online: bool) -> None:
+        """
+        publishes the availability of the whole group, regardless of its members.
+        Use this to flip all entities at once, for example after a reconnect
+
+        :param client: client to publish with
+        :param online: True to report the group as online
+        """
+        client.publish(self.topic, 'online' if online else 'offline', qos=1, retain=True)
+
+
+_groups: Dict[str, AvailabilityGroup] = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(topic: str) -> AvailabilityGroup:
+    """
+    returns the group of a shared availability topic, creating it if necessary
+
+    :param topic: the shared availability topic
+    :return: the group
+    """
+    with _groups_lock:
+        if topic not in _groups:
+            _groups[topic] = AvailabilityGroup(topic)
+        return _groups[topic]
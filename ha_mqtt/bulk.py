@@ -0,0 +1,202 @@
+"""
+this module contains the bulk update of many entities at once, for example a whole sensor array
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+# the bulk update replaces the per entity update_state and needs its internals
+# pylint: disable=protected-access
+
+import math
+import time
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .mqtt_device_base import MqttDeviceBase
+from .mqtt_sensor import MqttSensor
+from .publisher import CoalescingPublisher, PayloadType
+
+Message = Tuple[str, PayloadType, int, bool]
+Batches = Dict[int, Tuple[Any, List[Message]]]
+
+_DUPLICATES = 0
+_SENSOR = 1
+_CUSTOM = 2
+
+_filter_state = attrgetter("_last_state", "suppress_duplicates", "heartbeat_interval")
+_sink_state = attrgetter("_publisher", "_client", "state_topic")
+_filter_kinds: Dict[type, int] = {}
+
+
+def _filter_kind(entity_type: type) -> int:
+    """
+    :param entity_type: class of an entity
+    :return: which of the filters of the library the class uses, _CUSTOM if it overrides any of them
+    """
+    if (entity_type._accept_state is not MqttDeviceBase._accept_state  # type: ignore
+            or entity_type._is_duplicate is not MqttDeviceBase._is_duplicate):  # type: ignore
+        return _CUSTOM
+    if entity_type._is_filtered is MqttDeviceBase._is_filtered:  # type: ignore
+        return _DUPLICATES
+    if entity_type._is_filtered is MqttSensor._is_filtered:  # type: ignore
+        return _SENSOR
+    return _CUSTOM
+
+
+def _number(value: Any) -> float:
+    """
+    :param value: element of the values
+    :return: the value as float, NaN if it is missing or not numeric
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _numbers(values: Iterable[Any]) -> Tuple[List[Any], List[float]]:
+    """
+    converts the values in one pass
+
+    :param values: sequence or array-like with a `tolist()` method
+    :return: the values as list and as floats, NaN for missing and non-numeric values
+    """
+    # numpy arrays convert to python numbers much faster as a whole than element by element
+    items = values.tolist() if hasattr(values, "tolist") else list(values)  # type: ignore
+    try:
+        return items, list(map(float, items))
+    except (TypeError, ValueError):
+        return items, list(map(_number, items))
+
+
+def _accepted(entities: Sequence[MqttDeviceBase], numbers: List[float], payloads: List[PayloadType],
+              now: float) -> Tuple[List[int], List[int]]:
+    """
+    applies the filters of the entities to the whole array, equivalent to their `_accept_state`.
+    The duplicate suppression is evaluated inline, sensors with a minimum interval or a deadband and
+    entities overriding the filters are asked one by one
+
+    :param entities: entities to update
+    :param numbers: new values as floats, NaN for values to skip
+    :param payloads: new payloads
+    :param now: current monotonic time
+    :return: indices of the accepted payloads, which still need to be recorded,
+        and of the accepted payloads of entities with their own filters, which recorded them already
+    """
+    accepted: List[int] = []
+    custom: List[int] = []
+    for index, (entity, nan, (last, suppress, heartbeat)) in enumerate(
+            zip(entities, map(math.isnan, numbers), map(_filter_state, entities))):
+        if nan:
+            continue
+        kind = _filter_kinds.get(type(entity))
+        if kind is None:
+            kind = _filter_kinds[type(entity)] = _filter_kind(type(entity))
+        if kind == _CUSTOM:
+            if entity._accept_state(payloads[index], now):
+                custom.append(index)
+            continue
+        if kind == _SENSOR and (entity.min_interval or entity.deadband or entity.relative_deadband):  # type: ignore
+            if not entity._is_filtered(payloads[index], now):
+                accepted.append(index)
+            continue
+        if (last is None or not suppress or payloads[index] != last[0]
+                or (heartbeat is not None and now - last[1] >= heartbeat)):
+            accepted.append(index)
+    return accepted, custom
+
+
+def _batches(entities: Sequence[MqttDeviceBase], indices: List[int], payloads: List[PayloadType],
+             retain: bool) -> Batches:
+    """
+    groups the messages of the accepted payloads by publisher.
+    Entities with a grouped state contribute to one message per device
+
+    :param entities: updated entities
+    :param indices: indices of the accepted payloads
+    :param payloads: new payloads
+    :param retain: set to True to send as retained messages
+    :return: publisher and messages by the id of the publisher
+    """
+    batches: Batches = {}
+    groups: Dict[int, MqttDeviceBase] = {}
+    for index in indices:
+        entity = entities[index]
+        entity._state_retained = retain
+        publisher, client, topic = _sink_state(entity)
+        sink = client if publisher is None else publisher
+        if entity._device is not None and entity._device.grouped_state:
+            entity._device.set_state(entity._unique_id, payloads[index])
+            groups[id(entity._device)] = entity
+        else:
+            batches.setdefault(id(sink), (sink, []))[1].append((topic, payloads[index], 0, retain))
+
+    for entity in groups.values():
+        batches.setdefault(id(entity._sink), (entity._sink, []))[1].append(
+            (entity.state_topic, entity._device.get_state_json(), 0, retain))  # type: ignore
+
+    return batches
+
+
+def _publish(batches: Batches) -> int:
+    """
+    hands the messages to their publishers, a :class:`~ha_mqtt.publisher.CoalescingPublisher` takes them at once
+
+    :param batches: publisher and messages by the id of the publisher
+    :return: number of published messages
+    """
+    published = 0
+    for sink, messages in batches.values():
+        if isinstance(sink, CoalescingPublisher):
+            sink.publish_many(messages)
+        else:
+            for topic, payload, qos, retain in messages:
+                sink.publish(topic, payload, qos=qos, retain=retain)
+        published += len(messages)
+    return published
+
+
+def update_states(
+        entities: Sequence[MqttDeviceBase],
+        values: Iterable[Any],
+        precision: Optional[int] = None,
+        retain: bool = True,
+) -> int:
+    """
+    updates the states of many entities at once, equivalent to calling
+    :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.update_state` for each pair of entity and value.
+
+    The values are converted and formatted as a whole, the filters of the entities are applied with a single
+    timestamp, the duplicate suppression inline over the array, and the resulting messages are handed to
+    the publishers in one go.
+    Entities with a grouped state publish one message per device.
+    Without a publisher, the throttling sleep happens once per call instead of once per entity.
+
+    :param entities: entities to update
+    :param values: one value per entity, any sequence or array-like with a `tolist()` method such as a numpy array.
+        None, NaN and non-numeric values are skipped
+    :param precision: number of decimal places the values are formatted with, None to publish them unformatted
+    :param retain: set to True to send as retained messages
+    :return: number of published messages
+    :raises ValueError: if the number of values doesn't match the number of entities
+    """
+    items, numbers = _numbers(values)
+    if len(items) != len(entities):
+        raise ValueError(f"got {len(items)} values for {len(entities)} entities")
+    payloads: List[PayloadType] = items
+    if precision is not None:
+        spec = f"%.{precision}f"
+        payloads = [spec % number for number in numbers]
+
+    now = time.monotonic()
+    accepted, custom = _accepted(entities, numbers, payloads, now)
+    if MqttDeviceBase.state_store is not None:
+        MqttDeviceBase.state_store.save_states((entities[index]._unique_id, payloads[index]) for index in accepted)
+    for index in accepted:
+        entities[index]._last_state = (payloads[index], now)
+
+    published = _publish(_batches(entities, sorted(accepted + custom) if custom else accepted, payloads, retain))
+    if published:
+        entities[0]._throttle()
+    return published
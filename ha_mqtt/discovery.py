@@ -0,0 +1,215 @@
+"""
+this module contains the BulkDiscovery engine, that starts a large number of entities at once
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+# the engine drives the start process of the entities and needs their internals
+# pylint: disable=protected-access
+
+import logging
+import time
+from collections import deque
+from contextlib import ExitStack
+from typing import Any, Deque, Dict, Iterable, Set, Tuple
+
+from paho.mqtt.client import MQTTMessageInfo  # type: ignore
+
+from .mqtt_device_base import MqttDeviceBase
+from .publisher import PayloadType, Publisher
+from .subscriptions import SubscriptionManager
+from .transport import MqttClient
+
+
+class _ClientSink:  # pylint: disable=R0903
+    """
+    publisher handed to the entities during a bulk start,
+    routes all messages through the in-flight window of the engine
+    """
+
+    def __init__(self, engine: "BulkDiscovery", client: MqttClient):
+        self._engine = engine
+        self._client = client
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message through the engine, see :class:`~ha_mqtt.publisher.Publisher`
+        """
+        self._engine.publish(self._client, topic, payload, qos, retain)
+
+
+class BulkDiscovery:
+    """
+    starts many entities at once.
+
+    All discovery payloads are built up front and published with a bounded number of
+    unacknowledged messages in flight, instead of sleeping after every message.
+    The window grows while acks arrive faster than `target_latency` and is halved when they get slower.
+
+    :param max_inflight: maximum number of unacknowledged messages
+    :param target_latency: ack latency in seconds the engine tries to stay below
+    :param ack_timeout: maximum time in seconds to wait for a single ack
+    :param qos: quality of service level used for the discovery payloads
+
+    .. note::
+       The client's network loop must be running (`loop_start()`) for acks to arrive.
+       Don't call this from within a paho callback, as it would block the network loop.
+    """
+
+    def __init__(
+            self,
+            max_inflight: int = 64,
+            target_latency: float = 0.25,
+            ack_timeout: float = 5.0,
+            qos: int = 1,
+    ):
+        assert max_inflight > 0, "at least one message must be allowed in flight"
+        self.max_inflight = max_inflight
+        self.target_latency = target_latency
+        self.ack_timeout = ack_timeout
+        self.qos = qos
+
+        self.latency = 0.0
+        """
+        smoothed ack latency in seconds
+        """
+
+        self._window = min(8, max_inflight)
+        self._inflight: Deque[Tuple[MQTTMessageInfo, float]] = deque()
+        self._sent: Set[Tuple[str, PayloadType]] = set()
+        self._sinks: Dict[int, _ClientSink] = {}
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def window(self) -> int:
+        """
+        :return: current number of messages allowed in flight
+        """
+        return self._window
+
+    def start(self, entities: Iterable[MqttDeviceBase]) -> None:
+        """
+        starts all given entities, equivalent to calling
+        :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.start` on each of them
+
+        :param entities: entities to start
+        """
+        entities = list(entities)
+        self._sent.clear()
+
+        # subscriptions of entities using a SubscriptionManager are sent as a few packets
+        with ExitStack() as stack:
+            managers = {id(entity._client): entity._client for entity in entities
+                        if isinstance(entity._client, SubscriptionManager)}
+            for manager in managers.values():
+                stack.enter_context(manager.batch())
+            for entity in entities:
+                entity._prepare()
+
+        # build all payloads before the first message is sent.
+        # Entities using device based discovery share one message per device
+        payloads: Dict[str, Tuple[MqttDeviceBase, str]] = {}
+        # and unchanged payloads are skipped
+        for entity in entities:
+            topic = entity.discovery_topic
+            if topic not in payloads and entity.config_digest != entity.published_digest:
+                payloads[topic] = (entity, entity.get_config_json())
+
+        for topic, (entity, payload) in payloads.items():
+            self._sink_for(entity).publish(topic, payload, qos=self.qos, retain=True)
+            entity.published_digest = entity.config_digest
+        self.flush()
+
+        for entity in entities:
+            publisher = entity._publisher
+            entity._publisher = self._sink_for(entity)
+            try:
+                entity._announce(entity.send_initial)
+                entity._started = True
+                entity.post_discovery()
+            finally:
+                entity._publisher = publisher
+        self.flush()
+
+    def publish(self, client: MqttClient, topic: str, payload: PayloadType,
+                qos: int = 0, retain: bool = False) -> None:
+        """
+        publishes a message, waiting for acks first if the window is full.
+        Retained messages that were already sent during this run are skipped,
+        for example the will topic shared by multiple entities.
+
+        :param client: client to publish the message with
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+        if retain:
+            if (topic, payload) in self._sent:
+                return
+            self._sent.add((topic, payload))
+
+        while len(self._inflight) >= self._window:
+            self._reap()
+        info = client.publish(topic, payload, qos=qos, retain=retain)
+        self._inflight.append((info, time.monotonic()))
+
+    def flush(self) -> None:
+        """
+        waits until all messages in flight are acknowledged
+        """
+        while self._inflight:
+            self._reap()
+
+    def _sink_for(self, entity: MqttDeviceBase) -> Publisher:
+        """
+        returns the publisher to use for an entity.
+        Entities that have their own publisher keep using it.
+
+        :param entity: entity to publish for
+        :return: the publisher
+        """
+        if entity._publisher is not None:
+            return entity._publisher
+        key = id(entity._client)
+        if key not in self._sinks:
+            self._sinks[key] = _ClientSink(self, entity._client)
+        return self._sinks[key]
+
+    def _reap(self) -> None:
+        """
+        waits for the oldest message in flight and adapts the window to the measured latency
+        """
+        info, stamp = self._inflight.popleft()
+        try:
+            info.wait_for_publish(self.ack_timeout)
+        except (RuntimeError, ValueError) as err:
+            self._logger.warning("publishing discovery message failed: %s", err)
+            return
+
+        if not info.is_published():
+            self._logger.warning("no ack received within %s seconds", self.ack_timeout)
+            self._window = max(1, self._window // 2)
+            return
+
+        latency = time.monotonic() - stamp
+        self.latency = latency if not self.latency else 0.8 * self.latency + 0.2 * latency
+        if self.latency > self.target_latency:
+            self._window = max(1, self._window // 2)
+        elif self._window < self.max_inflight:
+            self._window += 1
+
+
+def start_all(entities: Iterable[MqttDeviceBase], max_inflight: int = 64, qos: int = 1) -> BulkDiscovery:
+    """
+    starts all given entities using a :class:`BulkDiscovery` engine
+
+    :param entities: entities to start
+    :param max_inflight: maximum number of unacknowledged messages
+    :param qos: quality of service level used for the discovery payloads
+    :return: the engine used, containing the measured latency
+    """
+    engine = BulkDiscovery(max_inflight=max_inflight, qos=qos)
+    engine.start(entities)
+    return engine
@@ -0,0 +1,183 @@
+"""
+this module contains the CallbackExecutor, a bounded worker pool for command callbacks
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional
+
+from .metrics import Metrics
+from .util import OverflowPolicy
+
+Task = Callable[[], None]
+
+
+class CallbackExecutor:
+    """
+    runs callbacks on a fixed number of worker threads.
+
+    Every key (usually the unique id of an entity) is always assigned to the same worker,
+    so the callbacks of one entity run one after another in the order they were submitted,
+    while different entities run in parallel.
+
+    :param workers: number of worker threads
+    :param max_queue: maximum number of queued callbacks per worker, 0 for unlimited
+    :param overflow: :class:`~ha_mqtt.util.OverflowPolicy` applied when the queue of a worker is full.
+        Callbacks are usually submitted from paho's network thread, `BLOCK` stalls it until a worker catches up
+    :param metrics: records the queue depth as `callback_queue_depth` gauge and
+        the time callbacks wait in the queue as `callback_queue_seconds` histogram, if given
+
+    .. note::
+       the worker threads are started with the first submitted callback.
+       Call :meth:`stop` when closing your application.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 256, overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 metrics: Optional[Metrics] = None):
+        assert workers > 0, "at least one worker is required"
+        self.overflow = overflow
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.add_gauge("callback_queue_depth", lambda: self.pending)
+        self.dropped = 0
+        """
+        number of callbacks that were dropped because a queue was full
+        """
+
+        self._queues: List["queue.Queue[Optional[Task]]"] = [queue.Queue(max_queue) for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        # the stop markers in the queues may be dropped by DROP_OLDEST, the workers check this as well
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        :return: True, if the worker threads are running
+        """
+        return bool(self._threads)
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: approximate number of callbacks waiting to be run
+        """
+        return sum(q.qsize() for q in self._queues)
+
+    def start(self) -> None:
+        """
+        starts the worker threads
+        """
+        with self._lock:
+            if self._threads:
+                return
+            # nothing queued while stopped is meant for the new workers, especially no stop markers
+            for worker_queue in self._queues:
+                while True:
+                    try:
+                        worker_queue.get_nowait()
+                    except queue.Empty:
+                        break
+            self._stopping.clear()
+            for index, worker_queue in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(worker_queue,),
+                                          name=f"callback_worker_{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        runs all queued callbacks and stops the worker threads
+        """
+        with self._lock:
+            if not self._threads:
+                return
+            self._stopping.set()
+            for worker_queue in self._queues:
+                # only wakes up idle workers, the others stop once their queue is empty
+                try:
+                    worker_queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def submit(self, key: str, task: Task) -> bool:
+        """
+        queues a callback for execution
+
+        :param key: key that determines the worker, callbacks with the same key run in order
+        :param task: callback to run
+        :return: False, if the callback was dropped because the queue was full
+        """
+        if not self._threads:
+            self.start()
+        if self._metrics is not None:
+            task = self._timed(task, time.monotonic())
+
+        worker_queue = self._queues[zlib.crc32(key.encode("utf-8")) % len(self._queues)]
+        if self.overflow == OverflowPolicy.BLOCK:
+            worker_queue.put(task)
+            return True
+
+        while True:
+            try:
+                worker_queue.put_nowait(task)
+                return True
+            except queue.Full:
+                if self.overflow == OverflowPolicy.DROP_NEWEST:
+                    self._count_dropped()
+                    self._logger.warning("callback queue is full, dropping callback for %s", key)
+                    return False
+                try:
+                    worker_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self._count_dropped()
+                self._logger.warning("callback queue is full, dropping oldest callback")
+
+    def _count_dropped(self) -> None:
+        """
+        counts a dropped callback, submitting threads may drop callbacks at the same time
+        """
+        with self._dropped_lock:
+            self.dropped += 1
+
+    def _timed(self, task: Task, stamp: float) -> Task:
+        """
+        :param task: callback to run
+        :param stamp: time the callback was submitted
+        :return: callback that records its time in the queue before running the task
+        """
+        def timed() -> None:
+            self._metrics.observe("callback_queue_seconds", time.monotonic() - stamp)  # type: ignore
+            task()
+
+        return timed
+
+    def _run(self, worker_queue: "queue.Queue[Optional[Task]]") -> None:
+        """
+        worker loop
+
+        :param worker_queue: queue to take the callbacks from
+        """
+        while True:
+            task = worker_queue.get()
+            if task is None:
+                break
+            try:
+                task()
+            except Exception:  # pylint: disable=W0703
+                self._logger.exception("callback raised an exception")
+            # the stop marker was dropped from the full queue
+            if self._stopping.is_set() and worker_queue.empty():
+                break
@@ -9,25 +9,76 @@ this module contains the HaDevice class
 #  This code is published under the MIT license
 
 import json
-from typing import Any, Dict, List
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
+
+from .util import config_digest
+
+if TYPE_CHECKING:
+    from .mqtt_device_base import MqttDeviceBase
+    from .publisher import PayloadType
 
 
 class HaDevice:
     """
     Class for configuring a device that groups multiple entities in homeassistant
+
+    When `device_discovery` is enabled, all entities of this device are discovered through one
+    device based discovery message (`<basetopic>/device/<id>/config`) instead of one message per entity.
+
+    Entities started with `start()` don't publish that message themselves, it is published
+    :attr:`discovery_delay` seconds after the last of them was started, containing all of them.
+
+    When `grouped_state` is enabled, all entities of this device share one json state topic
+    (`<basetopic>/device/<id>/state`) and extract their value with a `value_template`.
+    Use :meth:`update_states` to update multiple entities with one message.
+
+    .. note::
+       change the config only through the methods of this class, otherwise
+       the cached discovery messages of the entities don't get updated
+    """
+
+    origin = {"name": "homeassistant-mqtt-binding"}
+    """
+    origin information sent with device based discovery messages, required by homeassistant
+    """
+
+    discovery_delay = 0.1
+    """
+    time in seconds the device based discovery message is delayed after an entity was started,
+    entities started within this time share one message
     """
 
-    def __init__(self, name: str, unique_id: str):
+    def __init__(self, name: str, unique_id: str, device_discovery: bool = False, grouped_state: bool = False):
         """
         constructor
         :param name: friendly name of the device
         :param unique_id: one unique identifier that is used by HA to assign entities to this device
+        :param device_discovery: set to True to discover all entities of this device with a single message
+        :param grouped_state: set to True to publish the states of all entities of this device in one message
         """
         self._name = name
         self.config = {
             "name": name,
             "identifiers": [unique_id],
         }
+        self.device_discovery = device_discovery
+        self.grouped_state = grouped_state
+        self._state_entities: Dict[str, "MqttDeviceBase"] = {}
+        self._states: Dict[str, Any] = {}
+        self._components: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._revision = 0
+        self._discovery_cache: Optional[Tuple[int, str, str]] = None
+        # entities waiting for the delayed discovery message
+        self._pending: List["MqttDeviceBase"] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+        self.published_digest: Optional[str] = None
+        """
+        digest of the last published device based discovery message
+        """
 
     def __str__(self) -> str:
         return f"{self._name}: {self.get_json()}"
@@ -46,6 +97,7 @@ class HaDevice:
                 "Specify 'override = True' if this was intended"
             )
         self.config[key] = value
+        self.invalidate()
 
     @property
     def identifiers(self) -> List[str]:
@@ -65,6 +117,20 @@ class HaDevice:
         if identifier in self.config["identifiers"]:
             raise ValueError("identifier is already present")
         self.config["identifiers"].append(identifier)  # type: ignore
+        self.invalidate()
+
+    @property
+    def revision(self) -> int:
+        """
+        :return: counter that is increased every time the config of this device or its entities changes
+        """
+        return self._revision
+
+    def invalidate(self) -> None:
+        """
+        marks the config as changed, so that cached discovery messages get rebuilt
+        """
+        self._revision += 1
 
     def get_json(self) -> str:
         """
@@ -79,3 +145,171 @@ class HaDevice:
         :return: dict containing the config
         """
         return self.config
+
+    def add_component(self, unique_id: str, platform: str, config: Dict[str, Any]) -> None:
+        """
+        adds an entity to the device based discovery message.
+        The config is stored as reference, later changes are reflected in the message
+
+        :param unique_id: unique id of the entity
+        :param platform: platform of the entity, for example 'sensor' or 'switch'
+        :param config: config dict of the entity
+        """
+        self._components[unique_id] = (platform, config)
+        self.invalidate()
+
+    def remove_component(self, unique_id: str, platform: str) -> str:
+        """
+        removes an entity from the device based discovery message
+
+        :param unique_id: unique id of the entity
+        :param platform: platform of the entity, for example 'sensor' or 'switch'
+        :return: discovery payload that tells homeassistant to remove the entity
+        """
+        self._components.pop(unique_id, None)
+        self.invalidate()
+        discovery = self.get_discovery_dict()
+        discovery["components"][unique_id] = {"platform": platform}
+        return json.dumps(discovery)
+
+    def get_discovery_dict(self) -> Dict[str, Any]:
+        """
+        returns the device based discovery message containing all added entities
+
+        :return: dict containing the discovery message
+        """
+        components = {}
+        for unique_id, (platform, config) in self._components.items():
+            component = {key: value for key, value in config.items() if key != "device"}
+            component["platform"] = platform
+            components[unique_id] = component
+
+        return {
+            "device": self.config,
+            "origin": self.origin,
+            "components": components,
+        }
+
+    def get_discovery_json(self) -> str:
+        """
+        returns the json representation of the device based discovery message.
+        The result is cached until the config changes
+
+        :return: json representation of the discovery message
+        """
+        return self._cached_discovery()[1]
+
+    @property
+    def discovery_digest(self) -> str:
+        """
+        :return: digest of the current device based discovery message
+        """
+        return self._cached_discovery()[2]
+
+    def _cached_discovery(self) -> Tuple[int, str, str]:
+        """
+        :return: tuple of revision, discovery message and digest, rebuilt if the config changed
+        """
+        if self._discovery_cache is None or self._discovery_cache[0] != self._revision:
+            payload = json.dumps(self.get_discovery_dict())
+            self._discovery_cache = (self._revision, payload, config_digest(payload))
+        return self._discovery_cache
+
+    def schedule_discovery(self, entity: "MqttDeviceBase") -> None:
+        """
+        publishes the device based discovery message :attr:`discovery_delay` seconds after the last call,
+        called by the entities when they are started
+
+        :param entity: the started entity, the message is published with its client or publisher
+        """
+        with self._lock:
+            self._pending.append(entity)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.discovery_delay, self.flush_discovery)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush_discovery(self) -> None:
+        """
+        publishes a scheduled device based discovery message right away,
+        if it changed since it was last published
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, []
+        # entities deleted in the meantime are no longer part of the message
+        pending = [entity for entity in pending
+                   if entity._unique_id in self._components]  # pylint: disable=W0212
+        if not pending:
+            return
+        pending[0]._publish_config()  # pylint: disable=W0212
+        # records the digest for the other entities as well, in case they use a state store
+        for entity in pending[1:]:
+            entity.published_digest = self.published_digest
+
+    def add_state_entity(self, unique_id: str, entity: "MqttDeviceBase") -> None:
+        """
+        adds an entity to the grouped state, called by the entities
+
+        :param unique_id: unique id of the entity
+        :param entity: the entity
+        """
+        self._state_entities[unique_id] = entity
+
+    def remove_state_entity(self, unique_id: str) -> None:
+        """
+        removes an entity from the grouped state
+
+        :param unique_id: unique id of the entity
+        """
+        self._state_entities.pop(unique_id, None)
+        self._states.pop(unique_id, None)
+
+    @property
+    def started_entities(self) -> int:
+        """
+        :return: number of started entities of the grouped state
+        """
+        return sum(1 for entity in self._state_entities.values() if entity.is_started)
+
+    def set_state(self, unique_id: str, payload: "PayloadType") -> None:
+        """
+        stores the state of an entity in the grouped state, without publishing it
+
+        :param unique_id: unique id of the entity
+        :param payload: state payload of the entity
+        """
+        self._states[unique_id] = payload.decode("utf-8") if isinstance(payload, (bytes, bytearray)) else payload
+
+    def get_state_json(self) -> str:
+        """
+        :return: json object containing the last state of all entities of the grouped state by their unique id
+        """
+        return json.dumps(self._states)
+
+    def update_states(self, states: Mapping[str, "PayloadType"], retain: bool = True) -> None:
+        """
+        updates the states of multiple entities and publishes them with a single message.
+        The filters of the entities, such as duplicate suppression, are applied to every value.
+        Requires `grouped_state`
+
+        :param states: state payloads by the unique id of their entity
+        :param retain: set to True to send as a retained message
+        :raises KeyError: if an unique id doesn't belong to an entity of this device, no state is recorded then
+        """
+        assert self.grouped_state, "update_states() requires grouped_state"
+        # all ids are checked first, an accepted state would be recorded without being published otherwise
+        unknown = [unique_id for unique_id in states if unique_id not in self._state_entities]
+        if unknown:
+            raise KeyError(f"no entities with the unique ids {unknown} on device {self._name}")
+        now = time.monotonic()
+        accepted: Optional["MqttDeviceBase"] = None
+        for unique_id, payload in states.items():
+            entity = self._state_entities[unique_id]
+            if entity._accept_state(payload, now):  # pylint: disable=W0212
+                accepted = entity
+        if accepted is not None:
+            accepted._publish_state(None, retain)  # pylint: disable=W0212
@@ -0,0 +1,325 @@
+"""
+this module contains an in-process broker and client, that route messages without a network connection.
+Use them in tests, benchmarks and simulations instead of a real broker
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS, MQTTMessage, topic_matches_sub  # type: ignore
+
+from .publisher import PayloadType, encode_payload
+from .transport import MessageHandler, SubscribeTopics, UnsubscribeTopics
+
+Route = Tuple["LoopbackClient", int]
+
+
+def _is_wildcard(sub: str) -> bool:
+    return "+" in sub or "#" in sub
+
+
+class LoopbackInfo:
+    """
+    message info returned by :meth:`LoopbackClient.publish`.
+    Messages are delivered before publish returns, so they are always published
+    """
+
+    __slots__ = ("mid", "rc")
+
+    def __init__(self, mid: int):
+        self.mid = mid
+        self.rc = MQTT_ERR_SUCCESS  # pylint: disable=C0103
+
+    def is_published(self) -> bool:
+        """
+        :return: always True
+        """
+        return True
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        """
+        returns immediately, same signature as paho's `MQTTMessageInfo.wait_for_publish()`
+        """
+
+
+class LoopbackBroker:
+    """
+    in-process broker routing messages between :class:`LoopbackClient` instances.
+
+    Supports retained messages, the `+` and `#` wildcards and the qos downgrade to the subscribed level.
+    Messages are delivered synchronously in the publishing thread, before publish returns.
+    Routes are cached per topic, so repeated messages on a topic cost a dict lookup.
+
+    .. code-block:: python
+
+       broker = LoopbackBroker()
+       settings = MqttDeviceSettings("Sensor", "sensor_1", broker.client("app"))
+    """
+
+    def __init__(self) -> None:
+        self.messages = 0
+        """
+        number of messages that were published
+        """
+
+        self._exact: Dict[str, Dict["LoopbackClient", int]] = {}
+        self._wildcards: Dict[str, Dict["LoopbackClient", int]] = {}
+        self._retained: Dict[str, Tuple[bytes, int]] = {}
+        self._routes: Dict[str, List[Route]] = {}
+        self._lock = threading.RLock()
+
+    def client(self, client_id: str = "", userdata: Any = None) -> "LoopbackClient":
+        """
+        creates a client connected to this broker
+
+        :param client_id: id of the client, only used for debugging
+        :param userdata: user defined data passed to the callbacks
+        :return: the client
+        """
+        return LoopbackClient(self, client_id, userdata)
+
+    def retained(self, topic: str) -> Optional[bytes]:
+        """
+        :param topic: topic to look up
+        :return: retained payload of the topic, None if there is none
+        """
+        message = self._retained.get(topic)
+        return message[0] if message is not None else None
+
+    def subscribe(self, client: "LoopbackClient", sub: str, qos: int) -> None:
+        """
+        subscribes a client and delivers the matching retained messages
+
+        :param client: subscribing client
+        :param sub: topic filter
+        :param qos: maximum qos of the delivered messages
+        """
+        with self._lock:
+            table = self._wildcards if _is_wildcard(sub) else self._exact
+            table.setdefault(sub, {})[client] = qos
+            self._routes.clear()
+            if _is_wildcard(sub):
+                retained = [(topic, msg) for topic, msg in self._retained.items() if topic_matches_sub(sub, topic)]
+            else:
+                retained = [(sub, self._retained[sub])] if sub in self._retained else []
+
+        for topic, (payload, retained_qos) in retained:
+            client.deliver(topic, payload, min(qos, retained_qos), True)
+
+    def unsubscribe(self, client: "LoopbackClient", sub: str) -> None:
+        """
+        removes a subscription of a client
+
+        :param client: subscribed client
+        :param sub: topic filter
+        """
+        with self._lock:
+            table = self._wildcards if _is_wildcard(sub) else self._exact
+            clients = table.get(sub, {})
+            if clients.pop(client, None) is not None:
+                self._routes.clear()
+            if not clients:
+                table.pop(sub, None)
+
+    def remove_client(self, client: "LoopbackClient") -> None:
+        """
+        removes all subscriptions of a client
+
+        :param client: subscribed client
+        """
+        with self._lock:
+            for table in (self._exact, self._wildcards):
+                for sub in [sub for sub, clients in table.items() if client in clients]:
+                    self.unsubscribe(client, sub)
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False) -> None:
+        """
+        stores retained messages and delivers a message to all subscribed clients
+
+        :param topic: topic to publish to
+        :param payload: payload bytes
+        :param qos: quality of service level
+        :param retain: set to True to store the message for future subscribers
+        """
+        with self._lock:
+            self.messages += 1
+            if retain and payload:
+                self._retained[topic] = (payload, qos)
+            elif retain:
+                self._retained.pop(topic, None)
+
+            routes = self._routes.get(topic)
+            if routes is None:
+                routes = self._routes[topic] = self._match(topic)
+
+        for client, sub_qos in routes:
+            client.deliver(topic, payload, min(qos, sub_qos), False)
+
+    def _match(self, topic: str) -> List[Route]:
+        """
+        :param topic: topic of a message
+        :return: clients subscribed to the topic with their highest subscribed qos
+        """
+        clients = dict(self._exact.get(topic, {}))
+        for sub, subscribers in self._wildcards.items():
+            if topic_matches_sub(sub, topic):
+                for client, qos in subscribers.items():
+                    clients[client] = max(qos, clients.get(client, 0))
+        return list(clients.items())
+
+
+class LoopbackClient:  # pylint: disable=R0902
+    """
+    client connected to a :class:`LoopbackBroker`, implementing the subset of paho's `Client` used by this library.
+
+    Received messages are handed to the callbacks registered with :meth:`message_callback_add`
+    that match their topic, or to `on_message` if none matches.
+    `on_publish` is called with the paho callback api version 2 signature.
+
+    :param broker: broker the client is connected to
+    :param client_id: id of the client, only used for debugging
+    :param userdata: user defined data passed to the callbacks
+    """
+
+    def __init__(self, broker: LoopbackBroker, client_id: str = "", userdata: Any = None):
+        self.broker = broker
+        self.client_id = client_id
+        self.on_message: Optional[MessageHandler] = None
+        self.on_publish: Optional[Callable[..., None]] = None
+        self.received = 0
+        """
+        number of messages delivered to this client
+        """
+
+        self._userdata = userdata
+        self._callbacks: Dict[str, MessageHandler] = {}
+        self._callback_cache: Dict[str, List[MessageHandler]] = {}
+        self._will: Optional[Tuple[str, bytes, int, bool]] = None
+        self._mid = 0
+
+    def user_data_set(self, userdata: Any) -> None:
+        """
+        sets the user defined data passed to the callbacks
+
+        :param userdata: the data
+        """
+        self._userdata = userdata
+
+    def will_set(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        sets the message published by the broker when the connection is lost, see :meth:`disconnect`
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+        self._will = (topic, encode_payload(payload), qos, retain)
+
+    def disconnect(self, unexpected: bool = False) -> None:
+        """
+        removes all subscriptions of the client
+
+        :param unexpected: True to simulate a lost connection, which publishes the will message
+        """
+        self.broker.remove_client(self)
+        if unexpected and self._will is not None:
+            self.broker.publish(*self._will)
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> LoopbackInfo:
+        """
+        publishes a message, same signature as paho's `Client.publish()`
+
+        :return: info of the message, which is already published
+        """
+        if not topic or _is_wildcard(topic):
+            raise ValueError("Publish topic cannot contain wildcards.")
+        self._mid = self._mid % 65535 + 1
+        info = LoopbackInfo(self._mid)
+        self.broker.publish(topic, encode_payload(payload), qos, retain)
+        if self.on_publish is not None:
+            self.on_publish(self, self._userdata, info.mid, 0, None)
+        return info
+
+    def publish_future(self, topic: str, payload: PayloadType = None, qos: int = 0,
+                       retain: bool = False) -> "Future[None]":
+        """
+        publishes a message, see :class:`~ha_mqtt.transport.AckTransport`
+
+        :return: completed future
+        """
+        self.publish(topic, payload, qos, retain)
+        future: "Future[None]" = Future()
+        future.set_result(None)
+        return future
+
+    def subscribe(self, topic: SubscribeTopics, qos: int = 0) -> Tuple[int, int]:
+        """
+        subscribes to a topic, or to a list of (topic, qos) tuples
+
+        :return: tuple of result code and message id, like paho
+        """
+        topics = [(topic, qos)] if isinstance(topic, str) else topic
+        for sub, sub_qos in topics:
+            self.broker.subscribe(self, sub, sub_qos)
+        self._mid = self._mid % 65535 + 1
+        return MQTT_ERR_SUCCESS, self._mid
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> Tuple[int, int]:
+        """
+        unsubscribes from a topic, or from a list of topics
+
+        :return: tuple of result code and message id, like paho
+        """
+        for sub in [topic] if isinstance(topic, str) else topic:
+            self.broker.unsubscribe(self, sub)
+        self._mid = self._mid % 65535 + 1
+        return MQTT_ERR_SUCCESS, self._mid
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a callback for all messages matching a topic filter
+
+        :param sub: topic filter
+        :param callback: paho style callback
+        """
+        self._callbacks[sub] = callback
+        self._callback_cache.clear()
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes the callback of a topic filter
+
+        :param sub: topic filter
+        """
+        self._callbacks.pop(sub, None)
+        self._callback_cache.clear()
+
+    def deliver(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        """
+        hands a message received from the broker to the callbacks
+
+        :param topic: topic of the message
+        :param payload: payload bytes
+        :param qos: quality of service level of the delivery
+        :param retain: True, if this is a retained message delivered on subscription
+        """
+        self.received += 1
+        callbacks = self._callback_cache.get(topic)
+        if callbacks is None:
+            callbacks = self._callback_cache[topic] = [
+                callback for sub, callback in self._callbacks.items() if topic_matches_sub(sub, topic)
+            ]
+        if not callbacks and self.on_message is None:
+            return
+
+        msg = MQTTMessage(topic=topic.encode("utf-8"))
+        msg.payload = payload
+        msg.qos = qos
+        msg.retain = retain
+        for callback in callbacks or [self.on_message]:  # type: ignore
+            callback(self, self._userdata, msg)
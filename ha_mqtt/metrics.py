@@ -0,0 +1,277 @@
+"""
+this module contains optional instrumentation of the mqtt traffic of the entities
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .publisher import PayloadType, payload_size
+from .transport import MessageHandler, MqttClient, SubscribeTopics, UnsubscribeTopics
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+"""
+default upper bounds in seconds of the latency histograms
+"""
+
+_KINDS = {"config": "config", "available": "availability", "state": "state", "set": "command"}
+
+
+def topic_kind(topic: str) -> str:
+    """
+    classifies a topic by its last level
+
+    :param topic: topic to classify
+    :return: one of config, availability, state, command or other
+    """
+    return _KINDS.get(topic.rsplit("/", 1)[-1], "other")
+
+
+class Histogram:
+    """
+    histogram with fixed buckets, in the format used by prometheus
+
+    :param buckets: sorted upper bounds of the buckets
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        adds a value to the histogram
+
+        :param value: observed value
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: list of (upper bound, number of values less or equal) including the +Inf bucket
+        """
+        result = []
+        total = 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+    collects counters, latency histograms and gauges.
+
+    Counters are grouped by a label, for example the kind of topic, see :func:`topic_kind`.
+    Gauges are functions that are only called when a snapshot is taken,
+    for example the queue depth of a publisher or executor.
+
+    :param buckets: upper bounds in seconds of the latency histograms
+    :param prefix: prefix of the metric names in the prometheus export
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, prefix: str = "ha_mqtt"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, label: str, amount: float = 1) -> None:
+        """
+        increments a counter
+
+        :param name: name of the counter
+        :param label: label the value is counted for
+        :param amount: value to add
+        """
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[label] = counter.get(label, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        adds a value to a histogram
+
+        :param name: name of the histogram
+        :param value: observed value, usually in seconds
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_gauge(self, name: str, func: Callable[[], float]) -> None:
+        """
+        registers a gauge
+
+        :param name: name of the gauge
+        :param func: function returning the current value
+        """
+        self._gauges[name] = func
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: dict with the current values of all counters, histograms and gauges
+        """
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {
+                name: {"buckets": dict(hist.cumulative()), "sum": hist.sum, "count": hist.count}
+                for name, hist in self._histograms.items()
+            }
+        gauges = {name: func() for name, func in self._gauges.items()}
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_prometheus(self) -> str:
+        """
+        :return: all metrics in the prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, values in snapshot["counters"].items():
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            lines.extend(f'{self.prefix}_{name}{{kind="{label}"}} {value}' for label, value in values.items())
+        for name, hist in snapshot["histograms"].items():
+            lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            lines.extend(f'{self.prefix}_{name}_bucket{{le="{bound}"}} {count}'
+                         for bound, count in hist["buckets"].items())
+            lines.append(f"{self.prefix}_{name}_sum {hist['sum']}")
+            lines.append(f"{self.prefix}_{name}_count {hist['count']}")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedClient:
+    """
+    wraps a paho client and records the traffic of the entities in a :class:`Metrics` instance.
+
+    Pass it as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to enable the metrics.
+    Without it, nothing is recorded and nothing is paid.
+
+    Recorded metrics, counters are labeled with the :func:`topic_kind`:
+
+    - `published_total` and `published_bytes_total`: messages and payload bytes published
+    - `received_total`: messages received
+    - `publish_ack_seconds`: time from publishing a message until paho reports it as sent or acknowledged
+    - `command_dispatch_seconds`: time from receiving a command until its callback returned
+
+    :param client: paho mqtt client instance, or another wrapper
+    :param metrics: metrics to record to
+    :param max_pending: maximum number of messages waiting for their ack that are tracked
+
+    .. note::
+       the ack latency hooks into `on_publish` of the client.
+       Assign your own `on_publish` callback before wrapping the client, it is still called
+    """
+
+    def __init__(self, client: MqttClient, metrics: Metrics, max_pending: int = 10000):
+        self._client = client
+        self.metrics = metrics
+        self.max_pending = max_pending
+        self._sent: Dict[int, float] = {}
+        # ack times of messages acknowledged before publish() returned, while publish() calls are in progress
+        self._early: Dict[int, float] = {}
+        self._publishing = 0
+        self._lock = threading.Lock()
+        self._on_publish: Optional[Callable[..., None]] = None
+        if hasattr(client, "on_publish"):
+            self._on_publish = client.on_publish
+            client.on_publish = self._acked
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message on the client, same signature as paho's `Client.publish()`
+        """
+        kind = topic_kind(topic)
+        self.metrics.count("published_total", kind)
+        self.metrics.count("published_bytes_total", kind, payload_size(payload))
+
+        stamp = time.monotonic()
+        with self._lock:
+            self._publishing += 1
+        mid: Optional[int] = None
+        published = False
+        acked: Optional[float] = None
+        try:
+            info = self._client.publish(topic, payload, qos=qos, retain=retain)
+            if isinstance(getattr(info, "mid", None), int):
+                mid = info.mid
+                # qos 0 messages may already be sent when publish returns
+                published = info.is_published()
+        finally:
+            # the ack may arrive from the network thread before the stamp is recorded
+            with self._lock:
+                self._publishing -= 1
+                if mid is not None:
+                    acked = self._early.pop(mid, None)
+                    if acked is None and not published and len(self._sent) < self.max_pending:
+                        # message ids are reused by paho, so stale entries are overwritten eventually
+                        self._sent[mid] = stamp
+                if not self._publishing:
+                    self._early.clear()
+
+        if acked is not None:
+            self.metrics.observe("publish_ack_seconds", acked - stamp)
+        elif published:
+            self.metrics.observe("publish_ack_seconds", time.monotonic() - stamp)
+        return info
+
+    def subscribe(self, topic: SubscribeTopics) -> Any:
+        """
+        subscribes on the client
+        """
+        return self._client.subscribe(topic)
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> Any:
+        """
+        unsubscribes on the client
+        """
+        return self._client.unsubscribe(topic)
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a callback on the client, that records the received messages
+        """
+        def timed(client: Any, userdata: Any, msg: Any) -> None:
+            kind = topic_kind(msg.topic)
+            self.metrics.count("received_total", kind)
+            start = time.monotonic()
+            callback(client, userdata, msg)
+            if kind == "command":
+                self.metrics.observe("command_dispatch_seconds", time.monotonic() - start)
+
+        self._client.message_callback_add(sub, timed)
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes a callback from the client
+        """
+        self._client.message_callback_remove(sub)
+
+    def _acked(self, *args: Any) -> None:
+        """
+        `on_publish` callback of the paho client, the message id is the third argument
+        in both callback api versions
+        """
+        now = time.monotonic()
+        with self._lock:
+            stamp = self._sent.pop(args[2], None)
+            if stamp is None and self._publishing:
+                self._early[args[2]] = now
+        if stamp is not None:
+            self.metrics.observe("publish_ack_seconds", now - stamp)
+        if self._on_publish is not None:
+            self._on_publish(*args)
@@ -0,0 +1,558 @@
+"""
+this module contains the asyncio counterparts of the mqtt entities.
+
+The async entities wrap the regular entities, so configuration, discovery and filtering behave the same.
+All messages and subscriptions are collected while the regular entity runs and are then
+awaited on an :class:`AsyncTransport`, so no blocking sleeps or paho threads are involved.
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import asyncio
+import copy
+import json
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Set, Tuple
+
+from paho.mqtt.client import Client, MQTTMessage  # type: ignore
+
+from . import util
+from .mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from .mqtt_sensor import MqttSensor
+from .mqtt_siren import MqttSiren
+from .mqtt_switch import MqttSwitch
+from .publisher import PayloadType
+from .transport import FutureInfo, MessageHandler, SubscribeTopics, UnsubscribeTopics
+from .util import HaSensorDeviceClass, HaSwitchDeviceClass
+
+MessageCallback = Callable[[str, bytes], None]
+AsyncCallback = Callable[[], Awaitable[None]]
+
+
+class AsyncTransport(Protocol):
+    """
+    interface of the asyncio mqtt clients the async entities publish with
+    """
+
+    async def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        publishes a message
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+
+    async def subscribe(self, topic: str) -> None:
+        """
+        subscribes to a topic
+
+        :param topic: topic to subscribe to
+        """
+
+    async def unsubscribe(self, topic: str) -> None:
+        """
+        unsubscribes from a topic
+
+        :param topic: topic to unsubscribe from
+        """
+
+    def add_callback(self, topic: str, callback: MessageCallback) -> None:
+        """
+        registers a callback that is called from the event loop with topic and payload
+        for every message received on the topic
+
+        :param topic: topic to register the callback for
+        :param callback: the callback
+        """
+
+    def remove_callback(self, topic: str) -> None:
+        """
+        removes the callback of a topic
+
+        :param topic: topic to remove the callback from
+        """
+
+
+def _paho_callback(callback: MessageHandler, client: Any = None) -> MessageCallback:
+    """
+    :param callback: paho style callback
+    :param client: client passed to the callback
+    :return: callback for an :class:`AsyncTransport`, that hands the messages to the paho style callback
+    """
+    def dispatch(topic: str, payload: bytes) -> None:
+        msg = MQTTMessage(topic=topic.encode("utf-8"))
+        msg.payload = payload
+        callback(client, None, msg)
+
+    return dispatch
+
+
+class _Recorder:
+    """
+    stands in as client and publisher for the wrapped entity
+    and records everything that has to be sent to the transport
+    """
+
+    def __init__(self, transport: AsyncTransport):
+        self._transport = transport
+        self._ops: List[Tuple[str, Tuple[Any, ...]]] = []
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        records a message, see :class:`~ha_mqtt.publisher.Publisher`
+        """
+        self._ops.append(("publish", (topic, payload, qos, retain)))
+
+    def subscribe(self, topic: SubscribeTopics) -> None:
+        """
+        records a subscription
+
+        :param topic: topic or list of (topic, qos) tuples to subscribe to
+        """
+        topics = [topic] if isinstance(topic, str) else [sub for sub, _ in topic]
+        self._ops.extend(("subscribe", (sub,)) for sub in topics)
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> None:
+        """
+        records an unsubscription
+
+        :param topic: topic or list of topics to unsubscribe from
+        """
+        topics = [topic] if isinstance(topic, str) else topic
+        self._ops.extend(("unsubscribe", (sub,)) for sub in topics)
+
+    def message_callback_add(self, topic: str, callback: Callable[[Any, Any, MQTTMessage], None]) -> None:
+        """
+        registers a paho style callback on the transport
+
+        :param topic: topic to register the callback for
+        :param callback: paho style callback
+        """
+        self._transport.add_callback(topic, _paho_callback(callback))
+
+    def message_callback_remove(self, topic: str) -> None:
+        """
+        removes a callback from the transport
+
+        :param topic: topic to remove the callback from
+        """
+        self._transport.remove_callback(topic)
+
+    async def drain(self) -> None:
+        """
+        sends everything recorded so far to the transport, in order
+        """
+        ops, self._ops = self._ops, []
+        for operation, args in ops:
+            await getattr(self._transport, operation)(*args)
+
+
+class AsyncMqttDeviceBase:
+    """
+    asyncio counterpart of :class:`~ha_mqtt.mqtt_device_base.MqttDeviceBase`.
+
+    :param settings: as in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceBase`, with
+        an :class:`AsyncTransport` as client. A publisher set in the settings is ignored
+    :param send_only: as in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceBase`
+
+    The wrapped regular entity is available as :attr:`entity`.
+    Use it to read topics and set options such as `suppress_duplicates`.
+    """
+
+    def __init__(self, settings: MqttDeviceSettings, send_only: bool = False):
+        self._recorder = _Recorder(settings.client)  # type: ignore
+        self.entity = self._create_entity(self._wrap_settings(settings), send_only)
+
+    def _wrap_settings(self, settings: MqttDeviceSettings) -> MqttDeviceSettings:
+        """
+        creates the settings for the wrapped entity, routing its messages into the recorder
+
+        :param settings: settings passed by the user
+        :return: settings for the wrapped entity
+        """
+        wrapped = copy.copy(settings)
+        wrapped.client = self._recorder
+        wrapped.publisher = self._recorder
+        return wrapped
+
+    def _create_entity(self, settings: MqttDeviceSettings, send_only: bool) -> MqttDeviceBase:
+        """
+        creates the wrapped entity. Override this in subclasses
+
+        :param settings: settings for the wrapped entity
+        :param send_only: as in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceBase`
+        :return: the wrapped entity
+        """
+        return MqttDeviceBase(settings, send_only)
+
+    async def _run(self, func: Callable[..., None], *args: Any) -> None:
+        """
+        runs a method of the wrapped entity and sends everything it produced
+
+        :param func: method to run
+        :param args: arguments for the method
+        """
+        func(*args)
+        await self._recorder.drain()
+
+    @property
+    def name(self) -> str:
+        """
+        :return: name of the entity
+        """
+        return self.entity.name
+
+    @property
+    def is_started(self) -> bool:
+        """
+        :return: True, if the device has started and communication with the broker is done
+        """
+        return self.entity.is_started
+
+    async def start(self) -> None:
+        """
+        subscribes to all topics, runs discovery and publishes initial state info
+        """
+        await self._run(self.entity.start)
+
+    async def stop(self) -> None:
+        """
+        sets itself as offline and unsubscribes from all topic regarding this instance
+        """
+        await self._run(self.entity.stop)
+
+    async def update_state(self, payload: PayloadType, retain: bool = True) -> None:
+        """
+        publishes a payload on the device's state topic
+
+        :param payload: payload to publish
+        :param retain: set to True to send as a retained message
+        """
+        await self._run(self.entity.update_state, payload, retain)
+
+    async def set_online(self) -> None:
+        """
+        report this device as online to homeassistant
+        """
+        await self._run(self.entity.set_online)
+
+    async def set_offline(self) -> None:
+        """
+        report this device as offline to homeassistant
+        """
+        await self._run(self.entity.set_offline)
+
+    async def delete(self) -> None:
+        """
+        delete the entity from homeassistant
+        """
+        await self._run(self.entity.delete)
+
+
+class AsyncMqttSensor(AsyncMqttDeviceBase):
+    """
+    asyncio counterpart of :class:`~ha_mqtt.mqtt_sensor.MqttSensor`
+
+    :param settings: as in :class:`AsyncMqttDeviceBase`
+    :param device_class: as in :class:`~ha_mqtt.mqtt_sensor.MqttSensor`
+    :param unit_of_measurement: as in :class:`~ha_mqtt.mqtt_sensor.MqttSensor`
+    :param send_only: as in :class:`AsyncMqttDeviceBase`
+    """
+
+    entity: MqttSensor
+
+    def __init__(
+            self,
+            settings: MqttDeviceSettings,
+            device_class: HaSensorDeviceClass,
+            unit_of_measurement: str,
+            send_only: bool = False,
+    ):
+        self._device_class = device_class
+        self._unit_of_measurement = unit_of_measurement
+        super().__init__(settings, send_only)
+
+    def _create_entity(self, settings: MqttDeviceSettings, send_only: bool) -> MqttDeviceBase:
+        return MqttSensor(settings, self._device_class, self._unit_of_measurement, send_only)
+
+
+class _BridgedSwitch(MqttSwitch):
+    """
+    switch that hands received commands to its async wrapper
+    """
+
+    __slots__ = ("_on_command",)
+
+    def __init__(self, settings: MqttDeviceSettings, device_class: HaSwitchDeviceClass,
+                 on_command: Callable[[bytes], None]):
+        self._on_command = on_command
+        super().__init__(settings, device_class)
+
+    def command_callback(self, client: Client, userdata: object, msg: MQTTMessage) -> None:
+        self._on_command(msg.payload)
+
+
+class _BridgedSiren(MqttSiren):
+    """
+    siren that hands received commands to its async wrapper
+    """
+
+    __slots__ = ("_on_command",)
+
+    def __init__(self, settings: MqttDeviceSettings, on_command: Callable[[bytes], None]):
+        self._on_command = on_command
+        super().__init__(settings, HaSwitchDeviceClass.SWITCH)
+
+    def command_callback(self, client: Client, userdata: object, msg: MQTTMessage) -> None:
+        cmd_dict = json.loads(msg.payload.decode("ascii"))
+        self._on_command(cmd_dict.get("state", util.OFF.decode("ascii")).encode("ascii"))
+
+
+async def _noop() -> None:
+    """
+    default callback that does nothing
+    """
+
+
+class AsyncMqttSwitch(AsyncMqttDeviceBase):
+    """
+    asyncio counterpart of :class:`~ha_mqtt.mqtt_switch.MqttSwitch`
+
+    :param settings: as in :class:`AsyncMqttDeviceBase`
+    :param device_class: device class of this switch
+
+    Assign coroutine functions to the `callback_on` and `callback_off` members.
+    They are run as tasks on the event loop once the according command was received.
+    """
+
+    entity: MqttSwitch
+
+    def __init__(self, settings: MqttDeviceSettings, device_class: HaSwitchDeviceClass = HaSwitchDeviceClass.SWITCH):
+        self._device_class = device_class
+        # coroutine function executed when an on command is received via MQTT
+        self.callback_on: AsyncCallback = _noop
+        # coroutine function executed when an off command is received via MQTT
+        self.callback_off: AsyncCallback = _noop
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        super().__init__(settings)
+
+    def _create_entity(self, settings: MqttDeviceSettings, send_only: bool) -> MqttDeviceBase:
+        return _BridgedSwitch(settings, self._device_class, self._command_received)
+
+    @property
+    def state(self) -> bool:
+        """
+        :return: the last reported state
+        """
+        return self.entity.state
+
+    async def set_on(self) -> None:
+        """
+        report to homeassistant, that the device is in 'on' state
+        """
+        await self._run(self.entity.set_on)
+
+    async def set_off(self) -> None:
+        """
+        report to homeassistant, that the device is in 'off' state
+        """
+        await self._run(self.entity.set_off)
+
+    async def set(self, state: bool) -> None:
+        """
+        sets the switch to the given state
+        :param state: state to set to
+        """
+        await self._run(self.entity.set, state)
+
+    async def command(self, payload: bytes) -> None:
+        """
+        handles a command received on the command topic
+
+        :param payload: payload of the command
+        """
+        if payload == util.ON:
+            await self.callback_on()
+        elif payload == util.OFF:
+            await self.callback_off()
+        else:
+            self.entity._logger.warning(  # pylint: disable=W0212
+                "got invalid payload as command: %s", payload)
+
+    def _command_received(self, payload: bytes) -> None:
+        """
+        schedules the command handling on the event loop
+
+        :param payload: payload of the command
+        """
+        task = asyncio.ensure_future(self.command(payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class AsyncMqttSiren(AsyncMqttSwitch):
+    """
+    asyncio counterpart of :class:`~ha_mqtt.mqtt_siren.MqttSiren`
+
+    :param settings: as in :class:`AsyncMqttDeviceBase`
+    """
+
+    def __init__(self, settings: MqttDeviceSettings):
+        super().__init__(settings)
+
+    def _create_entity(self, settings: MqttDeviceSettings, send_only: bool) -> MqttDeviceBase:
+        return _BridgedSiren(settings, self._command_received)
+
+    async def command(self, payload: bytes) -> None:
+        if payload == util.ON:
+            await self.set_on()
+            await self.callback_on()
+        else:
+            await self.set_off()
+            await self.callback_off()
+
+
+class AiomqttTransport:
+    """
+    :class:`AsyncTransport` for an `aiomqtt <https://github.com/sbtinstruments/aiomqtt>`_ client.
+    Run :meth:`run` as task to dispatch the received messages to the entities.
+
+    :param client: connected aiomqtt client
+    """
+
+    def __init__(self, client: Any):
+        self._client = client
+        self._callbacks: Dict[str, MessageCallback] = {}
+
+    async def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        publishes a message, see :class:`AsyncTransport`
+        """
+        await self._client.publish(topic, payload, qos=qos, retain=retain)
+
+    async def subscribe(self, topic: str) -> None:
+        """
+        subscribes to a topic, see :class:`AsyncTransport`
+        """
+        await self._client.subscribe(topic)
+
+    async def unsubscribe(self, topic: str) -> None:
+        """
+        unsubscribes from a topic, see :class:`AsyncTransport`
+        """
+        await self._client.unsubscribe(topic)
+
+    def add_callback(self, topic: str, callback: MessageCallback) -> None:
+        """
+        registers a callback, see :class:`AsyncTransport`
+        """
+        self._callbacks[topic] = callback
+
+    def remove_callback(self, topic: str) -> None:
+        """
+        removes a callback, see :class:`AsyncTransport`
+        """
+        self._callbacks.pop(topic, None)
+
+    def dispatch(self, topic: str, payload: bytes) -> None:
+        """
+        hands a received message to the callback registered for its topic
+
+        :param topic: topic the message was received on
+        :param payload: payload of the message
+        """
+        callback: Optional[MessageCallback] = self._callbacks.get(topic)
+        if callback is not None:
+            callback(topic, payload)
+
+    async def run(self) -> None:
+        """
+        dispatches all messages received by the client until it disconnects
+        """
+        async for message in self._client.messages:
+            payload = message.payload
+            if not isinstance(payload, (bytes, bytearray)):
+                payload = str(payload).encode("utf-8")
+            self.dispatch(str(message.topic), bytes(payload))
+
+
+class ThreadsafeTransport:
+    """
+    lets the regular, blocking entities use an :class:`AsyncTransport`, for example an :class:`AiomqttTransport`,
+    whose event loop runs in another thread.
+    Pass it as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings`.
+
+    Every call is scheduled on the event loop and returns right away.
+    The received messages are handed to the paho style callbacks from the event loop,
+    so the callbacks must not block.
+
+    :param transport: asyncio transport
+    :param loop: running event loop the transport belongs to
+    """
+
+    def __init__(self, transport: AsyncTransport, loop: asyncio.AbstractEventLoop):
+        self._transport = transport
+        self._loop = loop
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> FutureInfo:
+        """
+        publishes a message, same signature as paho's `Client.publish()`
+
+        :return: message info, that is published once the transport sent the message
+        """
+        return FutureInfo(self.publish_future(topic, payload, qos, retain))
+
+    def publish_future(self, topic: str, payload: PayloadType = None, qos: int = 0,
+                       retain: bool = False) -> "Future[None]":
+        """
+        publishes a message, see :class:`~ha_mqtt.transport.AckTransport`
+        """
+        return asyncio.run_coroutine_threadsafe(self._transport.publish(topic, payload, qos, retain), self._loop)
+
+    def subscribe(self, topic: SubscribeTopics) -> "Future[None]":
+        """
+        subscribes to a topic, or to a list of (topic, qos) tuples
+
+        :return: future that completes once the transport subscribed all topics
+        """
+        topics = [topic] if isinstance(topic, str) else [sub for sub, _ in topic]
+        return asyncio.run_coroutine_threadsafe(self._all("subscribe", topics), self._loop)
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> "Future[None]":
+        """
+        unsubscribes from a topic, or from a list of topics
+
+        :return: future that completes once the transport unsubscribed all topics
+        """
+        topics = [topic] if isinstance(topic, str) else topic
+        return asyncio.run_coroutine_threadsafe(self._all("unsubscribe", topics), self._loop)
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a paho style callback on the transport
+
+        :param sub: topic to register the callback for
+        :param callback: paho style callback
+        """
+        self._loop.call_soon_threadsafe(self._transport.add_callback, sub, _paho_callback(callback, self))
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes a callback from the transport
+
+        :param sub: topic to remove the callback from
+        """
+        self._loop.call_soon_threadsafe(self._transport.remove_callback, sub)
+
+    async def _all(self, operation: str, topics: List[str]) -> None:
+        """
+        runs a transport operation for every topic
+
+        :param operation: name of the operation
+        :param topics: topics to run the operation for
+        """
+        for topic in topics:
+            await getattr(self._transport, operation)(topic)
@@ -7,14 +7,24 @@ this module contains the MqttDeviceBase, a baseclass for all other mqtt devices
 
 import json
 import logging
+import socket
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from paho.mqtt.client import Client, MQTTMessage  # type: ignore
 
+from .availability import AvailabilityGroup, get_group
 from .ha_device import HaDevice
-from .util import EntityCategory
+from .pool import ClientPool
+from .publisher import PayloadType, Publisher
+from .store import StateStore
+from .subscriptions import SubscriptionManager
+from .transport import MqttClient
+from .util import AvailabilityScope, EntityCategory, config_digest
+
+
+_shared_logger = logging.getLogger("ha_mqtt.entity")
 
 
 @dataclass
@@ -24,20 +34,26 @@ class MqttDeviceSettings:
 
     :param name: Friendly name of the device to be shown in homeassistant
     :param unique_id: unique id to identify this device against homeassistant
-    :param client: paho mqtt client instance
+    :param client: paho mqtt client instance or a wrapper implementing :class:`~ha_mqtt.transport.MqttClient`,
+        or a :class:`~ha_mqtt.pool.ClientPool` to use the client of the pool the unique id is assigned to
     :param device: :class:`~ha_mqtt.ha_device.HaDevice`, to group multiple entities together
     :param entity_type: :class:`~ha_mqtt.util.EntityCategory` Category of the entity
     :param will_topic: the already set will on the client. Will be passed to HA to check if dev is still online
+    :param publisher: optional publisher such as :class:`~ha_mqtt.publisher.RateLimitedPublisher`, that
+        publishes the messages of this entity in the background instead of blocking the caller
     """
 
+    __slots__ = ("device", "name", "unique_id", "client", "entity_type", "will_topic", "publisher")
+
     def __init__(
             self,
             name: str,
             unique_id: str,
-            client: Client,
+            client: Union[MqttClient, ClientPool],
             device: Optional[HaDevice] = None,
             entity_type: EntityCategory = EntityCategory.PRIMARY,
-            will_topic: str = ""
+            will_topic: str = "",
+            publisher: Optional[Publisher] = None,
     ):
         assert isinstance(unique_id, str), "the unique ID must be a string"
         self.device = device
@@ -46,9 +62,132 @@ class MqttDeviceSettings:
         self.client = client
         self.entity_type = entity_type
         self.will_topic = will_topic
+        self.publisher = publisher
+
+
+class _BaseTopic:  # pylint: disable=R0903
+    """
+    descriptor for :attr:`MqttDeviceBase.base_topic`.
+    Accessed on a class it is the topic all entities publish under,
+    accessed on an entity it is derived from the entity's type and unique id instead of being stored,
+    unless a topic was assigned to the entity
+    """
+
+    def __init__(self, topic: str):
+        self.topic = topic
+
+    def __get__(self, entity: Optional["MqttDeviceBase"], owner: type) -> str:
+        if entity is None:
+            return self.topic
+        # pylint: disable=W0212
+        if entity._topics is not None and "base" in entity._topics:
+            return entity._topics["base"]
+        return f"{self.topic}/{owner.device_type}/{entity._unique_id}"  # type: ignore
+
+    def __set__(self, entity: "MqttDeviceBase", topic: str) -> None:
+        entity._set_topic("base", topic)  # pylint: disable=W0212
+
+
+class _EntityType(type):
+    """
+    metaclass of the entities, a base topic assigned to an entity class as plain string,
+    in the class body or later on, still derives the topics of each entity from it
+    """
+
+    def __init__(cls, name: str, bases: Tuple[type, ...], namespace: Dict[str, Any]):
+        super().__init__(name, bases, namespace)
+        if isinstance(namespace.get("base_topic"), str):
+            cls.base_topic = namespace["base_topic"]
+
+    def __setattr__(cls, name: str, value: Any) -> None:
+        if name == "base_topic" and isinstance(value, str):
+            value = _BaseTopic(value)
+        super().__setattr__(name, value)
+
+
+class _EntityDefaults(metaclass=_EntityType):
+    """
+    settings shared by all entities and their setters.
+    The setters assign to :class:`MqttDeviceBase`, like assigning the attributes there directly
+    """
+
+    __slots__ = ()
+
+    base_topic = _BaseTopic("homeassistant")
+    """
+    mqtt basetopic that is used as parent for all nodes this device produces.
+    On an instance, this is the topic all topics of the entity are published under
+    """
+
+    availability_scope = AvailabilityScope.ENTITY
+    """
+    :class:`~ha_mqtt.util.AvailabilityScope` determining which entities share one availability topic
+    """
+
+    node_id = socket.gethostname()
+    """
+    identifier of this application, used for the shared availability topic of the process scope
+    """
+
+    compact = False
+    """
+    If set to true, entities use less memory. See :meth:`set_compact`
+    """
+
+    state_store: Optional[StateStore] = None
+    """
+    :class:`~ha_mqtt.store.StateStore` the entities record their published states in. See :meth:`set_state_store`
+    """
+
+    @classmethod
+    def set_basetopic(cls, topic: str) -> None:
+        """
+        sets the basetopic for the application to publish all other topics under,
+        for example 'homeassistant'. Call this function before instantiating child objects
+        :param topic: the topic to use
+        """
+        MqttDeviceBase.base_topic = topic
+
+    @classmethod
+    def set_compact(cls, enabled: bool) -> None:
+        """
+        enables the compact mode for applications with a very large number of entities.
+        All entities share one logger instead of creating one per entity and
+        the serialized discovery payload is dropped after it was published, only its digest is kept.
+        Call this function before instantiating child objects
+
+        :param enabled: True to enable the compact mode
+        """
+        MqttDeviceBase.compact = enabled
+
+    @classmethod
+    def set_state_store(cls, store: Optional[StateStore]) -> None:
+        """
+        sets the store all entities record their last published state, discovery digest and availability in.
+        On start, entities restore their discovery digest and last state from it,
+        so unchanged configs and states are not sent again after a restart.
+        Call this function before starting the entities
+
+        :param store: the store to use, None to disable it
+        """
+        MqttDeviceBase.state_store = store
 
+    @classmethod
+    def set_availability_scope(cls, scope: AvailabilityScope, node_id: str = "") -> None:
+        """
+        sets which entities share one availability topic.
+        In the wider scopes, the first entity going online and the last one going offline
+        publish for the whole group. Call this function before instantiating child objects
+
+        :param scope: the scope to use
+        :param node_id: identifier of this application for the process scope, defaults to the hostname
+        """
+        MqttDeviceBase.availability_scope = scope
+        if node_id:
+            MqttDeviceBase.node_id = node_id
 
-class MqttDeviceBase:
+
+class MqttDeviceBase(_EntityDefaults):
     """
     base class for homeassistant mqtt devices.
     handles:
@@ -79,11 +218,6 @@ class MqttDeviceBase:
 
     """
 
-    base_topic = "homeassistant"
-    """
-    mqtt basetopic that is used as parent for all nodes this device produces
-    """
-
     device_type = "sensor"
     """
     string that is used to group the mqtt topics to
@@ -101,14 +235,13 @@ class MqttDeviceBase:
 
     _initial_state = 0
 
-    @classmethod
-    def set_basetopic(cls, topic: str) -> None:
-        """
-        sets the basetopic for the application to publish all other topics under,
-        for example 'homeassistant'. Call this function before instantiating child objects
-        :param topic: the topic to use
-        """
-        MqttDeviceBase.base_topic = topic
+    # __dict__ keeps custom attributes on entities possible, it is only allocated once one is set
+    __slots__ = (
+        "name", "send_only", "_client", "_unique_id", "_will_topic", "_publisher", "_device",
+        "_logger", "_started", "suppress_duplicates", "heartbeat_interval", "_last_state", "_state_retained",
+        "avail_topic", "state_topic", "_avail_group", "_conf_dict", "_config_cache", "_published_digest",
+        "_topics", "__dict__",
+    )
 
     def __init__(self, settings: MqttDeviceSettings, send_only: bool = False):
         """
@@ -117,24 +250,88 @@ class MqttDeviceBase:
         """
         self.name = settings.name
         self.send_only = send_only
-        self._client = settings.client
         self._unique_id = settings.unique_id
-        self._entity_type = settings.entity_type
+        # topics assigned to the entity by name, derived from the unique id while missing
+        self._topics: Optional[Dict[str, str]] = None
         self._will_topic = settings.will_topic
+        if isinstance(settings.client, ClientPool):
+            self._client: MqttClient = settings.client.client_for(self._unique_id)
+            self._will_topic = self._will_topic or settings.client.will_topic_for(self._unique_id)
+        else:
+            self._client = settings.client
+        self._publisher = settings.publisher
+        self._device = settings.device
+        # the device topics are built from the first identifier
+        if settings.device is not None:
+            assert len(settings.device.identifiers) > 0, \
+                "You must set one of identifiers or connections." \
+                " See https://www.home-assistant.io/integrations/sensor.mqtt/#device for more info"
 
-        self._logger = logging.getLogger(self.name)
+        self._logger = _shared_logger if self.compact else logging.getLogger(self.name)
         self._started = False
 
-        self.base_topic = f"{self.__class__.base_topic}/{self.__class__.device_type}/{self._unique_id}"
-        self.avail_topic = f"{self.base_topic}/available"
-        self.config_topic = f"{self.base_topic}/config"
-        self.state_topic = f"{self.base_topic}/state"
+        self.suppress_duplicates = False
+        """
+        If set to True, :meth:`update_state` skips payloads equal to the last published one
+        """
+
+        self.heartbeat_interval: Optional[float] = None
+        """
+        maximum time in seconds a duplicate payload is suppressed.
+        The next update after this interval is published even if unchanged. None suppresses forever
+        """
+
+        # last published state payload and the time it was published
+        self._last_state: Optional[Tuple[PayloadType, float]] = None
+        # retain flag the last state was published with, a restored state is retained by the broker
+        self._state_retained = True
+
+        self._avail_group: Optional[AvailabilityGroup] = None
+        self.avail_topic = self._init_availability()
+        self.state_topic = self._init_state_topic()
 
         self._conf_dict: Dict[str, Any] = {}
+        self._config_cache: Optional[Tuple[int, str, str]] = None
+        self._published_digest: Optional[str] = None
+        self._init_config(settings.entity_type)
 
+    def _init_availability(self) -> str:
+        """
+        joins the availability group of the configured scope, if any
+
+        :return: the availability topic of this entity
+        """
+        base_topic = self.__class__.base_topic
+        if self.availability_scope == AvailabilityScope.PROCESS:
+            self._avail_group = get_group(f"{base_topic}/node/{self.node_id}/available")
+        elif self.availability_scope == AvailabilityScope.DEVICE and self._device is not None:
+            self._avail_group = get_group(f"{base_topic}/device/{self._device.identifiers[0]}/available")
+        if self._avail_group is not None:
+            return self._avail_group.topic
+        return f"{self.base_topic}/available"
+
+    def _init_state_topic(self) -> str:
+        """
+        joins the grouped state of the device, if enabled
+
+        :return: the state topic of this entity
+        """
+        if self._device is not None and self._device.grouped_state:
+            self._device.add_state_entity(self._unique_id, self)
+            return f"{self.__class__.base_topic}/device/{self._device.identifiers[0]}/state"
+        return f"{self.base_topic}/state"
+
+    def _init_config(self, entity_type: EntityCategory) -> None:
+        """
+        adds the configuration options every entity has
+
+        :param entity_type: category of the entity
+        """
         self.add_config_option('name', self.name)
         self.add_config_option('state_topic', self.state_topic)
         self.add_config_option('unique_id', self._unique_id)
+        if self.grouped_state:
+            self.add_config_option('value_template', f"{{{{ value_json['{self._unique_id}'] }}}}")
 
         # if a will is supplied, specify both the client will and the
         # availability topic as availability
@@ -149,15 +346,23 @@ class MqttDeviceBase:
             self.add_config_option('availability_topic', self.avail_topic)
 
         # set entity category
-        if self._entity_type != EntityCategory.PRIMARY:
-            self._conf_dict["entity_category"] = self._entity_type.value
+        if entity_type != EntityCategory.PRIMARY:
+            self._conf_dict["entity_category"] = entity_type.value
 
         # set device configuration if specified
-        if settings.device is not None:
-            assert len(settings.device.identifiers) > 0, \
-                "You must set one of identifiers or connections." \
-                " See https://www.home-assistant.io/integrations/sensor.mqtt/#device for more info"
-            self._conf_dict['device'] = settings.device.get_dict()
+        if self._device is not None:
+            self._conf_dict['device'] = self._device.get_dict()
+
+    def _set_topic(self, name: str, topic: str) -> None:
+        """
+        assigns a topic to this entity instead of deriving it from the unique id
+
+        :param name: name of the topic, `base` or `config`
+        :param topic: the topic
+        """
+        if self._topics is None:
+            self._topics = {}
+        self._topics[name] = topic
 
     @property
     def is_started(self) -> bool:
@@ -174,18 +379,97 @@ class MqttDeviceBase:
            run this after connecting to the broker
 
         """
-        if not self.send_only:
-            self._client.subscribe(self.state_topic)
-
-        self._client.message_callback_add(
-            self.state_topic, self.state_callback)
-
         # run discovery process
-        self.pre_discovery()
+        self._prepare()
         self._send_discovery(self.send_initial)
         self._started = True
         self.post_discovery()
 
+    @property
+    def config_topic(self) -> str:
+        """
+        :return: the topic the discovery message of this entity is published to
+        """
+        if self._topics is not None and "config" in self._topics:
+            return self._topics["config"]
+        return f"{self.base_topic}/config"
+
+    @config_topic.setter
+    def config_topic(self, topic: str) -> None:
+        """
+        :param topic: the topic the discovery message of this entity is published to
+        """
+        self._set_topic("config", topic)
+
+    @property
+    def _device_discovery(self) -> bool:
+        """
+        :return: True, if this entity is discovered through the device based discovery message of its device
+        """
+        return self._device is not None and self._device.device_discovery
+
+    @property
+    def grouped_state(self) -> bool:
+        """
+        :return: True, if the state is published as part of the combined json state of the device
+        """
+        return self._device is not None and self._device.grouped_state
+
+    @property
+    def discovery_topic(self) -> str:
+        """
+        :return: the topic the discovery message of this entity is published to.
+            This is either the config topic or the topic of the device based discovery message
+        """
+        if self._device_discovery:
+            return f"{self.__class__.base_topic}/device/{self._device.identifiers[0]}/config"  # type: ignore
+        return self.config_topic
+
+    def _prepare(self) -> None:
+        """
+        subscribes to all topics and runs the pre discovery tasks,
+        so that the discovery message can be built
+        """
+        self._subscribe()
+        self._restore()
+        self.pre_discovery()
+        if self._device_discovery:
+            self._device.add_component(  # type: ignore
+                self._unique_id, self.__class__.device_type, self._conf_dict)
+
+    def _restore(self) -> None:
+        """
+        restores the discovery digest and the last state from the state store, if one is set
+        """
+        if self.state_store is None:
+            return
+        stored = self.state_store.load(self._unique_id)
+        if stored is None:
+            return
+        if stored.digest is not None:
+            self.published_digest = stored.digest
+        if stored.state is not None:
+            self._last_state = (stored.state, time.monotonic())
+            if self.grouped_state:
+                self._device.set_state(self._unique_id, stored.state)  # type: ignore
+
+    @property
+    def subscriptions(self) -> List[str]:
+        """
+        :return: topics this entity subscribes to when it is started
+        """
+        return [] if self.send_only else [self.state_topic]
+
+    def _subscribe(self) -> None:
+        """
+        subscribes to the state topic and registers the state callback
+        """
+        if not self.send_only:
+            self._subscribe_topic(self.state_topic)
+
+        self._client.message_callback_add(
+            self.state_topic, self.state_callback)
+
     def stop(self) -> None:
         """
         sets itself as offline and unsubscribes from all topic regarding this instance
@@ -194,9 +478,38 @@ class MqttDeviceBase:
            call this when closing or destructing your application to do proper cleanup
         """
         self._started = False
+        self._last_state = None
         self.set_offline()
         # unsubscribe from all topics
-        self._client.unsubscribe(f"{self.base_topic}/#")
+        self._unsubscribe_topic(f"{self.base_topic}/#")
+        # the grouped state topic is shared by the entities of the device and isn't below the base topic
+        if self.grouped_state and not self.send_only:
+            if isinstance(self._client, SubscriptionManager) or not self._device.started_entities:  # type: ignore
+                self._unsubscribe_topic(self.state_topic)
+
+    def _subscribe_topic(self, topic: str) -> None:
+        """
+        subscribes to a topic of this entity.
+        A :class:`~ha_mqtt.subscriptions.SubscriptionManager` counts the entity only once per topic
+
+        :param topic: the topic
+        """
+        if isinstance(self._client, SubscriptionManager):
+            self._client.subscribe(topic, owner=self._unique_id)
+        else:
+            self._client.subscribe(topic)
+
+    def _unsubscribe_topic(self, topic: str) -> None:
+        """
+        unsubscribes from a topic of this entity.
+        A :class:`~ha_mqtt.subscriptions.SubscriptionManager` only releases the references of this entity
+
+        :param topic: the topic
+        """
+        if isinstance(self._client, SubscriptionManager):
+            self._client.unsubscribe(topic, owner=self._unique_id)
+        else:
+            self._client.unsubscribe(topic)
 
     def add_config_option(self, key: str, value: Union[str, dict, list]) -> None:
         """
@@ -211,6 +524,18 @@ class MqttDeviceBase:
            leading to a faulty configuration
         """
         self._conf_dict[key] = value
+        self._invalidate_config()
+
+    def get_config_json(self) -> str:
+        """
+        returns the discovery payload of this entity.
+        When using device based discovery, this is the message of the whole device
+
+        :return: json representation of the config
+        """
+        if self._device_discovery:
+            return self._device.get_discovery_json()  # type: ignore
+        return self._cached_config()[1]
 
     def remove_config_option(self, key: str) -> None:
         """
@@ -218,6 +543,66 @@ class MqttDeviceBase:
         :param key: option to remove
         """
         self._conf_dict.pop(key)
+        self._invalidate_config()
+
+    def _invalidate_config(self) -> None:
+        """
+        drops the cached discovery payload after the config changed
+        """
+        self._config_cache = None
+        if self._device_discovery:
+            self._device.invalidate()  # type: ignore
+
+    def _cached_config(self, need_payload: bool = True) -> Tuple[int, str, str]:
+        """
+        :param need_payload: False, if only the digest is needed
+        :return: tuple of device revision, discovery payload and digest, rebuilt if the config changed
+        """
+        # the device config is part of the payload, so changes to it invalidate the cache as well.
+        # In compact mode, the payload is dropped after publishing and rebuilt when needed again
+        revision = self._device.revision if self._device is not None else 0
+        if (self._config_cache is None or self._config_cache[0] != revision
+                or (need_payload and not self._config_cache[1])):
+            payload = json.dumps(self._conf_dict)
+            self._config_cache = (revision, payload, config_digest(payload))
+        return self._config_cache
+
+    def _drop_config_payload(self) -> None:
+        """
+        drops the cached discovery payload and keeps only its digest, when in compact mode
+        """
+        if self.compact and self._config_cache is not None:
+            self._config_cache = (self._config_cache[0], "", self._config_cache[2])
+
+    @property
+    def config_digest(self) -> str:
+        """
+        :return: digest of the current discovery payload
+        """
+        if self._device_discovery:
+            return self._device.discovery_digest  # type: ignore
+        return self._cached_config(need_payload=False)[2]
+
+    @property
+    def published_digest(self) -> Optional[str]:
+        """
+        digest of the last published discovery payload, None if it was never published.
+        Discovery is skipped if it matches the current :attr:`config_digest`.
+        Restore this after a restart from your own storage to skip unchanged configs.
+        """
+        if self._device_discovery:
+            return self._device.published_digest  # type: ignore
+        return self._published_digest
+
+    @published_digest.setter
+    def published_digest(self, digest: Optional[str]) -> None:
+        if self._device_discovery:
+            self._device.published_digest = digest  # type: ignore
+        else:
+            self._published_digest = digest
+            self._drop_config_payload()
+        if self.state_store is not None:
+            self.state_store.save_digest(self._unique_id, digest)
 
     def pre_discovery(self) -> None:
         """
@@ -234,23 +619,96 @@ class MqttDeviceBase:
         Runs synchronously.
         """
 
-    def update_state(
-            self,
-            payload: Union[str, bytes, bytearray, int, float, None],
-            retain: bool = True,
-    ) -> None:
+    def update_state(self, payload: PayloadType, retain: bool = True) -> None:
         """
         publishes a payload on the device's state topic,
         updating its state in homeassistant
 
         :param payload: payload to publish
         :param retain: set to True to send as a retained message
+
+        .. hint::
+           set :attr:`suppress_duplicates` and :attr:`heartbeat_interval`
+           to skip payloads that didn't change
         """
+        if not self._accept_state(payload, time.monotonic()):
+            return
 
         self._logger.debug("publishing payload '%s' for %s", payload, self._unique_id)
+        self._publish_state(payload, retain)
+
+    def _publish_state(self, payload: PayloadType, retain: bool) -> None:
+        """
+        publishes a payload on the state topic.
+        In grouped state mode, the combined state of the device is published instead
 
-        self._client.publish(self.state_topic, payload, retain=retain)
-        time.sleep(0.01)
+        :param payload: payload to publish
+        :param retain: set to True to send as a retained message
+        """
+        if self.grouped_state:
+            payload = self._device.get_state_json()  # type: ignore
+        self._state_retained = retain
+        self._sink.publish(self.state_topic, payload, retain=retain)
+        self._throttle()
+
+    def _accept_state(self, payload: PayloadType, now: float) -> bool:
+        """
+        records a payload as last state, unless it is filtered.
+        In grouped state mode, it is also stored in the combined state of the device
+
+        :param payload: payload to check
+        :param now: current monotonic time
+        :return: False, if the payload should not be published
+        """
+        if self._is_filtered(payload, now):
+            return False
+        self._last_state = (payload, now)
+        if self.state_store is not None:
+            self.state_store.save_state(self._unique_id, payload)
+        if self.grouped_state:
+            self._device.set_state(self._unique_id, payload)  # type: ignore
+        return True
+
+    def _is_filtered(self, payload: PayloadType, now: float) -> bool:
+        """
+        checks if a payload should not be published. Override this to add filters
+
+        :param payload: payload to check
+        :param now: current monotonic time
+        :return: True, if the payload should not be published
+        """
+        return self._is_duplicate(payload, now)
+
+    def _is_duplicate(self, payload: PayloadType, now: float) -> bool:
+        """
+        checks if a payload can be suppressed, because it was published shortly before
+
+        :param payload: payload to check
+        :param now: current monotonic time
+        :return: True, if the payload should not be published
+        """
+        if not self.suppress_duplicates or self._last_state is None:
+            return False
+        last_payload, last_time = self._last_state
+        if payload != last_payload:
+            return False
+        return self.heartbeat_interval is None or now - last_time < self.heartbeat_interval
+
+    @property
+    def _sink(self) -> Union[MqttClient, Publisher]:
+        """
+        :return: the object messages are published with, the publisher if set, otherwise the client
+        """
+        if self._publisher is not None:
+            return self._publisher
+        return self._client
+
+    def _throttle(self) -> None:
+        """
+        slows down consecutive publishes if no publisher is set, to not flood the client
+        """
+        if self._publisher is None:
+            time.sleep(0.01)
 
     def state_callback(self, client: Client, userdata: object, msg: MQTTMessage) -> None:
         """
@@ -266,23 +724,87 @@ class MqttDeviceBase:
     def set_online(self) -> None:
         """
         report this device as online to homeassistant.
-        send the available payload on the available channel
+        send the available payload on the available channel.
+        With a shared availability topic, only the first entity of the group going online publishes
         """
-        self._client.publish(self.avail_topic, 'online', qos=1, retain=True)
+        if self.state_store is not None:
+            self.state_store.save_availability(self._unique_id, True)
+        if self._avail_group is not None and not self._avail_group.join(self._unique_id):
+            return
+        self._sink.publish(self.avail_topic, 'online', qos=1, retain=True)
 
     def set_offline(self) -> None:
         """
         report this device as offline to homeasstiant
-        send the unavailable payload on the available channel
+        send the unavailable payload on the available channel.
+        With a shared availability topic, only the last entity of the group going offline publishes
         """
-        self._client.publish(self.avail_topic, 'offline', qos=1, retain=True)
+        if self.state_store is not None:
+            self.state_store.save_availability(self._unique_id, False)
+        if self._avail_group is not None and not self._avail_group.leave(self._unique_id):
+            return
+        self._sink.publish(self.avail_topic, 'offline', qos=1, retain=True)
+
+    def rediscover(self, sent: Optional[Set[str]] = None) -> None:
+        """
+        republishes the cached discovery payload, the availability and the last state of a started entity,
+        for example after homeassistant restarted
+
+        :param sent: topics already republished by other entities during the same run,
+            shared topics such as the device discovery topic are only sent once. Gets updated
+        """
+        if not self._started:
+            return
+        sent = set() if sent is None else sent
+        for topic, payload, qos, retain in self._rediscovery_messages():
+            if topic not in sent:
+                sent.add(topic)
+                self._sink.publish(topic, payload, qos=qos, retain=retain)
+        self.published_digest = self.config_digest
+
+    def _rediscovery_messages(self) -> List[Tuple[str, PayloadType, int, bool]]:
+        """
+        :return: list of (topic, payload, qos, retain) tuples, that are republished during rediscovery.
+            The state keeps the retain flag it was published with
+        """
+        messages = [(topic, payload, qos, True) for topic, payload, qos in
+                    [(self.discovery_topic, self.get_config_json(), 0)] + self._availability_messages()]
+        if self.grouped_state:
+            messages.append((self.state_topic, self._device.get_state_json(), 0, self._state_retained))  # type: ignore
+        elif self._last_state is not None:
+            messages.append((self.state_topic, self._last_state[0], 0, self._state_retained))
+        return messages
+
+    def _availability_messages(self) -> List[Tuple[str, PayloadType, int]]:
+        """
+        :return: list of (topic, payload, qos) tuples, that report a started entity as online
+        """
+        messages: List[Tuple[str, PayloadType, int]] = []
+        if self._avail_group is None or self._avail_group.is_online:
+            messages.append((self.avail_topic, 'online', 1))
+        if self._will_topic:
+            messages.append((self._will_topic, 'online', 0))
+        return messages
 
     def delete(self) -> None:
         """
         delete the sensor from homeassistant
-        by sending an empty payload to the config topic
+        by sending an empty payload to the config topic.
+        When using device based discovery, the entity is removed from the device's message
         """
-        self._client.publish(self.config_topic, "")
+        self._last_state = None
+        if self.grouped_state:
+            self._device.remove_state_entity(self._unique_id)  # type: ignore
+        if self._device_discovery:
+            payload = self._device.remove_component(  # type: ignore
+                self._unique_id, self.__class__.device_type)
+            self._sink.publish(self.discovery_topic, payload, retain=True)
+            self.published_digest = self._device.discovery_digest  # type: ignore
+        else:
+            self._sink.publish(self.config_topic, "")
+            self.published_digest = None
+        if self.state_store is not None:
+            self.state_store.remove(self._unique_id)
 
     def _send_discovery(self, send_initial: bool = True) -> None:
         """
@@ -290,15 +812,39 @@ class MqttDeviceBase:
 
         :param send_initial: determines if the classes' initital state should be sent or not
         """
-        self._client.publish(self.config_topic, json.dumps(
-            self._conf_dict), retain=True)
-        time.sleep(0.01)
+        if self._device_discovery:
+            # entities started one after another share one message instead of each sending the growing one
+            self._device.schedule_discovery(self)  # type: ignore
+        else:
+            self._publish_config()
+        self._announce(send_initial)
+
+    def _publish_config(self) -> None:
+        """
+        publishes the discovery payload, if it changed since it was last published
+        """
+        payload = self.get_config_json()
+        digest = self.config_digest
+        if digest != self.published_digest:
+            self._sink.publish(self.discovery_topic, payload, retain=True)
+            self.published_digest = digest
+            self._throttle()
+            self._logger.debug("sending config for %s: %s",
+                               self._unique_id, self._conf_dict)
+        else:
+            self._logger.debug("config of %s is unchanged, skipping discovery", self._unique_id)
+
+    def _announce(self, send_initial: bool = True) -> None:
+        """
+        reports the entity as online after the config has been sent
+
+        :param send_initial: determines if the classes' initital state should be sent or not
+        """
         self.set_online()
-        self._logger.debug("sending config for %s: %s",
-                           self._unique_id, self._conf_dict)
         if self._will_topic:
-            self._client.publish(self._will_topic, 'online', retain=True)
+            self._sink.publish(self._will_topic, 'online', retain=True)
 
-        if send_initial:
+        # a state restored from the state store is still retained by the broker
+        if send_initial and self._last_state is None:
             self.update_state(
                 self.__class__._initial_state)  # pylint: disable=W0212
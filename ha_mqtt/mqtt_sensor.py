@@ -6,10 +6,30 @@ Andreas Philipp - 2022
 #  Copyright (c) 2024 - Andreas Philipp
 #  This code is published under the MIT license
 
+from typing import Optional
+
 from .mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from .publisher import PayloadType
 from .util import HaSensorDeviceClass
 
 
+def _as_float(payload: PayloadType) -> Optional[float]:
+    """
+    converts a payload to a number if possible
+
+    :param payload: payload to convert
+    :return: the numeric value or None, if the payload is not numeric
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode("ascii", errors="ignore")
+    if payload is None:
+        return None
+    try:
+        return float(payload)
+    except ValueError:
+        return None
+
+
 class MqttSensor(MqttDeviceBase):
     """
     class that implements an arbitrary sensor such as a thermometer
@@ -23,10 +43,16 @@ class MqttSensor(MqttDeviceBase):
        Use :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.update_state`
        to send the actual sensor data to homeassistant
 
+    Numeric values can be filtered before they are published:
+    set `deadband` and/or `relative_deadband` to only publish values that moved by more than
+    the given amount from the last published value and `min_interval` to limit the publish rate of the sensor.
+    Filtered values are dropped, they are not published later.
     """
 
     device_type = "sensor"
 
+    __slots__ = ("device_class", "unit_of_measurement", "deadband", "relative_deadband", "min_interval")
+
     def __init__(
             self,
             settings: MqttDeviceSettings,
@@ -38,6 +64,45 @@ class MqttSensor(MqttDeviceBase):
         self.unit_of_measurement = unit_of_measurement
         super().__init__(settings, send_only)
 
+        self.deadband = 0.0
+        """
+        minimum absolute change to the last published value for a new value to be published
+        """
+
+        self.relative_deadband = 0.0
+        """
+        minimum change relative to the last published value, 0.05 means 5 %
+        """
+
+        self.min_interval = 0.0
+        """
+        minimum time in seconds between two published values
+        """
+
+    def _is_filtered(self, payload: PayloadType, now: float) -> bool:
+        """
+        applies the duplicate suppression, the minimum interval and the deadband
+
+        :param payload: payload to check
+        :param now: current monotonic time
+        :return: True, if the payload should not be published
+        """
+        if super()._is_filtered(payload, now):
+            return True
+        if self._last_state is None:
+            return False
+        last_payload, last_time = self._last_state
+        if now - last_time < self.min_interval:
+            return True
+        if self.heartbeat_interval is not None and now - last_time >= self.heartbeat_interval:
+            return False
+
+        value, last_value = _as_float(payload), _as_float(last_payload)
+        if value is None or last_value is None:
+            return False
+        threshold = max(self.deadband, abs(last_value) * self.relative_deadband)
+        return threshold > 0 and abs(value - last_value) <= threshold
+
     def pre_discovery(self) -> None:
         self.add_config_option("device_class", self.device_class.value)
         self.add_config_option("unit_of_measurement", self.unit_of_measurement)
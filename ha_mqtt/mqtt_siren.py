@@ -5,7 +5,6 @@ this module contains code for the mqtt siren
 #  This code is published under the MIT license
 
 import json
-import threading
 
 from paho.mqtt.client import Client, MQTTMessage  # type: ignore
 
@@ -19,7 +18,7 @@ class MqttSiren(MqttSwitch):
     play sounds or blink a light
 
     .. note::
-       The on callback runs in a separate thread.
+       The on callback runs in a separate thread or on the command executor.
        Use locking mechanisms if required to prevent race conditions.
 
        The off callback runs synchronously.
@@ -32,6 +31,8 @@ class MqttSiren(MqttSwitch):
 
     device_type = "siren"
 
+    __slots__ = ()
+
     def pre_discovery(self) -> None:
         super().pre_discovery()
         self.remove_config_option('device_class')  # siren doesn't have a device class
@@ -41,7 +42,7 @@ class MqttSiren(MqttSwitch):
         cmd_str = cmd_dict.get("state", util.OFF)
         if cmd_str.encode("ascii") == util.ON:
             self.set_on()
-            threading.Thread(target=self.callback_on, name="callback_thread").start()
+            self._run_callback(self.callback_on)
         else:
             self.set_off()
             self.callback_off()
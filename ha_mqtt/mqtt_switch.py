@@ -5,10 +5,12 @@ this module contains all code for MQTT switches
 #  This code is published under the MIT license
 
 import threading
+from typing import Callable, List, Optional
 
 from paho.mqtt.client import Client, MQTTMessage  # type: ignore
 
 from . import util
+from .executor import CallbackExecutor
 from .mqtt_device_base import MqttDeviceSettings, MqttDeviceBase
 from .util import HaSwitchDeviceClass
 
@@ -28,11 +30,32 @@ class MqttSwitch(MqttDeviceBase):
     .. attention::
        Each callback spawns a new thread which is automatically destroyed once the function finishes.
        Be aware of that if you do non threadsafe stuff in your callbacks
+
+    .. hint::
+       use :meth:`set_command_executor` or set :attr:`command_executor` to run the callbacks on a bounded
+       :class:`~ha_mqtt.executor.CallbackExecutor` instead of a new thread per command
     """
 
     device_type = "switch"
     initial_state = util.OFF
 
+    default_command_executor: Optional[CallbackExecutor] = None
+    """
+    executor the callbacks of all switches without their own executor are run on.
+    If None, every callback runs in a new thread
+    """
+
+    __slots__ = ("state", "device_class", "callback_on", "callback_off", "cmd_topic", "command_executor")
+
+    @classmethod
+    def set_command_executor(cls, executor: Optional[CallbackExecutor]) -> None:
+        """
+        sets the executor the callbacks of all switches and sirens are run on
+
+        :param executor: the executor to share, None to run every callback in a new thread
+        """
+        MqttSwitch.default_command_executor = executor
+
     def __init__(self, settings: MqttDeviceSettings, device_class: HaSwitchDeviceClass = HaSwitchDeviceClass.SWITCH):
         # internal tracker of the state
         self.state: bool = self.__class__.initial_state != util.OFF
@@ -46,10 +69,17 @@ class MqttSwitch(MqttDeviceBase):
         self.callback_off = lambda: None
         self.cmd_topic = ""
 
+        # executor the callbacks of this switch are run on, overrides the default executor
+        self.command_executor: Optional[CallbackExecutor] = None
+
         super().__init__(settings)
 
+    @property
+    def subscriptions(self) -> List[str]:
+        return super().subscriptions + [self.cmd_topic]
+
     def stop(self) -> None:
-        self._client.unsubscribe(self.cmd_topic)
+        self._unsubscribe_topic(self.cmd_topic)
         super().stop()
 
     def pre_discovery(self) -> None:
@@ -59,11 +89,15 @@ class MqttSwitch(MqttDeviceBase):
         self.add_config_option("payload_off", util.OFF.decode('ascii'))
         self.add_config_option("payload_on", util.ON.decode('ascii'))
 
-        self._client.subscribe(self.cmd_topic)
+        self._subscribe_topic(self.cmd_topic)
         self._client.message_callback_add(self.cmd_topic, self.command_callback)
 
     def post_discovery(self) -> None:
-        self.set_off()
+        if self._last_state is None:
+            self.set_off()
+        else:
+            # restored from the state store, keep the state instead of switching off
+            self.state = self._last_state[0] == util.ON
 
     def set_on(self) -> None:
         """
@@ -100,8 +134,20 @@ class MqttSwitch(MqttDeviceBase):
 
         """
         if msg.payload == util.ON:
-            threading.Thread(target=self.callback_on, name="callback_thread").start()
+            self._run_callback(self.callback_on)
         elif msg.payload == util.OFF:
-            threading.Thread(target=self.callback_off, name="callback_thread").start()
+            self._run_callback(self.callback_off)
         else:
             self._logger.warning("got invalid payload as command: %s", msg.payload)
+
+    def _run_callback(self, callback: Callable[[], None]) -> None:
+        """
+        runs a callback on the command executor or in a new thread
+
+        :param callback: callback to run
+        """
+        executor = self.command_executor or self.default_command_executor
+        if executor is not None:
+            executor.submit(self._unique_id, callback)
+        else:
+            threading.Thread(target=callback, name="callback_thread").start()
@@ -15,6 +15,8 @@ class MqttThermometer(MqttSensor):
     The default unit is °C and can be changed in the constructor
     """
 
+    __slots__ = ()
+
     def __init__(
         self, settings: MqttDeviceSettings, unit: str = "°C", send_only: bool = True
     ):
@@ -0,0 +1,287 @@
+"""
+this module contains the OfflineBuffer, that holds back the messages of the entities while the broker is unreachable
+and replays them once the connection is back
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import logging
+import os
+import struct
+import threading
+from collections import deque
+from typing import Any, BinaryIO, Deque, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from paho.mqtt.client import MQTT_ERR_NO_CONN, Client  # type: ignore
+
+from .publisher import PayloadType, Publisher, _Message, encode_payload, payload_size
+
+SPILL_RECORD = struct.Struct("<HIB?")
+"""
+header of a message in the spill file: length of the topic and payload, qos and retain flag
+"""
+
+
+def _size(msg: _Message) -> int:
+    """
+    :return: number of bytes a message counts against the memory budget
+    """
+    return len(msg.topic) + payload_size(msg.payload)
+
+
+class OfflineBuffer:  # pylint: disable=R0902
+    """
+    publisher that passes messages through while connected and buffers them while the broker is unreachable.
+
+    Buffered messages are coalesced to the latest message per topic, so an entity updated every second during
+    an outage of hours still only holds one message. Topics passed in `history` keep every message instead.
+    Once the buffered topics and payloads exceed `max_bytes`, the oldest messages are appended to the spill file,
+    or dropped if there is none. On reconnect, the spill file and the buffer are replayed,
+    again coalesced per topic, and the spill file is removed.
+
+    Pass an instance via :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to use it and report
+    connection changes with :meth:`set_connected`, for example from the `on_connect` and `on_disconnect`
+    callbacks of the client.
+
+    :param client: paho mqtt client or another publisher the messages are handed to
+    :param max_bytes: memory budget in bytes for the buffered topics and payloads
+    :param spill_path: path of the append-only spill file, None to drop messages exceeding the budget.
+        A spill file left over by a previous run is replayed before any new message is passed through
+    :param history: topics whose messages are all replayed instead of only the latest one,
+        for example the state topics of meters
+    :param connected: True, if the client is connected already
+
+    .. note::
+       while connected, qos 0 messages the client rejects for a missing connection are buffered as well
+    """
+
+    def __init__(
+            self,
+            client: Union[Client, Publisher],
+            max_bytes: int = 1 << 20,
+            spill_path: Optional[str] = None,
+            history: Iterable[str] = (),
+            connected: bool = True,
+    ):
+        self._client = client
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.history: Set[str] = set(history)
+        self.coalesced = 0
+        """
+        number of buffered messages that were replaced by a newer message on their topic
+        """
+
+        self.dropped = 0
+        """
+        number of buffered messages that were dropped because the memory budget was exceeded
+        """
+
+        self.spilled = 0
+        """
+        number of messages in the spill file
+        """
+
+        self._connected = connected
+        self._latest: Dict[str, _Message] = {}
+        self._history: Deque[_Message] = deque()
+        self._bytes = 0
+        self._spill: Optional[BinaryIO] = None
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        if spill_path is not None and os.path.exists(spill_path):
+            self.spilled = sum(1 for _ in self._read_spill())
+            # replayed right away, newer messages passed through would be overwritten by it otherwise
+            if connected:
+                self._replay()
+
+    @property
+    def connected(self) -> bool:
+        """
+        :return: True, if messages are passed through to the client
+        """
+        return self._connected
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: number of buffered messages, in memory and in the spill file
+        """
+        return len(self._latest) + len(self._history) + self.spilled
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        :return: number of topic and payload bytes buffered in memory
+        """
+        return self._bytes
+
+    def keep_history(self, topic: str) -> None:
+        """
+        replays all messages buffered for a topic instead of only the latest one
+
+        :param topic: the topic, for example the state topic of an entity
+        """
+        with self._lock:
+            self.history.add(topic)
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message, or buffers it while disconnected. Same signature as paho's `Client.publish()`
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        :return: message info of the client, None if the message was buffered
+        """
+        msg = _Message(topic, payload, qos, retain)
+        # the lock keeps new messages from overtaking replayed ones
+        with self._lock:
+            if not self._connected:
+                self._buffer(msg)
+                return None
+            info = self._client.publish(topic, payload, qos=qos, retain=retain)
+            if qos == 0 and getattr(info, "rc", None) == MQTT_ERR_NO_CONN:
+                self._buffer(msg)
+            return info
+
+    def set_connected(self, connected: bool) -> None:
+        """
+        reports a change of the connection. Once connected, the buffered messages are replayed
+
+        :param connected: True, if the client is connected
+        """
+        with self._lock:
+            self._connected = connected
+            if connected:
+                self._replay()
+
+    def close(self) -> None:
+        """
+        moves the buffered messages to the spill file, if there is one, and closes it.
+        They are replayed by the next run
+        """
+        with self._lock:
+            if self.spill_path is not None:
+                while self._history or self._latest:
+                    self._evict()
+            self._close_spill()
+
+    def _buffer(self, msg: _Message) -> None:
+        """
+        adds a message to the buffer and moves the oldest messages out of memory while it exceeds the budget
+
+        :param msg: message to buffer
+        """
+        if msg.topic in self.history:
+            self._history.append(msg)
+        else:
+            old = self._latest.pop(msg.topic, None)
+            if old is not None:
+                self._bytes -= _size(old)
+                self.coalesced += 1
+            self._latest[msg.topic] = msg
+        self._bytes += _size(msg)
+
+        if self._bytes > self.max_bytes:
+            while self._bytes > self.max_bytes and (self._history or self._latest):
+                self._evict()
+            if self._spill is not None:
+                self._spill.flush()
+
+    def _evict(self) -> None:
+        """
+        moves the oldest buffered message to the spill file, or drops it without one.
+        History messages go first, as the latest messages are bounded by the number of topics
+        """
+        if self._history:
+            msg = self._history.popleft()
+        else:
+            msg = self._latest.pop(next(iter(self._latest)))
+        self._bytes -= _size(msg)
+        if self.spill_path is None:
+            self.dropped += 1
+            return
+
+        if self._spill is None:
+            self._spill = open(self.spill_path, "ab")  # pylint: disable=R1732
+        topic = msg.topic.encode("utf-8")
+        payload = encode_payload(msg.payload)
+        self._spill.write(SPILL_RECORD.pack(len(topic), len(payload), msg.qos, msg.retain) + topic + payload)
+        self.spilled += 1
+
+    def _read_spill(self) -> Iterator[_Message]:
+        """
+        reads the spill file, a record truncated by a crash ends it
+
+        :return: iterator over the spilled messages, oldest first
+        """
+        with open(self.spill_path, "rb") as file:  # type: ignore
+            while True:
+                header = file.read(SPILL_RECORD.size)
+                if len(header) < SPILL_RECORD.size:
+                    return
+                topic_len, payload_len, qos, retain = SPILL_RECORD.unpack(header)
+                data = file.read(topic_len + payload_len)
+                if len(data) < topic_len + payload_len:
+                    return
+                yield _Message(data[:topic_len].decode("utf-8"), data[topic_len:], qos, retain)
+
+    def _close_spill(self) -> None:
+        """
+        closes the spill file if it is open
+        """
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _replay(self) -> None:
+        """
+        publishes the spilled and the buffered messages, coalesced to the latest message per topic.
+        If the client rejects a message for a lost connection or raises, it and all later messages are
+        buffered again and the buffer stays disconnected until the next :meth:`set_connected`
+        """
+        messages: List[_Message] = []
+        if self.spilled:
+            self._close_spill()
+            spilled: Dict[str, _Message] = {}
+            for msg in self._read_spill():
+                if msg.topic in self.history:
+                    messages.append(msg)
+                elif msg.topic not in self._latest:
+                    spilled.pop(msg.topic, None)
+                    spilled[msg.topic] = msg
+            messages.extend(spilled.values())
+            os.remove(self.spill_path)  # type: ignore
+            self.spilled = 0
+
+        messages.extend(self._history)
+        messages.extend(self._latest.values())
+        self._history = deque()
+        self._latest = {}
+        self._bytes = 0
+        for count, msg in enumerate(messages):
+            if not self._send(msg):
+                self._connected = False
+                for rest in messages[count:]:
+                    self._buffer(rest)
+                self._logger.warning("replay interrupted, buffered %s messages again", len(messages) - count)
+                return
+        if messages:
+            self._logger.info("replayed %s buffered messages", len(messages))
+
+    def _send(self, msg: _Message) -> bool:
+        """
+        publishes a replayed message
+
+        :param msg: the message
+        :return: False, if the client rejected it for a missing connection or raised
+        """
+        try:
+            info = self._client.publish(msg.topic, msg.payload, qos=msg.qos, retain=msg.retain)
+        except Exception:  # pylint: disable=W0703
+            self._logger.exception("could not publish message on %s", msg.topic)
+            return False
+        return getattr(info, "rc", None) != MQTT_ERR_NO_CONN
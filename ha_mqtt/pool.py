@@ -0,0 +1,90 @@
+"""
+this module contains the ClientPool, that spreads the entities of a process over multiple mqtt connections
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import zlib
+from typing import Callable, List
+
+from paho.mqtt.client import Client  # type: ignore
+
+
+class ClientPool:
+    """
+    pool of paho clients, each with its own connection and network loop thread.
+
+    Pass the pool as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings`.
+    Every entity is assigned to one of the clients by hashing its unique id,
+    so an entity always uses the same connection, also after a restart.
+
+    :param factory: creates the client of a connection, called with the index of the connection
+    :param size: number of connections
+    :param will_topic: will topic of the connections, `{index}` is replaced by the index of the connection.
+        If set, every client gets an `offline` will on its own topic and
+        the entities on it use this topic as will topic, unless they set their own
+
+    .. code-block:: python
+
+       pool = ClientPool(lambda index: Client(CallbackAPIVersion.VERSION2, f"gateway-{index}"),
+                         size=4, will_topic="gateway/conn-{index}/available")
+       pool.connect("localhost")
+       sensor = MqttSensor(MqttDeviceSettings("Sensor", "sensor_1", pool), ...)
+
+    .. note::
+       a :class:`~ha_mqtt.publisher.RateLimitedPublisher` or other publisher in the settings
+       sends the messages with its own client, not with the client of the pool
+    """
+
+    def __init__(self, factory: Callable[[int], Client], size: int = 4, will_topic: str = ""):
+        assert size > 0, "at least one connection is required"
+        self.clients: List[Client] = [factory(index) for index in range(size)]
+        self.will_topics = [will_topic.format(index=index) if will_topic else "" for index in range(size)]
+        for client, topic in zip(self.clients, self.will_topics):
+            if topic:
+                client.will_set(topic, "offline", retain=True)
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def index_for(self, unique_id: str) -> int:
+        """
+        :param unique_id: unique id of an entity
+        :return: index of the connection the entity uses
+        """
+        return zlib.crc32(unique_id.encode("utf-8")) % len(self.clients)
+
+    def client_for(self, unique_id: str) -> Client:
+        """
+        :param unique_id: unique id of an entity
+        :return: client the entity uses
+        """
+        return self.clients[self.index_for(unique_id)]
+
+    def will_topic_for(self, unique_id: str) -> str:
+        """
+        :param unique_id: unique id of an entity
+        :return: will topic of the connection the entity uses, empty if no will is set
+        """
+        return self.will_topics[self.index_for(unique_id)]
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60) -> None:
+        """
+        connects all clients and starts their network loops
+
+        :param host: hostname or ip of the broker
+        :param port: port of the broker
+        :param keepalive: keepalive interval in seconds
+        """
+        for client in self.clients:
+            client.connect(host, port, keepalive)
+            client.loop_start()
+
+    def disconnect(self) -> None:
+        """
+        disconnects all clients and stops their network loops
+        """
+        for client in self.clients:
+            client.disconnect()
+            client.loop_stop()
@@ -0,0 +1,347 @@
+"""
+this module contains optional background publishers
+that decouple the entities from the network speed of the paho client
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Protocol, Tuple, Union
+
+from paho.mqtt.client import Client  # type: ignore
+
+PayloadType = Union[str, bytes, bytearray, int, float, None]
+
+
+class Publisher(Protocol):  # pylint: disable=R0903
+    """
+    interface of all objects entities can publish their messages with.
+    It matches the signature of paho's `Client.publish()`
+    """
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes or queues a message
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+
+
+def payload_size(payload: PayloadType) -> int:
+    """
+    calculates the size in bytes a payload will occupy on the wire,
+    using the same conversion rules as paho does
+
+    :param payload: payload as passed to publish()
+    :return: number of payload bytes
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray)):
+        return len(payload)
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return len(str(payload))
+
+
+def encode_payload(payload: PayloadType) -> bytes:
+    """
+    converts a payload to the bytes sent on the wire, using the same rules as paho does
+
+    :param payload: payload as passed to publish()
+    :return: payload bytes
+    """
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if isinstance(payload, (int, float)):
+        return str(payload).encode("ascii")
+    raise TypeError("payload must be a string, bytearray, int, float or None.")
+
+
+class TokenBucket:  # pylint: disable=R0903
+    """
+    simple token bucket used for rate limiting.
+    Tokens refill continuously with `rate` tokens per second up to `capacity`.
+
+    :param rate: tokens added per second
+    :param capacity: maximum amount of tokens the bucket can hold, defines the burst size
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        assert rate > 0, "the rate must be greater than zero"
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+
+    def consume(self, amount: float) -> float:
+        """
+        takes `amount` tokens out of the bucket.
+        The bucket may go into debt, the returned delay is the time the caller
+        has to wait until the debt is paid back.
+
+        :param amount: amount of tokens to take
+        :return: time in seconds to wait before the action may be executed
+        """
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+        # items larger than the bucket would block forever, let them pass with a full bucket
+        self._tokens -= min(amount, self.capacity)
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+
+class _Message(NamedTuple):
+    topic: str
+    payload: PayloadType
+    qos: int
+    retain: bool
+
+
+class RateLimitedPublisher:
+    """
+    publishes messages from a background thread, limited by a token bucket.
+
+    Entities hand off their messages to this publisher and return immediately,
+    instead of publishing and sleeping in the calling thread.
+    Pass an instance via :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to use it.
+    Messages are published in the order they were handed in.
+
+    :param client: paho mqtt client instance used to actually send the messages
+    :param msg_rate: maximum number of messages per second, None to disable the limit
+    :param byte_rate: maximum number of payload bytes per second, None to disable the limit
+    :param burst: number of messages that may be sent back to back before the message limit kicks in
+    :param max_queue: maximum number of queued messages, 0 for unlimited.
+        When the queue is full, publish() blocks until there is space again
+
+    .. note::
+       call :meth:`start` before or after the entities are started and :meth:`stop`
+       after all entities are stopped to flush the remaining messages
+    """
+
+    def __init__(
+            self,
+            client: Client,
+            msg_rate: Optional[float] = 100.0,
+            byte_rate: Optional[float] = None,
+            burst: int = 10,
+            max_queue: int = 0,
+    ):
+        self._client = client
+        self._msg_bucket = TokenBucket(msg_rate, burst) if msg_rate else None
+        self._byte_bucket = TokenBucket(byte_rate, byte_rate) if byte_rate else None
+        self._queue: "queue.Queue[Optional[_Message]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        # True, once the stop marker for the running thread is queued
+        self._stopping = False
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        :return: True, if the background thread is running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: approximate number of messages waiting to be published
+        """
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """
+        starts the background thread that publishes the queued messages
+        """
+        if self.is_running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ha_mqtt_publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        publishes all remaining messages and stops the background thread
+
+        :param timeout: maximum time in seconds to wait for the queue to drain.
+            If it is exceeded, the thread keeps draining the queue and stop() can be called again to wait for it
+        """
+        if not self.is_running:
+            return
+        if not self._stopping:
+            self._queue.put(None)
+            self._stopping = True
+        self._thread.join(timeout)  # type: ignore
+        if not self._thread.is_alive():  # type: ignore
+            self._thread = None
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        queues a message for publishing, same signature as paho's `Client.publish()`
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+        self._queue.put(_Message(topic, payload, qos, retain))
+
+    def _delay(self, msg: _Message) -> float:
+        """
+        consumes the tokens required by the message
+
+        :param msg: message to send
+        :return: time in seconds to wait before sending
+        """
+        delay = 0.0
+        if self._msg_bucket is not None:
+            delay = self._msg_bucket.consume(1)
+        if self._byte_bucket is not None:
+            delay = max(delay, self._byte_bucket.consume(payload_size(msg.payload)))
+        return delay
+
+    def _run(self) -> None:
+        """
+        worker loop of the background thread
+        """
+        while True:
+            msg = self._queue.get()
+            if msg is None:
+                break
+
+            delay = self._delay(msg)
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                self._client.publish(msg.topic, msg.payload, qos=msg.qos, retain=msg.retain)
+            except Exception:  # pylint: disable=W0703
+                # the thread must keep running, all later messages would be lost otherwise
+                self._logger.exception("could not publish message on %s", msg.topic)
+
+
+class CoalescingPublisher:
+    """
+    publishes messages from a background thread at a fixed cadence, keeping only the latest message per topic.
+
+    Every topic has a single pending slot. A newer message overwrites an older one that wasn't sent yet,
+    so memory is bounded to one message per topic regardless of how fast the entities update.
+    Pass an instance via :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to use it.
+
+    :param client: paho mqtt client or another publisher, for example a
+        :class:`RateLimitedPublisher`, the messages are handed to
+    :param interval: time in seconds between two flushes
+
+    .. note::
+       Intermediate values are dropped. Only use this for entities where the latest value is all that matters
+    """
+
+    def __init__(self, client: Union[Client, Publisher], interval: float = 0.1):
+        self._client = client
+        self.interval = interval
+        self.coalesced = 0
+        """
+        number of messages that were overwritten before they were sent
+        """
+
+        self._pending: Dict[str, _Message] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        :return: True, if the background thread is running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: number of topics with a message waiting to be published
+        """
+        return len(self._pending)
+
+    def start(self) -> None:
+        """
+        starts the background thread that flushes the pending messages
+        """
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ha_mqtt_coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        stops the background thread and publishes all pending messages
+        """
+        if self.is_running:
+            self._stop_event.set()
+            self._thread.join()  # type: ignore
+            self._thread = None
+        self.flush()
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> None:
+        """
+        stores a message in the slot of its topic, same signature as paho's `Client.publish()`
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+        with self._lock:
+            if topic in self._pending:
+                self.coalesced += 1
+            self._pending[topic] = _Message(topic, payload, qos, retain)
+
+    def publish_many(self, messages: Iterable[Tuple[str, PayloadType, int, bool]]) -> None:
+        """
+        stores multiple messages at once, see :meth:`publish`
+
+        :param messages: (topic, payload, qos, retain) tuples
+        """
+        with self._lock:
+            for topic, payload, qos, retain in messages:
+                if topic in self._pending:
+                    self.coalesced += 1
+                self._pending[topic] = _Message(topic, payload, qos, retain)
+
+    def flush(self) -> None:
+        """
+        publishes all pending messages, in the order their topics were first updated
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for msg in pending.values():
+            try:
+                self._client.publish(msg.topic, msg.payload, qos=msg.qos, retain=msg.retain)
+            except Exception:  # pylint: disable=W0703
+                # the rest of the batch and the thread must keep going
+                self._logger.exception("could not publish message on %s", msg.topic)
+
+    def _run(self) -> None:
+        """
+        worker loop of the background thread
+        """
+        while not self._stop_event.wait(self.interval):
+            self.flush()
@@ -0,0 +1,145 @@
+"""
+this module contains the BirthListener, that rediscovers all entities once homeassistant restarted
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import logging
+import random
+import threading
+from typing import Any, List, Optional, Set
+
+from .mqtt_device_base import MqttDeviceBase
+from .transport import MqttClient
+
+
+class BirthListener:
+    """
+    listens for the birth message of homeassistant and republishes the discovery payloads,
+    availability and last states of all registered entities.
+
+    The entities are republished one after another spread over `window` seconds,
+    starting after a random delay of up to `jitter` seconds,
+    so multiple applications don't hit the broker at the same instant.
+
+    :param client: client to subscribe the status topic with
+    :param window: time in seconds the republishing is spread over
+    :param jitter: maximum random delay in seconds before the republishing starts
+    :param status_topic: topic homeassistant publishes its status on,
+        defaults to `<basetopic>/status`
+
+    .. note::
+       the republishing runs in a background thread. A new birth message restarts it.
+    """
+
+    birth_payload = b"online"
+    """
+    payload homeassistant sends on the status topic once it started
+    """
+
+    def __init__(self, client: MqttClient, window: float = 10.0, jitter: float = 5.0,
+                 status_topic: Optional[str] = None):
+        self._client = client
+        self.window = window
+        self.jitter = jitter
+        self.status_topic = status_topic or f"{MqttDeviceBase.base_topic}/status"
+
+        self._entities: List[MqttDeviceBase] = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        :return: True, if a rediscovery is in progress
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def register(self, entity: MqttDeviceBase) -> None:
+        """
+        adds an entity to be rediscovered
+
+        :param entity: the entity
+        """
+        with self._lock:
+            self._entities.append(entity)
+
+    def unregister(self, entity: MqttDeviceBase) -> None:
+        """
+        removes an entity
+
+        :param entity: the entity
+        """
+        with self._lock:
+            self._entities.remove(entity)
+
+    def start(self) -> None:
+        """
+        subscribes to the status topic of homeassistant
+        """
+        self._client.message_callback_add(self.status_topic, self._status_callback)
+        self._client.subscribe(self.status_topic)
+
+    def stop(self) -> None:
+        """
+        cancels a running rediscovery, waits for it to stop and unsubscribes from the status topic
+        """
+        self._cancel.set()
+        self.wait()
+        self._client.unsubscribe(self.status_topic)
+        self._client.message_callback_remove(self.status_topic)
+
+    def trigger(self) -> None:
+        """
+        starts a rediscovery of all registered entities, cancelling a running one.
+        The cancelled run stops after the entity it is republishing, without being waited for,
+        as this is called from the network thread of the client
+        """
+        with self._lock:
+            self._cancel.set()
+            entities = list(self._entities)
+            self._cancel = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(entities, self._cancel),
+                                            name="ha_mqtt_rediscovery", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        waits for a running rediscovery to finish
+
+        :param timeout: maximum time to wait in seconds
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _status_callback(self, client: Any, userdata: Any, msg: Any) -> None:  # pylint: disable=W0613
+        """
+        paho callback of the status topic
+
+        :param client: the client that received the message
+        :param userdata: user defined data of the client
+        :param msg: the received message
+        """
+        if msg.payload == self.birth_payload:
+            self._logger.info("homeassistant is online, rediscovering entities")
+            self.trigger()
+
+    def _run(self, entities: List[MqttDeviceBase], cancel: threading.Event) -> None:
+        """
+        republishes the entities spread over the window
+
+        :param entities: entities to republish
+        :param cancel: event that is set to cancel the run
+        """
+        if cancel.wait(random.uniform(0, self.jitter)):
+            return
+
+        interval = self.window / len(entities) if entities else 0
+        sent: Set[str] = set()
+        for entity in entities:
+            entity.rediscover(sent)
+            if cancel.wait(interval):
+                return
@@ -0,0 +1,228 @@
+"""
+this module contains the EntityRegistry, that restores all entities after the client reconnected
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+# the registry restores the entities in bulk and needs their internals
+# pylint: disable=protected-access
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from paho.mqtt.client import Client  # type: ignore
+
+from .discovery import start_all
+from .mqtt_device_base import MqttDeviceBase
+from .offline import OfflineBuffer
+from .transport import MqttClient
+
+
+def _session_present(flags: Any) -> bool:
+    """
+    :param flags: connect flags passed to `on_connect`, an object in paho's callback api version 2, a dict before
+    :return: True, if the broker kept the session of the client
+    """
+    if isinstance(flags, dict):
+        return bool(flags.get("session present"))
+    return bool(getattr(flags, "session_present", False))
+
+
+def _is_failure(reason_code: Any) -> bool:
+    """
+    :param reason_code: reason code passed to `on_connect`, a `ReasonCode` or an int
+    :return: True, if the connection attempt failed
+    """
+    return bool(getattr(reason_code, "is_failure", reason_code != 0))
+
+
+class EntityRegistry:
+    """
+    hooks the connection callbacks of a client once for all registered entities.
+
+    On the first connect, the entities that aren't started yet are started with
+    :func:`~ha_mqtt.discovery.start_all`. On a reconnect, the entities are restored in bulk:
+
+    - if the broker kept the session, only the availability is reported again,
+      once per topic as entities often share their availability and will topics
+    - otherwise, the subscriptions are sent as a few multi topic packets and the discovery payloads,
+      availability and last states are republished
+
+    The entities are restored in a background thread, so the network loop isn't blocked.
+
+    :param client: paho mqtt client whose `on_connect` and `on_disconnect` callbacks are hooked.
+        Callbacks set before :meth:`attach` are still called
+    :param buffer: :class:`~ha_mqtt.offline.OfflineBuffer` to report the connection changes to
+    :param max_topics: maximum number of topics per SUBSCRIBE packet
+    :param qos: quality of service level used for the subscriptions
+
+    .. code-block:: python
+
+       registry = EntityRegistry(client)
+       registry.register(switch)
+       registry.attach()
+       client.connect("localhost")
+       client.loop_start()
+
+    .. note::
+       connect with a persistent session (`clean_start=False` in MQTTv5, `clean_session=False` before)
+       to skip the rediscovery on reconnects
+    """
+
+    def __init__(self, client: Client, buffer: Optional[OfflineBuffer] = None, max_topics: int = 100, qos: int = 0):
+        assert max_topics > 0, "at least one topic per packet is required"
+        self._client = client
+        self.buffer = buffer
+        self.max_topics = max_topics
+        self.qos = qos
+
+        self.reconnects = 0
+        """
+        number of connects that restored started entities
+        """
+
+        self._entities: List[MqttDeviceBase] = []
+        self._connected = False
+        self._previous: Tuple[Any, Any] = (None, None)
+        self._lock = threading.Lock()
+        self._restore_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def entities(self) -> List[MqttDeviceBase]:
+        """
+        :return: all registered entities
+        """
+        with self._lock:
+            return list(self._entities)
+
+    @property
+    def is_connected(self) -> bool:
+        """
+        :return: True, if the client is connected
+        """
+        return self._connected
+
+    def register(self, entity: MqttDeviceBase) -> None:
+        """
+        adds an entity to be restored after reconnects
+
+        :param entity: the entity
+        """
+        with self._lock:
+            self._entities.append(entity)
+
+    def unregister(self, entity: MqttDeviceBase) -> None:
+        """
+        removes an entity
+
+        :param entity: the entity
+        """
+        with self._lock:
+            self._entities.remove(entity)
+
+    def attach(self) -> None:
+        """
+        hooks the `on_connect` and `on_disconnect` callbacks of the client
+        """
+        self._previous = (self._client.on_connect, self._client.on_disconnect)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+
+    def detach(self) -> None:
+        """
+        restores the callbacks the client had before :meth:`attach`
+        """
+        self._client.on_connect, self._client.on_disconnect = self._previous
+        self._previous = (None, None)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        waits for a running restore to finish
+
+        :param timeout: maximum time to wait in seconds
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def restore(self, session_present: bool = False) -> None:
+        """
+        starts the entities that aren't started yet and restores the started ones.
+        Called in a background thread after every successful connect
+
+        :param session_present: True, if the broker kept the subscriptions of the client
+        """
+        with self._restore_lock:
+            if self.buffer is not None:
+                self.buffer.set_connected(True)
+
+            entities = self.entities
+            started = [entity for entity in entities if entity.is_started]
+            sent: Set[str] = set()
+            if session_present:
+                for entity in started:
+                    for topic, payload, qos in entity._availability_messages():
+                        if topic not in sent:
+                            sent.add(topic)
+                            entity._sink.publish(topic, payload, qos=qos, retain=True)
+            else:
+                self._resubscribe(started)
+                for entity in started:
+                    entity.rediscover(sent)
+
+            pending = [entity for entity in entities if not entity.is_started]
+            if pending:
+                start_all(pending)
+            self._logger.info("restored %s and started %s entities", len(started), len(pending))
+
+    def _resubscribe(self, entities: List[MqttDeviceBase]) -> None:
+        """
+        subscribes the topics of the entities again, in as few packets as possible.
+        Clients that track their subscriptions, such as a :class:`~ha_mqtt.subscriptions.SubscriptionManager`,
+        restore them themselves
+
+        :param entities: started entities
+        """
+        topics: Dict[int, Tuple[MqttClient, Dict[str, None]]] = {}
+        for entity in entities:
+            client = entity._client
+            if id(client) not in topics:
+                topics[id(client)] = (client, {})
+                if hasattr(type(client), "resubscribe"):
+                    client.resubscribe()  # type: ignore
+            if not hasattr(type(client), "resubscribe"):
+                topics[id(client)][1].update(dict.fromkeys(entity.subscriptions))
+
+        for client, subs in topics.values():
+            subscribe = list(subs)
+            for start in range(0, len(subscribe), self.max_topics):
+                client.subscribe([(topic, self.qos) for topic in subscribe[start:start + self.max_topics]])
+
+    def _on_connect(self, *args: Any) -> None:
+        """
+        paho `on_connect` callback, for all callback api versions
+        """
+        if self._previous[0] is not None:
+            self._previous[0](*args)
+        if _is_failure(args[3]):
+            return
+
+        if any(entity.is_started for entity in self.entities):
+            self.reconnects += 1
+        self._connected = True
+        self._thread = threading.Thread(target=self.restore, args=(_session_present(args[2]),),
+                                        name="ha_mqtt_reconnect", daemon=True)
+        self._thread.start()
+
+    def _on_disconnect(self, *args: Any) -> None:
+        """
+        paho `on_disconnect` callback, for all callback api versions
+        """
+        if self._previous[1] is not None:
+            self._previous[1](*args)
+        self._connected = False
+        if self.buffer is not None:
+            self.buffer.set_connected(False)
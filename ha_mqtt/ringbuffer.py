@@ -0,0 +1,249 @@
+"""
+this module contains a shared memory ring buffer, that lets other processes feed values to the entities
+of the process owning the mqtt connection, without pickling and without their own connection
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .mqtt_device_base import MqttDeviceBase
+
+HEADER = struct.Struct("<QQQQ")
+"""
+number of records written and read so far, the capacity of the buffer and
+the id of the resource tracker of the creating process
+"""
+
+RECORD = struct.Struct("<Id")
+"""
+index of the entity and value of a record
+"""
+
+
+def _tracker_id() -> int:
+    """
+    :return: id of the resource tracker of this process,
+        processes started through multiprocessing share the tracker of their parent
+    """
+    if os.name != "posix":
+        return 0
+    # the pipe to the tracker is inherited, so its inode is the same in all processes sharing it
+    return os.fstat(resource_tracker.getfd()).st_ino  # type: ignore
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    opens an existing shared memory block without keeping it registered with the resource tracker.
+    Before python 3.13, the tracker of an attaching process that isn't a child of the creator
+    would unlink the block when that process exits
+
+    :param name: name of the block
+    :return: the block
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore  # pylint: disable=E1123
+    shm = shared_memory.SharedMemory(name=name)
+    # a process sharing the tracker of the creator shares its registration as well, which must be kept
+    if os.name == "posix" and HEADER.unpack_from(shm.buf, 0)[3] != _tracker_id():  # type: ignore
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore  # pylint: disable=W0212
+    return shm
+
+
+class SharedRingBuffer:
+    """
+    ring buffer of (entity index, value) records in shared memory, for exactly one writing and one reading process.
+
+    Create it in the process owning the entities and attach to it in the worker process by its :attr:`name`.
+    The writer only moves the write counter and the reader only moves the read counter,
+    so no lock between the processes is needed.
+
+    :param capacity: maximum number of records in the buffer
+    :param name: name of an existing buffer to attach to, None to create a new one
+    """
+
+    def __init__(self, capacity: int = 4096, name: Optional[str] = None):
+        if name is None:
+            assert capacity > 0, "the capacity must be greater than zero"
+            self._shm = shared_memory.SharedMemory(create=True, size=HEADER.size + capacity * RECORD.size)
+            HEADER.pack_into(self._buf, 0, 0, 0, capacity, _tracker_id())
+        else:
+            # the size of an existing block may be rounded up to the page size, so the capacity is stored
+            self._shm = _attach(name)
+        self.capacity: int = HEADER.unpack_from(self._buf, 0)[2]
+
+        self.dropped = 0
+        """
+        number of records this process could not write because the buffer was full
+        """
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRingBuffer":
+        """
+        attaches to a buffer created in another process
+
+        :param name: name of the buffer
+        :return: the buffer
+        """
+        return cls(name=name)
+
+    @property
+    def _buf(self) -> memoryview:
+        """
+        :return: the shared memory
+        """
+        return self._shm.buf  # type: ignore
+
+    @property
+    def name(self) -> str:
+        """
+        :return: name of the shared memory block, pass it to the worker process
+        """
+        return self._shm.name
+
+    def __len__(self) -> int:
+        written, read = HEADER.unpack_from(self._buf, 0)[:2]
+        return written - read
+
+    def write(self, index: int, value: float, timeout: Optional[float] = 0.0) -> bool:
+        """
+        appends a record, only call this from the writing process
+
+        :param index: index of the entity in the reader's entity list
+        :param value: value to hand to the entity
+        :param timeout: time in seconds to wait for space when the buffer is full, None to wait forever
+        :return: False, if the record was dropped because the buffer stayed full
+        """
+        buf = self._buf
+        written = HEADER.unpack_from(buf, 0)[0]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while written - HEADER.unpack_from(buf, 0)[1] >= self.capacity:
+            if deadline is not None and time.monotonic() >= deadline:
+                self.dropped += 1
+                return False
+            time.sleep(0.0005)
+
+        RECORD.pack_into(buf, HEADER.size + (written % self.capacity) * RECORD.size, index, value)
+        # publish the record by moving the write counter after the record is complete
+        struct.pack_into("<Q", buf, 0, written + 1)
+        return True
+
+    def read(self, max_records: int = 0) -> List[Tuple[int, float]]:
+        """
+        takes the available records out of the buffer, only call this from the reading process
+
+        :param max_records: maximum number of records to take, 0 for all
+        :return: list of (entity index, value) records, oldest first
+        """
+        buf = self._buf
+        written, read = HEADER.unpack_from(buf, 0)[:2]
+        count = written - read
+        if max_records:
+            count = min(count, max_records)
+        records = [RECORD.unpack_from(buf, HEADER.size + ((read + i) % self.capacity) * RECORD.size)
+                   for i in range(count)]
+        struct.pack_into("<Q", buf, 8, read + count)
+        return records
+
+    def close(self) -> None:
+        """
+        detaches this process from the buffer
+        """
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        frees the shared memory, call this in the creating process after all processes closed the buffer
+        """
+        self._shm.unlink()
+
+
+class RingBufferIngest:
+    """
+    reads the records of one or more :class:`SharedRingBuffer` in a background thread
+    and hands the values to the entities with :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.update_state`.
+
+    Only the latest value of an entity is used per poll, older values read in the same poll are skipped.
+
+    :param entities: entities the indices of the records refer to
+    :param buffers: buffers to read, usually one per worker process
+    :param interval: time in seconds to sleep when all buffers are empty
+    """
+
+    def __init__(self, entities: Sequence[MqttDeviceBase], buffers: Sequence[SharedRingBuffer],
+                 interval: float = 0.01):
+        self.entities = list(entities)
+        self.buffers = list(buffers)
+        self.interval = interval
+        self.received = 0
+        """
+        number of records read
+        """
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        :return: True, if the background thread is running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        starts the background thread
+        """
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ha_mqtt_ringbuffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        stops the background thread and hands the remaining records to the entities
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.poll()
+
+    def poll(self) -> int:
+        """
+        reads all buffers once and updates the entities
+
+        :return: number of records read
+        """
+        latest: Dict[int, float] = {}
+        count = 0
+        for buffer in self.buffers:
+            records = buffer.read()
+            count += len(records)
+            latest.update(records)
+        self.received += count
+
+        for index, value in latest.items():
+            if index >= len(self.entities):
+                self._logger.warning("received value for unknown entity index %s", index)
+                continue
+            self.entities[index].update_state(value)
+        return count
+
+    def _run(self) -> None:
+        """
+        worker loop of the background thread
+        """
+        while not self._stop_event.is_set():
+            if not self.poll():
+                self._stop_event.wait(self.interval)
@@ -0,0 +1,168 @@
+"""
+this module contains the TopicRouter, that dispatches the messages of all entities
+through a few wildcard subscriptions
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS  # type: ignore
+
+from .mqtt_device_base import MqttDeviceBase
+from .publisher import PayloadType
+from .transport import MessageHandler, MqttClient, SubscribeTopics, UnsubscribeTopics
+
+
+class TopicRouter:
+    """
+    wraps a paho client and routes the entity topics through wildcard subscriptions.
+
+    Instead of one subscription and one paho callback per topic, the router subscribes once to
+    `<basetopic>/+/+/<suffix>` for each suffix and looks up the callback of a received message in a dict.
+    Pass the router as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to use it.
+    All other topics are passed through to the client unchanged.
+
+    :param client: paho mqtt client instance
+    :param suffixes: last topic levels that are routed, by default command and state topics
+    :param base_topic: topic all routed topics are published under,
+        defaults to :attr:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.base_topic`
+
+    .. note::
+       the wildcard subscriptions also deliver messages of entities not registered with the router,
+       which are discarded after the dict lookup
+    """
+
+    def __init__(self, client: MqttClient, suffixes: Iterable[str] = ("set", "state"),
+                 base_topic: Optional[str] = None):
+        self._client = client
+        self._suffixes = set(suffixes)
+        self._base_topic = base_topic
+        self._routes: Dict[str, MessageHandler] = {}
+        self._subscribed: Set[str] = set()
+
+    @property
+    def base_topic(self) -> str:
+        """
+        :return: the topic all routed topics are published under
+        """
+        return self._base_topic or MqttDeviceBase.base_topic
+
+    @property
+    def routes(self) -> int:
+        """
+        :return: number of topics with a registered callback
+        """
+        return len(self._routes)
+
+    def _filter_for(self, topic: str) -> Optional[str]:
+        """
+        :param topic: topic to check
+        :return: the wildcard filter covering the topic, None if the topic is not routed
+        """
+        levels = topic.split("/")
+        if len(levels) == 4 and levels[0] == self.base_topic and levels[3] in self._suffixes and "+" not in levels:
+            return f"{self.base_topic}/+/+/{levels[3]}"
+        return None
+
+    def resubscribe(self) -> None:
+        """
+        subscribes the wildcard filters again, for example after a reconnect without a persistent session.
+        Topics that are not routed were subscribed on the client directly and are not restored
+        """
+        if self._subscribed:
+            self._client.subscribe([(wildcard, 0) for wildcard in sorted(self._subscribed)])
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message on the client, same signature as paho's `Client.publish()`
+        """
+        return self._client.publish(topic, payload, qos=qos, retain=retain)
+
+    def subscribe(self, topic: SubscribeTopics) -> Any:
+        """
+        subscribes the wildcard filters covering the topics if necessary.
+        Topics that are not routed are subscribed on the client directly.
+
+        :param topic: topic or list of (topic, qos) tuples to subscribe to
+        :return: result of the client's subscribe call
+        """
+        topics = [(topic, 0)] if isinstance(topic, str) else topic
+        forward: List[Tuple[str, int]] = []
+        for sub, qos in topics:
+            wildcard = self._filter_for(sub)
+            if wildcard is None:
+                forward.append((sub, qos))
+            elif wildcard not in self._subscribed:
+                self._subscribed.add(wildcard)
+                self._client.message_callback_add(wildcard, self._dispatch)
+                forward.append((wildcard, qos))
+
+        if not forward:
+            return MQTT_ERR_SUCCESS, None
+        if isinstance(topic, str):
+            return self._client.subscribe(forward[0][0])
+        return self._client.subscribe(forward)
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> Any:
+        """
+        removes the routes of the topics. A topic ending with `/#` removes all routes below it.
+        The wildcard subscriptions are kept, all other topics are unsubscribed on the client.
+
+        :param topic: topic or list of topics to unsubscribe from
+        :return: result of the client's unsubscribe call
+        """
+        topics = [topic] if isinstance(topic, str) else topic
+        forward: List[str] = []
+        for sub in topics:
+            if self._filter_for(sub) is not None:
+                self._routes.pop(sub, None)
+                continue
+            if sub.endswith("/#"):
+                prefix = sub[:-1]
+                for route in [route for route in self._routes if route.startswith(prefix)]:
+                    del self._routes[route]
+            forward.append(sub)
+
+        if not forward:
+            return MQTT_ERR_SUCCESS, None
+        if isinstance(topic, str):
+            return self._client.unsubscribe(forward[0])
+        return self._client.unsubscribe(forward)
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers the callback of a topic.
+        Topics that are not routed are registered on the client directly.
+
+        :param sub: topic to register the callback for
+        :param callback: paho style callback
+        """
+        if self._filter_for(sub) is None:
+            self._client.message_callback_add(sub, callback)
+        else:
+            self._routes[sub] = callback
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes the callback of a topic
+
+        :param sub: topic to remove the callback from
+        """
+        if self._filter_for(sub) is None:
+            self._client.message_callback_remove(sub)
+        else:
+            self._routes.pop(sub, None)
+
+    def _dispatch(self, client: Any, userdata: Any, msg: Any) -> None:
+        """
+        paho callback of the wildcard subscriptions, hands the message to the registered callback
+
+        :param client: the client that received the message
+        :param userdata: user defined data of the client
+        :param msg: the received message
+        """
+        callback = self._routes.get(msg.topic)
+        if callback is not None:
+            callback(client, userdata, msg)
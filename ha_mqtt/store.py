@@ -0,0 +1,200 @@
+"""
+this module contains the StateStore, that keeps the last published state of the entities on disk,
+so an application can restart without resending everything
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .publisher import PayloadType
+
+
+class StoredEntity(NamedTuple):
+    """
+    last known state of an entity
+    """
+
+    state: PayloadType
+    """
+    last published state payload, None if none was published
+    """
+
+    digest: Optional[str]
+    """
+    digest of the last published discovery payload, None if it was never published
+    """
+
+    available: Optional[bool]
+    """
+    last reported availability, None if it was never reported
+    """
+
+
+_EMPTY = StoredEntity(None, None, None)
+
+
+class StateStore:
+    """
+    sqlite backed store of the last published state, discovery digest and availability of each entity.
+
+    Pass it to :meth:`~ha_mqtt.mqtt_device_base.MqttDeviceBase.set_state_store` before starting the entities.
+    On start, an entity restores its discovery digest, so unchanged configs are not sent again,
+    and its last state, so unchanged states are suppressed and switches keep their state instead of turning off.
+
+    All rows are loaded when the store is opened. Changes are collected and written in one transaction
+    at the latest `flush_interval` seconds after the first pending change, by a timer if no later change
+    triggers the write, and by :meth:`flush` and :meth:`close`.
+
+    :param path: path of the database file, `:memory:` for a store that is not persisted
+    :param flush_interval: maximum time in seconds changes are kept in memory before they are written
+
+    .. note::
+       the restored state is assumed to still be retained by the broker.
+       Don't use a store with a broker that doesn't persist its retained messages
+    """
+
+    def __init__(self, path: str = ":memory:", flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entities "
+                         "(unique_id TEXT PRIMARY KEY, state, digest TEXT, available INTEGER)")
+        self._db.commit()
+        self._entities: Dict[str, StoredEntity] = {
+            row[0]: StoredEntity(row[1], row[2], None if row[3] is None else bool(row[3]))
+            for row in self._db.execute("SELECT unique_id, state, digest, available FROM entities")
+        }
+        self._dirty: Dict[str, Optional[StoredEntity]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def load(self, unique_id: str) -> Optional[StoredEntity]:
+        """
+        :param unique_id: unique id of an entity
+        :return: the stored state of the entity, None if nothing is stored
+        """
+        return self._entities.get(unique_id)
+
+    def save_state(self, unique_id: str, state: PayloadType) -> None:
+        """
+        records the last published state of an entity
+
+        :param unique_id: unique id of the entity
+        :param state: published payload
+        """
+        if isinstance(state, bytearray):
+            state = bytes(state)
+        self._update(unique_id, state=state)
+
+    def save_states(self, states: Iterable[Tuple[str, PayloadType]]) -> None:
+        """
+        records the last published states of many entities at once
+
+        :param states: (unique id, published payload) tuples
+        """
+        with self._lock:
+            for unique_id, state in states:
+                self._change(unique_id, state=bytes(state) if isinstance(state, bytearray) else state)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def save_digest(self, unique_id: str, digest: Optional[str]) -> None:
+        """
+        records the digest of the last published discovery payload of an entity
+
+        :param unique_id: unique id of the entity
+        :param digest: the digest, None if the config was deleted
+        """
+        self._update(unique_id, digest=digest)
+
+    def save_availability(self, unique_id: str, available: bool) -> None:
+        """
+        records the last reported availability of an entity
+
+        :param unique_id: unique id of the entity
+        :param available: True, if the entity was reported as online
+        """
+        self._update(unique_id, available=available)
+
+    def remove(self, unique_id: str) -> None:
+        """
+        removes everything stored about an entity, for example after it was deleted
+
+        :param unique_id: unique id of the entity
+        """
+        with self._lock:
+            if self._entities.pop(unique_id, None) is not None:
+                self._dirty[unique_id] = None
+                self._schedule()
+
+    def _update(self, unique_id: str, **changes: Any) -> None:
+        """
+        changes fields of the stored state of an entity and writes the changes if they are due
+
+        :param unique_id: unique id of the entity
+        :param changes: new values of the fields of :class:`StoredEntity`
+        """
+        with self._lock:
+            self._change(unique_id, **changes)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _change(self, unique_id: str, **changes: Any) -> None:
+        """
+        changes fields of the stored state of an entity, must be called with the lock held
+
+        :param unique_id: unique id of the entity
+        :param changes: new values of the fields of :class:`StoredEntity`
+        """
+        old = self._entities.get(unique_id, _EMPTY)
+        new = old._replace(**changes)
+        if new != old or unique_id not in self._entities:
+            self._entities[unique_id] = new
+            self._dirty[unique_id] = new
+            self._schedule()
+
+    def _schedule(self) -> None:
+        """
+        starts the timer writing the pending changes, unless it runs already. Must be called with the lock held
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        writes all pending changes to the database
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not dirty:
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)",
+                    [(unique_id, *entity) for unique_id, entity in dirty.items() if entity is not None])
+                self._db.executemany(
+                    "DELETE FROM entities WHERE unique_id = ?",
+                    [(unique_id,) for unique_id, entity in dirty.items() if entity is None])
+
+    def close(self) -> None:
+        """
+        writes the pending changes and closes the database
+        """
+        self.flush()
+        self._db.close()
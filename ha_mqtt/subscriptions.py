@@ -0,0 +1,200 @@
+"""
+this module contains the SubscriptionManager, that batches the subscriptions of many entities
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS  # type: ignore
+
+from .publisher import PayloadType
+from .transport import MessageHandler, MqttClient, SubscribeTopics, UnsubscribeTopics
+
+
+class SubscriptionManager:
+    """
+    wraps a paho client, reference counts subscriptions and sends them as multi topic packets.
+
+    Inside a :meth:`batch` block, subscriptions and unsubscriptions are only collected and
+    sent as a few SUBSCRIBE/UNSUBSCRIBE packets once the block is left.
+    Outside of a batch they are sent right away.
+    A topic subscribed by multiple entities is only subscribed once and
+    only unsubscribed after the last entity unsubscribed it.
+    Entities pass themselves as owner, so an entity holds at most one reference per topic,
+    even if it was started twice.
+    Pass the manager as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings` to use it.
+
+    :param client: paho mqtt client instance
+    :param max_topics: maximum number of topics per packet
+    :param qos: quality of service level used for the subscriptions
+
+    .. code-block:: python
+
+       with manager.batch():
+           for entity in entities:
+               entity.start()
+    """
+
+    def __init__(self, client: MqttClient, max_topics: int = 100, qos: int = 0):
+        assert max_topics > 0, "at least one topic per packet is required"
+        self._client = client
+        self.max_topics = max_topics
+        self.qos = qos
+
+        self._counts: Dict[str, int] = {}
+        # owners holding a reference, by topic
+        self._owners: Dict[str, Set[str]] = {}
+        # dicts are used as ordered sets
+        self._pending_sub: Dict[str, None] = {}
+        self._pending_unsub: Dict[str, None] = {}
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    @property
+    def subscriptions(self) -> List[str]:
+        """
+        :return: all topics with at least one subscriber
+        """
+        return list(self._counts)
+
+    @contextmanager
+    def batch(self) -> Iterator["SubscriptionManager"]:
+        """
+        context manager that collects all subscriptions and sends them when the block is left.
+        Batches can be nested, the packets are sent when the outermost block is left
+        """
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+            if self._depth == 0:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        sends all collected subscriptions and unsubscriptions
+        """
+        with self._lock:
+            unsubscribe, self._pending_unsub = list(self._pending_unsub), {}
+            subscribe, self._pending_sub = list(self._pending_sub), {}
+
+        for start in range(0, len(unsubscribe), self.max_topics):
+            self._client.unsubscribe(unsubscribe[start:start + self.max_topics])
+        for start in range(0, len(subscribe), self.max_topics):
+            self._client.subscribe([(topic, self.qos) for topic in subscribe[start:start + self.max_topics]])
+
+    def resubscribe(self) -> None:
+        """
+        sends all current subscriptions again, for example after a reconnect without a persistent session
+        """
+        with self._lock:
+            subscribe = [topic for topic in self._counts if topic not in self._pending_sub]
+        for start in range(0, len(subscribe), self.max_topics):
+            self._client.subscribe([(topic, self.qos) for topic in subscribe[start:start + self.max_topics]])
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message on the client, same signature as paho's `Client.publish()`
+        """
+        return self._client.publish(topic, payload, qos=qos, retain=retain)
+
+    def subscribe(self, topic: SubscribeTopics, owner: Optional[str] = None) -> Any:
+        """
+        adds a reference to the topics and subscribes the ones that had none
+
+        :param topic: topic or list of (topic, qos) tuples to subscribe to
+        :param owner: unique id of the entity subscribing, it adds only one reference per topic.
+            None to add a reference with every call
+        :return: always success, errors are reported by the client when the packet is sent
+        """
+        topics = [topic] if isinstance(topic, str) else [sub for sub, _ in topic]
+        with self._lock:
+            for sub in topics:
+                if owner is not None:
+                    owners = self._owners.setdefault(sub, set())
+                    if owner in owners:
+                        continue
+                    owners.add(owner)
+                count = self._counts.get(sub, 0)
+                self._counts[sub] = count + 1
+                # still subscribed at the broker, if the unsubscription wasn't sent yet
+                if count == 0 and sub in self._pending_unsub:
+                    del self._pending_unsub[sub]
+                elif count == 0:
+                    self._pending_sub[sub] = None
+        self._auto_flush()
+        return MQTT_ERR_SUCCESS, None
+
+    def unsubscribe(self, topic: UnsubscribeTopics, owner: Optional[str] = None) -> Any:
+        """
+        removes a reference from the topics and unsubscribes the ones that have none left.
+        Unsubscribing a not subscribed filter ending with `/#` releases all topics below it.
+
+        :param topic: topic or list of topics to unsubscribe from
+        :param owner: unique id of the entity unsubscribing, only the references it holds are removed.
+            None to remove one reference per topic
+        :return: always success, errors are reported by the client when the packet is sent
+        """
+        topics = [topic] if isinstance(topic, str) else topic
+        with self._lock:
+            for sub in topics:
+                if sub in self._counts:
+                    self._release(sub, owner)
+                elif sub.endswith("/#"):
+                    prefix = sub[:-1]
+                    for child in [child for child in self._counts if child.startswith(prefix)]:
+                        self._release(child, owner)
+                else:
+                    # not subscribed through the manager, pass it on to the client
+                    self._pending_unsub[sub] = None
+        self._auto_flush()
+        return MQTT_ERR_SUCCESS, None
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a callback on the client
+        """
+        self._client.message_callback_add(sub, callback)
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes a callback from the client
+        """
+        self._client.message_callback_remove(sub)
+
+    def _release(self, topic: str, owner: Optional[str] = None) -> None:
+        """
+        removes one reference from a topic
+
+        :param topic: subscribed topic
+        :param owner: unique id of the entity releasing the reference, None for references without owner
+        """
+        if owner is not None:
+            owners = self._owners.get(topic)
+            if owners is None or owner not in owners:
+                return
+            owners.discard(owner)
+        count = self._counts.pop(topic) - 1
+        if count > 0:
+            self._counts[topic] = count
+            return
+        self._owners.pop(topic, None)
+        # a subscription that wasn't sent yet doesn't need an unsubscription
+        if topic in self._pending_sub:
+            del self._pending_sub[topic]
+        else:
+            self._pending_unsub[topic] = None
+
+    def _auto_flush(self) -> None:
+        """
+        sends the collected packets right away when not inside a batch
+        """
+        if self._depth == 0:
+            self.flush()
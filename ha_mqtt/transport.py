@@ -0,0 +1,244 @@
+"""
+this module contains the interface of the mqtt clients the entities communicate with
+and the adapters that provide acknowledgement futures for them
+"""
+
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Protocol, Set, Tuple, Union
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS, Client, error_string  # type: ignore
+
+from .publisher import PayloadType
+
+MessageHandler = Callable[[Any, Any, Any], None]
+SubscribeTopics = Union[str, List[Tuple[str, int]]]
+UnsubscribeTopics = Union[str, List[str]]
+
+
+class MqttClient(Protocol):
+    """
+    subset of paho's `Client` used by the entities.
+    Besides the paho client itself, wrappers such as :class:`~ha_mqtt.router.TopicRouter`,
+    the :class:`~ha_mqtt.loopback.LoopbackClient` and the adapters of :class:`AckTransport` implement it
+    """
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        """
+
+    def subscribe(self, topic: SubscribeTopics) -> Any:
+        """
+        subscribes to a topic, or to multiple topics with one packet
+
+        :param topic: topic or list of (topic, qos) tuples to subscribe to
+        """
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> Any:
+        """
+        unsubscribes from a topic, or from multiple topics with one packet
+
+        :param topic: topic or list of topics to unsubscribe from
+        """
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a paho style callback for a topic
+
+        :param sub: topic to register the callback for
+        :param callback: callback receiving client, userdata and message
+        """
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes the callback of a topic
+
+        :param sub: topic to remove the callback from
+        """
+
+
+class AckTransport(MqttClient, Protocol):
+    """
+    client that additionally reports acknowledgements as futures.
+    Implemented by :class:`PahoTransport`, :class:`~ha_mqtt.loopback.LoopbackClient`
+    and :class:`~ha_mqtt.mqtt_async.ThreadsafeTransport`
+    """
+
+    def publish_future(self, topic: str, payload: PayloadType = None, qos: int = 0,
+                       retain: bool = False) -> "Future[None]":
+        """
+        publishes a message
+
+        :param topic: topic to publish to
+        :param payload: payload to publish
+        :param qos: quality of service level
+        :param retain: set to True to send as a retained message
+        :return: future that completes when the message was sent with qos 0 or acknowledged with qos 1 and 2
+        """
+
+
+class FutureInfo:
+    """
+    message info backed by a future, with the same interface as paho's `MQTTMessageInfo`,
+    returned by transports whose publish is asynchronous
+
+    :param future: future that completes when the message is published
+    :param mid: message id, if known
+    """
+
+    __slots__ = ("future", "mid", "rc")
+
+    def __init__(self, future: "Future[Any]", mid: int = 0):
+        self.future = future
+        self.mid = mid
+        self.rc = MQTT_ERR_SUCCESS  # pylint: disable=C0103
+
+    def is_published(self) -> bool:
+        """
+        :return: True, if the message was published successfully
+        """
+        return self.future.done() and not self.future.cancelled() and self.future.exception() is None
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        """
+        blocks until the message is published or the timeout occurs
+
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :raises RuntimeError: if publishing the message failed or was cancelled
+        """
+        try:
+            self.future.exception(timeout)
+        except FutureTimeoutError:
+            return
+        except CancelledError as err:
+            # a cancelled message is not published, like for is_published()
+            raise RuntimeError("Message publish was cancelled") from err
+        if not self.is_published():
+            raise RuntimeError(f"Message publish failed: {self.future.exception()}")
+
+
+class PahoTransport:
+    """
+    adapter for a paho client, that completes a future for every acknowledged message.
+    Pass it as client in :class:`~ha_mqtt.mqtt_device_base.MqttDeviceSettings`,
+    all other calls are passed through to the client.
+
+    :param client: paho mqtt client instance
+
+    .. note::
+       the acknowledgements are received by hooking into `on_publish` of the client.
+       Assign your own `on_publish` callback before creating the adapter, it is still called
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._futures: Dict[int, "Future[None]"] = {}
+        # acks that arrived before the future of their message was registered,
+        # only recorded while a message is being published
+        self._early: Set[int] = set()
+        self._publishing = 0
+        # only held for bookkeeping and never while calling the client, so paho's thread can always take it
+        self._lock = threading.Lock()
+        self._on_publish: Optional[Callable[..., None]] = client.on_publish
+        client.on_publish = self._acked
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: number of messages waiting for their acknowledgement
+        """
+        return len(self._futures)
+
+    def publish(self, topic: str, payload: PayloadType = None, qos: int = 0, retain: bool = False) -> Any:
+        """
+        publishes a message on the client, same signature as paho's `Client.publish()`
+        """
+        return self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def publish_future(self, topic: str, payload: PayloadType = None, qos: int = 0,
+                       retain: bool = False) -> "Future[None]":
+        """
+        publishes a message, see :class:`AckTransport`
+        """
+        future: "Future[None]" = Future()
+        with self._lock:
+            self._publishing += 1
+        info = None
+        published = False
+        try:
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+            published = info.rc == MQTT_ERR_SUCCESS and info.is_published()
+        finally:
+            with self._lock:
+                self._publishing -= 1
+                if info is not None and info.rc == MQTT_ERR_SUCCESS:
+                    # the ack may have arrived before the future is registered
+                    published = published or info.mid in self._early
+                    if not published:
+                        self._futures[info.mid] = future
+                    self._early.discard(info.mid)
+                if not self._publishing:
+                    self._early.clear()
+
+        if info.rc != MQTT_ERR_SUCCESS:
+            future.set_exception(RuntimeError(error_string(info.rc)))
+        elif published:
+            future.set_result(None)
+        return future
+
+    def cancel_pending(self) -> None:
+        """
+        cancels the futures of all messages waiting for their acknowledgement,
+        for example after the connection was lost without a persistent session
+        """
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.cancel()
+
+    def subscribe(self, topic: SubscribeTopics) -> Any:
+        """
+        subscribes on the client
+        """
+        return self.client.subscribe(topic)
+
+    def unsubscribe(self, topic: UnsubscribeTopics) -> Any:
+        """
+        unsubscribes on the client
+        """
+        return self.client.unsubscribe(topic)
+
+    def message_callback_add(self, sub: str, callback: MessageHandler) -> None:
+        """
+        registers a callback on the client
+        """
+        self.client.message_callback_add(sub, callback)
+
+    def message_callback_remove(self, sub: str) -> None:
+        """
+        removes a callback from the client
+        """
+        self.client.message_callback_remove(sub)
+
+    def _acked(self, *args: Any) -> None:
+        """
+        `on_publish` callback of the paho client, the message id is the third argument
+        in both callback api versions
+        """
+        with self._lock:
+            future = self._futures.pop(args[2], None)
+            if future is None and self._publishing:
+                self._early.add(args[2])
+        if future is not None:
+            future.set_result(None)
+        if self._on_publish is not None:
+            self._on_publish(*args)
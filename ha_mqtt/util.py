@@ -8,12 +8,47 @@ helper module containing shared definitions and enums
 #  Copyright (c) 2024 - Andreas Philipp
 #  This code is published under the MIT license
 
+import hashlib
 from enum import Enum
 
 ON = b'on'
 OFF = b'off'
 
 
+def config_digest(payload: str) -> str:
+    """
+    calculates the digest of a discovery payload, used to detect changed configs
+
+    :param payload: serialized discovery payload
+    :return: hex digest of the payload
+    """
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OverflowPolicy(Enum):
+    """
+    Enum representing what happens when a bounded queue is full
+    BLOCK waits until there is space again,
+    DROP_NEWEST discards the item that should be added and
+    DROP_OLDEST discards the oldest queued item to make room
+    """
+    BLOCK = "block"
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+
+
+class AvailabilityScope(Enum):
+    """
+    Enum representing which entities share one availability topic.
+    ENTITY gives every entity its own topic,
+    DEVICE shares one topic between all entities of a :class:`~ha_mqtt.ha_device.HaDevice` and
+    PROCESS shares one topic between all entities of the application
+    """
+    ENTITY = "entity"
+    DEVICE = "device"
+    PROCESS = "process"
+
+
 class EntityCategory(Enum):
     """
     Enum representing the different entity classes introduced in 2021.11.
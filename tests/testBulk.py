@@ -0,0 +1,100 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import json
+import random
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.bulk import update_states
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.publisher import CoalescingPublisher
+from ha_mqtt.util import HaSensorDeviceClass
+
+
+class TestBulk(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_update_states(self, mocked_client):
+        client = mocked_client('test')
+        publisher = CoalescingPublisher(client)
+        sensors = [MqttSensor(MqttDeviceSettings(f"tc{i}", f"bulk_tc{i}", client, publisher=publisher),
+                              HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+                   for i in range(4)]
+        for sensor in sensors:
+            sensor.deadband = 0.5
+
+        self.assertEqual(3, update_states(sensors, [20.04, 21.0, float("nan"), 23.5], precision=1))
+        publisher.flush()
+        states = {c.args[0]: c.args[1] for c in client.publish.call_args_list}
+        self.assertEqual("20.0", states[sensors[0].state_topic])
+        self.assertEqual("23.5", states[sensors[3].state_topic])
+        self.assertNotIn(sensors[2].state_topic, states)
+
+        # values within the deadband are filtered
+        self.assertEqual(1, update_states(sensors, [20.2, 21.1, None, 25.0], precision=1))
+        self.assertRaises(ValueError, update_states, sensors, [1.0])
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_grouped(self, mocked_client):
+        client = mocked_client('test')
+        device = HaDevice("Array", "bulk_array", grouped_state=True)
+        sensors = [MqttSensor(MqttDeviceSettings(f"ch{i}", f"bulk_ch{i}", client, device, publisher=client),
+                              HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+                   for i in range(3)]
+
+        self.assertEqual(1, update_states(sensors, (1, 2, 3)))
+        client.publish.assert_called_once_with(
+            sensors[0].state_topic, json.dumps({"bulk_ch0": 1, "bulk_ch1": 2, "bulk_ch2": 3}), qos=0, retain=True)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_non_numeric(self, mocked_client):
+        client = mocked_client('test')
+        sensors = [MqttSensor(MqttDeviceSettings(f"nn{i}", f"bulk_nn{i}", client, publisher=client),
+                              HaSensorDeviceClass.TEMPERATURE, "°C", send_only=True)
+                   for i in range(3)]
+        self.assertEqual(1, update_states(sensors, ["error", 1.25, None], precision=1))
+        client.publish.assert_called_once_with(sensors[1].state_topic, "1.2", qos=0, retain=True)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_matches_update_state(self, mocked_client):
+        # the array filters decide the same as the filters of the single entities
+        client = mocked_client('test')
+
+        class OddFilter(MqttSensor):
+            __slots__ = ()
+
+            def _is_filtered(self, payload, now):
+                return float(payload) % 2 >= 1
+
+        class NeverDuplicate(MqttSensor):
+            __slots__ = ()
+
+            def _is_duplicate(self, payload, now):
+                return self._last_state is not None and float(payload) < 5
+
+        def create(prefix):
+            entities = []
+            for i in range(40):
+                entity_type = OddFilter if i % 5 == 0 else NeverDuplicate if i % 5 == 1 else MqttSensor
+                entity = entity_type(MqttDeviceSettings(f"{prefix}{i}", f"{prefix}{i}", client, publisher=client),
+                                     HaSensorDeviceClass.POWER, "W", send_only=True)
+                entity.deadband = (i % 3) * 0.5
+                entity.relative_deadband = 0.1 if i % 4 == 0 else 0.0
+                entity.suppress_duplicates = i % 2 == 0
+                entity.heartbeat_interval = 60.0 if i % 7 == 0 else None
+                entities.append(entity)
+            return entities
+
+        single, bulk = create("single"), create("bulk")
+        rng = random.Random(1)
+        with mock.patch('time.monotonic', return_value=100.0):
+            for _ in range(20):
+                values = [round(rng.uniform(0, 10), 1) for _ in single]
+                for entity, value in zip(single, values):
+                    entity.update_state(f"{value:.1f}")
+                update_states(bulk, values, precision=1)
+                self.assertEqual([entity._last_state for entity in single], [entity._last_state for entity in bulk])
+
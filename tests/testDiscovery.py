@@ -0,0 +1,47 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.discovery import BulkDiscovery, start_all
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_switch import MqttSwitch
+
+
+class TestDiscovery(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_start_all(self, mocked_client):
+        client = mocked_client('test')
+        switches = [
+            MqttSwitch(MqttDeviceSettings(f"sw{i}", f"bulk_sw_{i}", client, will_topic="will"))
+            for i in range(20)
+        ]
+
+        start_all(switches, max_inflight=4)
+
+        for sw in switches:
+            self.assertTrue(sw.is_started)
+            client.publish.assert_any_call(sw.config_topic, sw.get_config_json(), qos=1, retain=True)
+            client.publish.assert_any_call(sw.avail_topic, 'online', qos=1, retain=True)
+            client.publish.assert_any_call(sw.state_topic, util.OFF, qos=0, retain=True)
+            client.subscribe.assert_any_call(sw.cmd_topic)
+        # the shared will topic is only set online once
+        will_calls = [c for c in client.publish.call_args_list if c.args[0] == "will"]
+        self.assertEqual(1, len(will_calls))
+
+    def test_window(self):
+        engine = BulkDiscovery(max_inflight=10, target_latency=0.5)
+        client = mock.Mock()
+        for _ in range(20):
+            engine.publish(client, "topic", "payload")
+        engine.flush()
+        # fast acks let the window grow up to the maximum
+        self.assertEqual(10, engine.window)
+
+        engine.target_latency = 0
+        engine.publish(client, "topic", "payload")
+        engine.flush()
+        self.assertEqual(5, engine.window)
@@ -0,0 +1,98 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.executor import CallbackExecutor
+from ha_mqtt.mqtt_switch import MqttSwitch, MqttDeviceSettings
+from ha_mqtt.util import OverflowPolicy
+
+
+class TestExecutor(unittest.TestCase):
+
+    def test_ordering(self):
+        executor = CallbackExecutor(workers=4, overflow=OverflowPolicy.BLOCK)
+        results = {key: [] for key in ("a", "b", "c")}
+        for i in range(100):
+            for key, result in results.items():
+                executor.submit(key, lambda r=result, i=i: r.append(i))
+        executor.stop()
+        for result in results.values():
+            self.assertEqual(list(range(100)), result)
+
+    def test_overflow(self):
+        for policy, expected in ((OverflowPolicy.DROP_NEWEST, [0]), (OverflowPolicy.DROP_OLDEST, [4])):
+            executor = CallbackExecutor(workers=1, max_queue=1, overflow=policy)
+            release = threading.Event()
+            result = []
+            executor.submit("key", release.wait)
+            # wait for the worker to pick up the blocking task
+            while executor.pending:
+                pass
+            for i in range(5):
+                executor.submit("key", lambda i=i: result.append(i))
+            self.assertEqual(4, executor.dropped)
+            release.set()
+            executor.stop()
+            self.assertEqual(expected, result, policy)
+
+    def test_default_policy(self):
+        # submitting from paho's network thread must never block it
+        executor = CallbackExecutor(workers=1, max_queue=1)
+        release = threading.Event()
+        executor.submit("key", release.wait)
+        while executor.pending:
+            pass
+        for _ in range(3):
+            self.assertTrue(executor.submit("key", lambda: None))
+        self.assertEqual(2, executor.dropped)
+        release.set()
+        executor.stop()
+
+    def test_dropped_stop_marker(self):
+        executor = CallbackExecutor(workers=1, max_queue=1, overflow=OverflowPolicy.DROP_OLDEST)
+        release = threading.Event()
+        result = []
+        executor.submit("key", release.wait)
+        while executor.pending:
+            pass
+        stopper = threading.Thread(target=executor.stop)
+        stopper.start()
+        # the stop marker fills the queue and is dropped for the next callback
+        while not executor.pending:
+            pass
+        executor.submit("key", lambda: result.append(1))
+        release.set()
+        stopper.join(2)
+        self.assertFalse(stopper.is_alive())
+        self.assertEqual([1], result)
+        self.assertFalse(executor.is_running)
+
+    def test_stop_before_start(self):
+        executor = CallbackExecutor(workers=2, max_queue=1)
+        executor.stop()
+        self.assertEqual(0, executor.pending)
+
+        result = []
+        executor.submit("key", lambda: result.append(1))
+        executor.stop()
+        self.assertEqual([1], result)
+        self.assertFalse(executor.is_running)
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('paho.mqtt.client.MQTTMessage')
+    def test_switch(self, mocked_message, mocked_client):
+        settings = MqttDeviceSettings("Test", "executor_switch", mocked_client('test'))
+        executor = CallbackExecutor(workers=2)
+        sw = MqttSwitch(settings)
+        sw.command_executor = executor
+        sw.callback_on = mock.Mock()
+
+        msg = mocked_message()
+        msg.payload = util.ON
+        sw.command_callback(None, None, msg)
+        executor.stop()
+        sw.callback_on.assert_called_once()
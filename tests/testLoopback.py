@@ -0,0 +1,70 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import json
+import threading
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.discovery import start_all
+from ha_mqtt.loopback import LoopbackBroker
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.mqtt_switch import MqttSwitch
+
+
+class TestLoopback(unittest.TestCase):
+    def setUp(self) -> None:
+        self.broker = LoopbackBroker()
+        self.homeassistant = self.broker.client("homeassistant")
+        self.received = []
+        self.homeassistant.on_message = lambda client, userdata, msg: self.received.append(
+            (msg.topic, msg.payload, msg.qos, msg.retain))
+
+    def test_routing(self):
+        app = self.broker.client("app")
+        self.homeassistant.subscribe([("sensors/+/state", 1), ("sensors/#", 0)])
+        app.publish("sensors/a/state", "1", qos=1)
+        app.publish("sensors/a/config", "{}", qos=1, retain=True)
+        app.publish("other/a/state", 1)
+        self.assertEqual([("sensors/a/state", b"1", 1, False), ("sensors/a/config", b"{}", 0, False)], self.received)
+
+        # retained messages are delivered on subscription and deleted by an empty payload
+        late = self.broker.client("late")
+        late.on_message = mock.Mock()
+        late.subscribe("sensors/+/config")
+        self.assertEqual(b"{}", late.on_message.call_args.args[2].payload)
+        self.assertTrue(late.on_message.call_args.args[2].retain)
+        app.publish("sensors/a/config", "", retain=True)
+        self.assertIsNone(self.broker.retained("sensors/a/config"))
+
+        self.homeassistant.unsubscribe(["sensors/+/state", "sensors/#"])
+        app.publish("sensors/a/state", "2")
+        self.assertEqual(3, len(self.received))
+
+    def test_will(self):
+        app = self.broker.client("app")
+        app.will_set("app/status", "offline", retain=True)
+        self.homeassistant.subscribe("app/status")
+        app.disconnect(unexpected=True)
+        self.assertEqual([("app/status", b"offline", 0, False)], self.received)
+
+    def test_entities(self):
+        client = self.broker.client("app")
+        self.homeassistant.subscribe(f"{MqttDeviceBase.base_topic}/#")
+        sensor = MqttSensor(MqttDeviceSettings("Sensor", "loop_sensor", client, publisher=client),
+                            util.HaSensorDeviceClass.TEMPERATURE, "°C")
+        switch = MqttSwitch(MqttDeviceSettings("Switch", "loop_switch", client, publisher=client))
+        done = threading.Event()
+        switch.callback_on = done.set
+        start_all([sensor, switch])
+
+        self.assertEqual(sensor.get_config_json().encode(), self.broker.retained(sensor.config_topic))
+        self.assertEqual("loop_switch", json.loads(self.broker.retained(switch.config_topic))["unique_id"])
+        self.assertEqual(b"online", self.broker.retained(switch.avail_topic))
+
+        self.homeassistant.publish(switch.cmd_topic, util.ON)
+        self.assertTrue(done.wait(1))
+        sensor.update_state(21.5)
+        self.assertEqual(b"21.5", self.broker.retained(sensor.state_topic))
@@ -0,0 +1,73 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import asyncio
+import json
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.mqtt_async import AsyncMqttSensor, AsyncMqttSiren, AsyncMqttSwitch
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.util import HaSensorDeviceClass
+
+
+class FakeTransport:
+    def __init__(self):
+        self.publish = mock.AsyncMock()
+        self.subscribe = mock.AsyncMock()
+        self.unsubscribe = mock.AsyncMock()
+        self.callbacks = {}
+
+    def add_callback(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def remove_callback(self, topic):
+        self.callbacks.pop(topic, None)
+
+
+class TestMQTTAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.transport = FakeTransport()
+
+    async def test_sensor(self):
+        settings = MqttDeviceSettings("temp", "async_temp", self.transport)
+        sensor = AsyncMqttSensor(settings, HaSensorDeviceClass.TEMPERATURE, "°C", True)
+        await sensor.start()
+        self.assertTrue(sensor.is_started)
+        self.transport.publish.assert_any_await(
+            sensor.entity.config_topic, sensor.entity.get_config_json(), 0, True)
+        self.transport.publish.assert_awaited_with(sensor.entity.avail_topic, 'online', 1, True)
+
+        await sensor.update_state(21.5)
+        self.transport.publish.assert_awaited_with(sensor.entity.state_topic, 21.5, 0, True)
+
+        await sensor.stop()
+        self.transport.unsubscribe.assert_awaited_with(f"{sensor.entity.base_topic}/#")
+
+    async def test_switch(self):
+        settings = MqttDeviceSettings("switch", "async_switch", self.transport)
+        switch = AsyncMqttSwitch(settings)
+        switch.callback_on = mock.AsyncMock()
+        await switch.start()
+        self.transport.subscribe.assert_any_await(switch.entity.cmd_topic)
+        self.transport.publish.assert_awaited_with(switch.entity.state_topic, util.OFF, 0, True)
+
+        self.transport.callbacks[switch.entity.cmd_topic](switch.entity.cmd_topic, util.ON)
+        await asyncio.sleep(0)
+        switch.callback_on.assert_awaited_once()
+
+    async def test_siren(self):
+        settings = MqttDeviceSettings("siren", "async_siren", self.transport)
+        siren = AsyncMqttSiren(settings)
+        siren.callback_on = mock.AsyncMock()
+        await siren.start()
+
+        cmd = json.dumps({"state": "on"}).encode("ascii")
+        self.transport.callbacks[siren.entity.cmd_topic](siren.entity.cmd_topic, cmd)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        siren.callback_on.assert_awaited_once()
+        self.assertTrue(siren.state)
+        self.transport.publish.assert_awaited_with(siren.entity.state_topic, util.ON, 0, True)
@@ -2,12 +2,14 @@
 #  This code is published under the MIT license
 
 import json
+import time
 import unittest
 import unittest.mock as mock
 
 from ha_mqtt.ha_device import HaDevice
 from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
-from ha_mqtt.util import EntityCategory
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.util import AvailabilityScope, EntityCategory
 
 
 class TestMQTTDevice(unittest.TestCase):
@@ -86,3 +88,196 @@ class TestMQTTDevice(unittest.TestCase):
                                            EntityCategory.PRIMARY)
         entity2 = MqttDeviceBase(self.settings, False)
         self.assertNotIn("entity_category", entity2._conf_dict)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_device_discovery(self, mocked_client):
+        client = mocked_client("test")
+        device = HaDevice("Device1", "dev_disc", device_discovery=True)
+        entities = [
+            MqttDeviceBase(MqttDeviceSettings(f"ent{i}", f"dev_disc_{i}", client, device), True)
+            for i in range(3)
+        ]
+        for entity in entities:
+            entity.start()
+
+        # the message is delayed, so that all entities share one
+        topic = f"{MqttDeviceBase.base_topic}/device/dev_disc/config"
+        self.assertEqual(topic, entities[0].discovery_topic)
+        self.assertFalse([c for c in client.publish.call_args_list if c.args[0] == topic])
+        device.flush_discovery()
+        calls = [c for c in client.publish.call_args_list if c.args[0] == topic]
+        self.assertEqual(1, len(calls))
+        payload = json.loads(calls[0].args[1])
+        self.assertEqual(device.get_dict(), payload["device"])
+        self.assertIn("origin", payload)
+        self.assertEqual({"dev_disc_0", "dev_disc_1", "dev_disc_2"}, set(payload["components"]))
+        self.assertEqual("sensor", payload["components"]["dev_disc_1"]["platform"])
+        self.assertNotIn("device", payload["components"]["dev_disc_1"])
+        # no per entity config messages are sent
+        self.assertFalse([c for c in client.publish.call_args_list if c.args[0] == entities[0].config_topic])
+
+        entities[0].delete()
+        payload = json.loads(client.publish.call_args.args[1])
+        self.assertEqual({"platform": "sensor"}, payload["components"]["dev_disc_0"])
+
+        # the timer publishes the message of entities started later
+        device.discovery_delay = 0.01
+        late = MqttDeviceBase(MqttDeviceSettings("late", "dev_disc_late", client, device), True)
+        late.start()
+        deadline = time.monotonic() + 2
+        while late.published_digest != device.discovery_digest and time.monotonic() < deadline:
+            time.sleep(0.005)
+        payload = json.loads([c for c in client.publish.call_args_list if c.args[0] == topic][-1].args[1])
+        self.assertIn("dev_disc_late", payload["components"])
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_discovery_digest(self, mocked_client):
+        client = mocked_client("test")
+        self.settings.client = client
+        dev = MqttDeviceBase(self.settings, True)
+
+        dev.start()
+        dev.stop()
+        dev.start()
+        config_calls = [c for c in client.publish.call_args_list if c.args[0] == dev.config_topic]
+        self.assertEqual(1, len(config_calls))
+
+        # changing the config invalidates the cached payload
+        digest = dev.published_digest
+        dev.add_config_option("icon", "mdi:test")
+        self.assertNotEqual(digest, dev.config_digest)
+        self.assertIn("mdi:test", dev.get_config_json())
+        dev.start()
+        client.publish.assert_called_with(dev.avail_topic, 'online', qos=1, retain=True)
+        config_calls = [c for c in client.publish.call_args_list if c.args[0] == dev.config_topic]
+        self.assertEqual(2, len(config_calls))
+
+        # a restored digest skips discovery of new instances
+        dev2 = MqttDeviceBase(self.settings, True)
+        dev2.add_config_option("icon", "mdi:test")
+        dev2.published_digest = dev.published_digest
+        dev2.start()
+        config_calls = [c for c in client.publish.call_args_list if c.args[0] == dev.config_topic]
+        self.assertEqual(2, len(config_calls))
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('time.monotonic')
+    def test_duplicate_suppression(self, mocked_time, mocked_client):
+        client = mocked_client("test")
+        self.settings.client = client
+        dev = MqttDeviceBase(self.settings, True)
+        dev.suppress_duplicates = True
+        dev.heartbeat_interval = 60
+
+        mocked_time.return_value = 0
+        dev.update_state(1)
+        dev.update_state(1)
+        dev.update_state(2)
+        mocked_time.return_value = 30
+        dev.update_state(2)
+        # heartbeat is due
+        mocked_time.return_value = 91
+        dev.update_state(2)
+
+        state_calls = [c.args[1] for c in client.publish.call_args_list if c.args[0] == dev.state_topic]
+        self.assertEqual([1, 2, 2], state_calls)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_shared_availability(self, mocked_client):
+        client = mocked_client("test")
+        device = HaDevice("Device1", "avail_dev")
+        MqttDeviceBase.set_availability_scope(AvailabilityScope.DEVICE)
+        try:
+            entities = [
+                MqttDeviceBase(MqttDeviceSettings(f"ent{i}", f"avail_{i}", client, device), True)
+                for i in range(3)
+            ]
+        finally:
+            MqttDeviceBase.set_availability_scope(AvailabilityScope.ENTITY)
+
+        topic = f"{MqttDeviceBase.base_topic}/device/avail_dev/available"
+        for entity in entities:
+            self.assertEqual(topic, entity.avail_topic)
+            self.assertEqual(topic, json.loads(entity.get_config_json())["availability_topic"])
+            entity.start()
+
+        avail_calls = lambda: [c.args[1] for c in client.publish.call_args_list if c.args[0] == topic]
+        self.assertEqual(["online"], avail_calls())
+        entities[0].stop()
+        entities[1].stop()
+        self.assertEqual(["online"], avail_calls())
+        entities[2].stop()
+        self.assertEqual(["online", "offline"], avail_calls())
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_missing_identifiers(self, mocked_client):
+        client = mocked_client("test")
+        MqttDeviceBase.set_availability_scope(AvailabilityScope.DEVICE)
+        try:
+            for grouped in (False, True):
+                device = HaDevice("No ids", "no_ids", grouped_state=grouped)
+                device.config["identifiers"] = []
+                with self.assertRaisesRegex(AssertionError, "identifiers"):
+                    MqttDeviceBase(MqttDeviceSettings("no ids", "no_ids_ent", client, device))
+        finally:
+            MqttDeviceBase.set_availability_scope(AvailabilityScope.ENTITY)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_compact(self, mocked_client):
+        client = mocked_client("test")
+        MqttDeviceBase.set_compact(True)
+        try:
+            dev = MqttDeviceBase(MqttDeviceSettings("compact", "compact_ent", client), True)
+            dev.start()
+        finally:
+            MqttDeviceBase.set_compact(False)
+
+        # custom attributes remain possible
+        dev.custom = 1
+        self.assertEqual(1, dev.custom)
+        self.assertEqual(f"{MqttDeviceBase.base_topic}/sensor/compact_ent/config", dev.config_topic)
+        self.assertEqual("", dev._config_cache[1])
+        self.assertEqual(dev.config_digest, dev.published_digest)
+        client.publish.assert_any_call(dev.config_topic, dev.get_config_json(), retain=True)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_topic_overrides(self, mocked_client):
+        client = mocked_client("test")
+
+        class Custom(MqttDeviceBase):
+            base_topic = "custom"
+            __slots__ = ()
+
+        first = Custom(MqttDeviceSettings("first", "first_ent", client), True)
+        second = Custom(MqttDeviceSettings("second", "second_ent", client), True)
+        self.assertEqual("custom", Custom.base_topic)
+        self.assertEqual("custom/sensor/first_ent/config", first.config_topic)
+        self.assertEqual("custom/sensor/second_ent/state", second.state_topic)
+
+        second.base_topic = "other/second"
+        second.config_topic = "other/config"
+        self.assertEqual("other/second", second.base_topic)
+        self.assertEqual("other/config", second.config_topic)
+        self.assertEqual("custom/sensor/first_ent", first.base_topic)
+
+        MqttDeviceBase.set_basetopic("moved")
+        try:
+            plain = MqttDeviceBase(MqttDeviceSettings("plain", "plain_ent", client))
+            self.assertEqual("moved/sensor/plain_ent", plain.base_topic)
+            self.assertEqual("custom/sensor/first_ent", first.base_topic)
+        finally:
+            MqttDeviceBase.set_basetopic("homeassistant")
+
+        # assigned after the classes were created
+        MqttDeviceBase.base_topic = "later"
+        MqttSwitch.base_topic = "later_switch"
+        try:
+            plain = MqttDeviceBase(MqttDeviceSettings("plain", "plain_ent", client))
+            switches = [MqttSwitch(MqttDeviceSettings(f"sw{i}", f"later_sw{i}", client)) for i in range(2)]
+            self.assertEqual("later", MqttDeviceBase.base_topic)
+            self.assertEqual("later/sensor/plain_ent/state", plain.state_topic)
+            self.assertEqual("later_switch/switch/later_sw0/config", switches[0].config_topic)
+            self.assertEqual("later_switch/switch/later_sw1/state", switches[1].state_topic)
+        finally:
+            del MqttSwitch.base_topic
+            MqttDeviceBase.base_topic = "homeassistant"
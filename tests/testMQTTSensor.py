@@ -0,0 +1,79 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import json
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.mqtt_device_base import MqttDeviceBase
+from ha_mqtt.mqtt_sensor import MqttSensor, MqttDeviceSettings
+from ha_mqtt.util import HaSensorDeviceClass
+
+
+class TestMQTTSensor(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.settings = MqttDeviceSettings("Power", "power_test", None, None)
+
+    def published(self, client, sensor):
+        return [c.args[1] for c in client.publish.call_args_list if c.args[0] == sensor.state_topic]
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_deadband(self, mocked_client):
+        client = mocked_client('test')
+        self.settings.client = client
+        sensor = MqttSensor(self.settings, HaSensorDeviceClass.POWER, "W", True)
+        sensor.deadband = 1.0
+        sensor.relative_deadband = 0.1
+
+        for value in (100, 105, 110, 111, "122.5", 150):
+            sensor.update_state(value)
+        self.assertEqual([100, 111, "122.5", 150], self.published(client, sensor))
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('time.monotonic')
+    def test_min_interval(self, mocked_time, mocked_client):
+        client = mocked_client('test')
+        self.settings.client = client
+        sensor = MqttSensor(self.settings, HaSensorDeviceClass.POWER, "W", True)
+        sensor.min_interval = 1.0
+
+        for stamp, value in ((0, 1), (0.5, 2), (1.0, 3), (1.1, 4), (2.5, 5)):
+            mocked_time.return_value = stamp
+            sensor.update_state(value)
+        self.assertEqual([1, 3, 5], self.published(client, sensor))
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_grouped_state(self, mocked_client):
+        client = mocked_client('test')
+        device = HaDevice("Meter", "grouped_meter", grouped_state=True)
+        sensors = [MqttSensor(MqttDeviceSettings(f"ch{i}", f"meter_ch{i}", client, device, publisher=client),
+                              HaSensorDeviceClass.VOLTAGE, "V", send_only=True)
+                   for i in range(3)]
+        topic = f"{MqttDeviceBase.base_topic}/device/grouped_meter/state"
+        for sensor in sensors:
+            sensor.suppress_duplicates = True
+            sensor.start()
+            config = json.loads(sensor.get_config_json())
+            self.assertEqual(topic, config["state_topic"])
+            self.assertEqual(f"{{{{ value_json['{sensor._unique_id}'] }}}}", config["value_template"])
+
+        client.publish.reset_mock()
+        device.update_states({"meter_ch0": 230.1, "meter_ch1": 229.8, "meter_ch2": 231.0})
+        client.publish.assert_called_once_with(
+            topic, json.dumps({"meter_ch0": 230.1, "meter_ch1": 229.8, "meter_ch2": 231.0}), retain=True)
+
+        # unchanged values are filtered, a single update publishes the combined state
+        client.publish.reset_mock()
+        device.update_states({"meter_ch0": 230.1})
+        client.publish.assert_not_called()
+        sensors[2].update_state(232.0)
+        self.assertEqual(232.0, json.loads(client.publish.call_args.args[1])["meter_ch2"])
+
+        # an unknown id rejects the whole update, the retry is published
+        client.publish.reset_mock()
+        self.assertRaises(KeyError, device.update_states, {"meter_ch0": 5, "typo": 1})
+        client.publish.assert_not_called()
+        device.update_states({"meter_ch0": 5})
+        self.assertEqual(5, json.loads(client.publish.call_args.args[1])["meter_ch0"])
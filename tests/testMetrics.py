@@ -0,0 +1,80 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.metrics import InstrumentedClient, Metrics
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_switch import MqttSwitch
+
+
+class TestMetrics(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('paho.mqtt.client.MQTTMessage')
+    def test_switch(self, mocked_message, mocked_client):
+        client = mocked_client('test')
+        client.publish.return_value.mid = 1
+        client.publish.return_value.is_published.return_value = False
+        metrics = Metrics()
+        sw = MqttSwitch(MqttDeviceSettings("sw", "metered_switch", InstrumentedClient(client, metrics)))
+        sw.start()
+
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(1, counters["published_total"]["config"])
+        self.assertEqual(1, counters["published_total"]["availability"])
+        self.assertEqual(1, counters["published_total"]["state"])
+        self.assertEqual(len(sw.get_config_json()), counters["published_bytes_total"]["config"])
+
+        # paho reports the last message as sent
+        client.on_publish(client, None, 1, 0, None)
+        self.assertEqual(1, metrics.snapshot()["histograms"]["publish_ack_seconds"]["count"])
+
+        callback = client.message_callback_add.call_args_list[-1].args[1]
+        msg = mocked_message()
+        msg.topic = sw.cmd_topic
+        msg.payload = util.ON
+        callback(client, None, msg)
+        snapshot = metrics.snapshot()
+        self.assertEqual(1, snapshot["counters"]["received_total"]["command"])
+        self.assertEqual(1, snapshot["histograms"]["command_dispatch_seconds"]["count"])
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_early_ack(self, mocked_client):
+        client = mocked_client('test')
+        metrics = Metrics()
+        instrumented = InstrumentedClient(client, metrics)
+
+        # ack arriving from the network thread after publish returned, before the stamp is recorded
+        def is_published():
+            thread = threading.Thread(target=client.on_publish, args=(client, None, 3, 0, None))
+            thread.start()
+            thread.join()
+            return False
+        client.publish.return_value = mock.Mock(rc=0, mid=3, is_published=is_published)
+        instrumented.publish("test/sensor/id/state", "1", qos=1)
+        self.assertEqual(1, metrics.snapshot()["histograms"]["publish_ack_seconds"]["count"])
+        self.assertEqual({}, instrumented._sent)
+        self.assertEqual({}, instrumented._early)
+
+    def test_prometheus(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.count("published_total", "state", 3)
+        metrics.observe("publish_ack_seconds", 0.5)
+        metrics.add_gauge("queue_depth", lambda: 7)
+
+        self.assertEqual(
+            '# TYPE ha_mqtt_published_total counter\n'
+            'ha_mqtt_published_total{kind="state"} 3\n'
+            '# TYPE ha_mqtt_publish_ack_seconds histogram\n'
+            'ha_mqtt_publish_ack_seconds_bucket{le="0.1"} 0\n'
+            'ha_mqtt_publish_ack_seconds_bucket{le="1.0"} 1\n'
+            'ha_mqtt_publish_ack_seconds_bucket{le="+Inf"} 1\n'
+            'ha_mqtt_publish_ack_seconds_sum 0.5\n'
+            'ha_mqtt_publish_ack_seconds_count 1\n'
+            '# TYPE ha_mqtt_queue_depth gauge\n'
+            'ha_mqtt_queue_depth 7\n',
+            metrics.to_prometheus())
@@ -0,0 +1,123 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+from paho.mqtt.client import MQTT_ERR_NO_CONN
+
+from ha_mqtt.offline import OfflineBuffer
+
+
+class TestOfflineBuffer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "spill.bin")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    @staticmethod
+    def published(client):
+        return [(c.args[0], c.args[1]) for c in client.publish.call_args_list]
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_coalesced_replay(self, mocked_client):
+        client = mocked_client('test')
+        buffer = OfflineBuffer(client, history=["meter/state"])
+        buffer.publish("a/state", 1)
+        buffer.set_connected(False)
+        for value in range(3):
+            buffer.publish("a/state", value)
+            buffer.publish("meter/state", value)
+        self.assertEqual(1, client.publish.call_count)
+        self.assertEqual(4, buffer.pending)
+        self.assertEqual(2, buffer.coalesced)
+
+        buffer.set_connected(True)
+        self.assertEqual([("a/state", 1), ("meter/state", 0), ("meter/state", 1), ("meter/state", 2), ("a/state", 2)],
+                         self.published(client))
+        self.assertEqual(0, buffer.pending)
+        self.assertEqual(0, buffer.buffered_bytes)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_interrupted_replay(self, mocked_client):
+        client = mocked_client('test')
+        buffer = OfflineBuffer(client, connected=False)
+        for topic in ("a", "b", "c", "d"):
+            buffer.publish(topic, 1)
+
+        ok = mock.Mock(rc=0)
+        client.publish.side_effect = [ok, RuntimeError("broken")]
+        with self.assertLogs("ha_mqtt.offline", "ERROR"):
+            buffer.set_connected(True)
+        # the failed message and all later ones are kept
+        self.assertFalse(buffer.connected)
+        self.assertEqual(3, buffer.pending)
+
+        client.publish.side_effect = [ok, mock.Mock(rc=MQTT_ERR_NO_CONN)]
+        buffer.set_connected(True)
+        self.assertEqual(2, buffer.pending)
+
+        client.publish.side_effect = None
+        client.publish.reset_mock()
+        buffer.set_connected(True)
+        self.assertEqual([("c", 1), ("d", 1)], self.published(client))
+        self.assertEqual(0, buffer.pending)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_budget(self, mocked_client):
+        client = mocked_client('test')
+        buffer = OfflineBuffer(client, max_bytes=20, history=["h"], connected=False)
+        for value in range(10):
+            buffer.publish("h", f"{value:03}")
+        self.assertLessEqual(buffer.buffered_bytes, 20)
+        self.assertEqual(5, buffer.dropped)
+
+        buffer.set_connected(True)
+        self.assertEqual([("h", f"{value:03}") for value in range(5, 10)], self.published(client))
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_spill(self, mocked_client):
+        client = mocked_client('test')
+        buffer = OfflineBuffer(client, max_bytes=10, spill_path=self.path, history=["h"], connected=False)
+        for value in range(5):
+            buffer.publish("h", value, qos=1)
+            buffer.publish("a", f"{value}°")
+        buffer.publish("b", None, retain=True)
+        self.assertEqual(0, buffer.dropped)
+        self.assertGreater(buffer.spilled, 0)
+        buffer.close()
+
+        # a new run replays the spill file of the previous one
+        buffer = OfflineBuffer(client, spill_path=self.path, history=["h"], connected=False)
+        buffer.publish("a", "new")
+        buffer.set_connected(True)
+        self.assertEqual([("h", str(value).encode()) for value in range(5)] + [("b", b""), ("a", "new")],
+                         self.published(client))
+        self.assertFalse(os.path.exists(self.path))
+        client.publish.assert_any_call("h", b"4", qos=1, retain=False)
+        client.publish.assert_any_call("b", b"", qos=0, retain=True)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_spill_connected(self, mocked_client):
+        client = mocked_client('test')
+        buffer = OfflineBuffer(client, max_bytes=0, spill_path=self.path, connected=False)
+        buffer.publish("a/state", "old", retain=True)
+        buffer.close()
+
+        # the leftover spill file must not overwrite newer messages
+        buffer = OfflineBuffer(client, spill_path=self.path)
+        buffer.publish("a/state", "new", retain=True)
+        buffer.set_connected(False)
+        buffer.set_connected(True)
+        self.assertEqual([("a/state", b"old"), ("a/state", "new")], self.published(client))
+        self.assertFalse(os.path.exists(self.path))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
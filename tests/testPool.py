@@ -0,0 +1,43 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import json
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.pool import ClientPool
+
+
+class TestPool(unittest.TestCase):
+
+    def test_sharding(self):
+        pool = ClientPool(lambda index: mock.Mock(name=f"client{index}"), size=4, will_topic="gw/conn-{index}/available")
+        for index, client in enumerate(pool.clients):
+            client.will_set.assert_called_once_with(f"gw/conn-{index}/available", "offline", retain=True)
+
+        entities = [MqttDeviceBase(MqttDeviceSettings(f"ent{i}", f"pooled_{i}", pool, publisher=mock.Mock()), True)
+                    for i in range(40)]
+        used = {id(entity._client) for entity in entities}
+        self.assertEqual(4, len(used))
+
+        entity = entities[0]
+        index = pool.index_for(entity._unique_id)
+        self.assertIs(pool.clients[index], entity._client)
+        self.assertEqual(f"gw/conn-{index}/available", entity._will_topic)
+        availability = json.loads(entity.get_config_json())["availability"]
+        self.assertIn({"topic": f"gw/conn-{index}/available"}, availability)
+
+        # the assignment is stable
+        again = MqttDeviceBase(MqttDeviceSettings("ent0", "pooled_0", pool), True)
+        self.assertIs(entity._client, again._client)
+
+    def test_connect(self):
+        pool = ClientPool(lambda index: mock.Mock(), size=2)
+        pool.connect("localhost")
+        pool.disconnect()
+        for client in pool.clients:
+            client.will_set.assert_not_called()
+            client.connect.assert_called_once_with("localhost", 1883, 60)
+            client.loop_start.assert_called_once()
+            client.loop_stop.assert_called_once()
@@ -0,0 +1,114 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+import time
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.publisher import CoalescingPublisher, RateLimitedPublisher, TokenBucket, payload_size
+
+
+class TestPublisher(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, 2)
+        self.assertEqual(0, bucket.consume(1))
+        self.assertEqual(0, bucket.consume(1))
+        # bucket is empty now, the next token takes 1/rate seconds
+        self.assertAlmostEqual(0.1, bucket.consume(1), places=2)
+
+    def test_payload_size(self):
+        self.assertEqual(0, payload_size(None))
+        self.assertEqual(3, payload_size(b'off'))
+        self.assertEqual(2, payload_size("°"))
+        self.assertEqual(4, payload_size(21.5))
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_handoff(self, mocked_client):
+        client = mocked_client('test')
+        publisher = RateLimitedPublisher(client, msg_rate=1000)
+        settings = MqttDeviceSettings("test", "pub_test", client, publisher=publisher)
+        dev = MqttDeviceBase(settings, True)
+
+        dev.update_state(42)
+        dev.set_online()
+        # nothing is published until the publisher runs
+        client.publish.assert_not_called()
+        self.assertEqual(2, publisher.pending)
+
+        publisher.start()
+        publisher.stop()
+        client.publish.assert_has_calls([
+            mock.call(dev.state_topic, 42, qos=0, retain=True),
+            mock.call(dev.avail_topic, 'online', qos=1, retain=True),
+        ])
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_failing_client(self, mocked_client):
+        client = mocked_client('test')
+        client.publish.side_effect = [RuntimeError("broken"), None]
+        publisher = RateLimitedPublisher(client, msg_rate=None)
+        publisher.publish("a", 1)
+        publisher.publish("b", 2)
+        with self.assertLogs("ha_mqtt.publisher", "ERROR"):
+            publisher.start()
+            publisher.stop()
+        client.publish.assert_called_with("b", 2, qos=0, retain=False)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_stop_timeout(self, mocked_client):
+        client = mocked_client('test')
+        release = threading.Event()
+        client.publish.side_effect = lambda *args, **kwargs: release.wait()
+        publisher = RateLimitedPublisher(client, msg_rate=None)
+        publisher.start()
+        publisher.publish("a", 1)
+        publisher.stop(timeout=0.05)
+        # the thread is still draining the queue
+        self.assertTrue(publisher.is_running)
+        publisher.stop(timeout=0.05)
+        release.set()
+        publisher.stop()
+        self.assertFalse(publisher.is_running)
+
+        publisher.start()
+        publisher.publish("b", 2)
+        publisher.stop()
+        client.publish.assert_called_with("b", 2, qos=0, retain=False)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_coalescing(self, mocked_client):
+        client = mocked_client('test')
+        publisher = CoalescingPublisher(client)
+        settings = MqttDeviceSettings("test", "coalesce_test", client, publisher=publisher)
+        dev = MqttDeviceBase(settings, True)
+
+        dev.set_online()
+        for value in range(100):
+            dev.update_state(value)
+        self.assertEqual(2, publisher.pending)
+        self.assertEqual(99, publisher.coalesced)
+        client.publish.assert_not_called()
+
+        publisher.flush()
+        self.assertEqual(0, publisher.pending)
+        self.assertEqual([
+            mock.call(dev.avail_topic, 'online', qos=1, retain=True),
+            mock.call(dev.state_topic, 99, qos=0, retain=True),
+        ], client.publish.call_args_list)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_coalescing_failing_client(self, mocked_client):
+        client = mocked_client('test')
+        client.publish.side_effect = [RuntimeError("broken"), None, None]
+        publisher = CoalescingPublisher(client, interval=0.01)
+        publisher.publish_many([("a", 1, 0, False), ("b", 2, 0, False)])
+        with self.assertLogs("ha_mqtt.publisher", "ERROR"):
+            publisher.start()
+            while publisher.pending:
+                time.sleep(0.01)
+        publisher.publish("c", 3)
+        publisher.stop()
+        self.assertEqual(["a", "b", "c"], [c.args[0] for c in client.publish.call_args_list])
@@ -0,0 +1,81 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import threading
+import time
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.rediscovery import BirthListener
+
+
+class TestRediscovery(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('paho.mqtt.client.MQTTMessage')
+    def test_birth(self, mocked_message, mocked_client):
+        client = mocked_client('test')
+        device = HaDevice("Device1", "birth_dev", device_discovery=True)
+        entities = [MqttDeviceBase(MqttDeviceSettings(f"ent{i}", f"birth_{i}", client, device), True)
+                    for i in range(3)]
+        listener = BirthListener(client, window=0, jitter=0)
+        listener.start()
+        client.subscribe.assert_called_with(f"{MqttDeviceBase.base_topic}/status")
+        callback = client.message_callback_add.call_args.args[1]
+
+        for entity in entities:
+            entity.start()
+            entity.update_state(42)
+            listener.register(entity)
+        device.flush_discovery()
+        client.publish.reset_mock()
+
+        msg = mocked_message()
+        msg.payload = b"online"
+        callback(client, None, msg)
+        listener.wait()
+
+        # the shared device discovery message is only republished once
+        client.publish.assert_any_call(entities[0].discovery_topic, device.get_discovery_json(), qos=0, retain=True)
+        topics = [c.args[0] for c in client.publish.call_args_list]
+        self.assertEqual(1, topics.count(entities[0].discovery_topic))
+        for entity in entities:
+            client.publish.assert_any_call(entity.avail_topic, 'online', qos=1, retain=True)
+            client.publish.assert_any_call(entity.state_topic, 42, qos=0, retain=True)
+        listener.stop()
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_retain_and_restart(self, mocked_client):
+        client = mocked_client('test')
+        entity = MqttDeviceBase(MqttDeviceSettings("volatile", "birth_volatile", client), True)
+        entity.start()
+        entity.update_state(7, retain=False)
+        client.publish.reset_mock()
+
+        # a blocked run is cancelled without waiting for it
+        release = threading.Event()
+        blocked = mock.Mock()
+        blocked.rediscover.side_effect = lambda sent: release.wait()
+        listener = BirthListener(client, window=0, jitter=0)
+        listener.register(blocked)
+        listener.trigger()
+        while not blocked.rediscover.called:
+            time.sleep(0.001)
+        listener.unregister(blocked)
+        listener.register(entity)
+        # releases the blocked run in case trigger() waits for it
+        safety = threading.Timer(2, release.set)
+        safety.start()
+        start = time.monotonic()
+        listener.trigger()
+        self.assertLess(time.monotonic() - start, 1)
+        safety.cancel()
+        listener.wait(1)
+        self.assertFalse(listener.is_running)
+        release.set()
+
+        client.publish.assert_any_call(entity.state_topic, 7, qos=0, retain=False)
+        client.publish.assert_any_call(entity.avail_topic, 'online', qos=1, retain=True)
+        listener.stop()
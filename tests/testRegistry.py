@@ -0,0 +1,78 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.offline import OfflineBuffer
+from ha_mqtt.registry import EntityRegistry
+from ha_mqtt.util import HaSensorDeviceClass
+
+
+class TestEntityRegistry(unittest.TestCase):
+
+    @staticmethod
+    def connect(client, registry, session_present=False):
+        flags = mock.Mock(session_present=session_present)
+        client.on_connect(client, None, flags, 0, None)
+        registry.wait()
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_reconnect(self, mocked_client):
+        client = mocked_client('test')
+        previous = client.on_connect
+        will = "gateway/available"
+        switch = MqttSwitch(MqttDeviceSettings("Switch", "registry_switch", client, will_topic=will,
+                                               publisher=client))
+        sensor = MqttSensor(MqttDeviceSettings("Sensor", "registry_sensor", client, will_topic=will,
+                                               publisher=client),
+                            HaSensorDeviceClass.POWER, "W", send_only=True)
+        buffer = OfflineBuffer(client, connected=False)
+        registry = EntityRegistry(client, buffer)
+        registry.register(switch)
+        registry.register(sensor)
+        registry.attach()
+
+        self.connect(client, registry)
+        previous.assert_called_once()
+        self.assertTrue(switch.is_started and sensor.is_started)
+        self.assertTrue(buffer.connected)
+        self.assertEqual(0, registry.reconnects)
+
+        client.on_disconnect(client, None, mock.Mock(), 0, None)
+        self.assertFalse(buffer.connected)
+
+        # with a kept session only the availability is reported, once per topic
+        client.reset_mock()
+        self.connect(client, registry, session_present=True)
+        topics = [c.args[0] for c in client.publish.call_args_list]
+        self.assertEqual(sorted([switch.avail_topic, sensor.avail_topic, will]), sorted(topics))
+        client.subscribe.assert_not_called()
+
+        # without a session, the subscriptions are sent as one packet and the entities are rediscovered
+        client.reset_mock()
+        self.connect(client, registry, session_present=False)
+        client.subscribe.assert_called_once_with([(switch.state_topic, 0), (switch.cmd_topic, 0)])
+        topics = [c.args[0] for c in client.publish.call_args_list]
+        self.assertIn(switch.config_topic, topics)
+        self.assertIn(sensor.config_topic, topics)
+        self.assertEqual(1, topics.count(will))
+        self.assertEqual(2, registry.reconnects)
+
+        registry.detach()
+        self.assertIs(previous, client.on_connect)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_failed_connect(self, mocked_client):
+        client = mocked_client('test')
+        registry = EntityRegistry(client)
+        registry.attach()
+        client.on_connect(client, None, {"session present": 0}, 5)
+        self.assertFalse(registry.is_connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import multiprocessing
+import subprocess
+import sys
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.ringbuffer import RingBufferIngest, SharedRingBuffer
+
+
+def _worker(name: str, count: int) -> None:
+    buffer = SharedRingBuffer.attach(name)
+    for i in range(count):
+        buffer.write(i % 3, float(i), timeout=None)
+    buffer.close()
+
+
+class TestRingBuffer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.buffer = SharedRingBuffer(capacity=4)
+
+    def tearDown(self) -> None:
+        self.buffer.close()
+        self.buffer.unlink()
+
+    def test_wraparound(self):
+        for i in range(4):
+            self.assertTrue(self.buffer.write(i, i / 2))
+        self.assertFalse(self.buffer.write(4, 2.0))
+        self.assertEqual(1, self.buffer.dropped)
+        self.assertEqual([(0, 0.0), (1, 0.5)], self.buffer.read(2))
+        self.assertTrue(self.buffer.write(5, 2.5))
+        self.assertEqual([(2, 1.0), (3, 1.5), (5, 2.5)], self.buffer.read())
+        self.assertEqual(0, len(self.buffer))
+
+    def test_process(self):
+        entities = [mock.Mock() for _ in range(3)]
+        ingest = RingBufferIngest(entities, [self.buffer], interval=0.001)
+        ingest.start()
+        process = multiprocessing.Process(target=_worker, args=(self.buffer.name, 30))
+        process.start()
+        process.join()
+        ingest.stop()
+
+        self.assertEqual(30, ingest.received)
+        # the last value written for every entity is always published
+        entities[0].update_state.assert_called_with(27.0)
+        entities[1].update_state.assert_called_with(28.0)
+        entities[2].update_state.assert_called_with(29.0)
+
+    def test_separate_interpreter(self):
+        # a worker that is not a child of this process has its own resource tracker,
+        # which must not unlink the buffer when the worker exits
+        script = ("from ha_mqtt.ringbuffer import SharedRingBuffer\n"
+                  f"buffer = SharedRingBuffer.attach({self.buffer.name!r})\n"
+                  "buffer.write(1, 2.5)\n"
+                  "buffer.close()\n")
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        self.assertNotIn("leaked", result.stderr)
+
+        attached = SharedRingBuffer.attach(self.buffer.name)
+        self.assertEqual([(1, 2.5)], attached.read())
+        attached.close()
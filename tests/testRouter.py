@@ -0,0 +1,44 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.router import TopicRouter
+
+
+class TestRouter(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    @mock.patch('paho.mqtt.client.MQTTMessage')
+    def test_routing(self, mocked_message, mocked_client):
+        client = mocked_client('test')
+        router = TopicRouter(client)
+        switches = [MqttSwitch(MqttDeviceSettings(f"sw{i}", f"routed_{i}", router)) for i in range(10)]
+        for sw in switches:
+            sw.callback_on = mock.Mock()
+            sw.start()
+
+        base = MqttDeviceBase.base_topic
+        self.assertEqual(2, client.subscribe.call_count)
+        client.subscribe.assert_any_call(f"{base}/+/+/set")
+        client.subscribe.assert_any_call(f"{base}/+/+/state")
+        self.assertEqual(2, client.message_callback_add.call_count)
+        self.assertEqual(20, router.routes)
+
+        # dispatch a command received on the wildcard subscription
+        dispatch = [c.args[1] for c in client.message_callback_add.call_args_list
+                    if c.args[0] == f"{base}/+/+/set"][0]
+        msg = mocked_message()
+        msg.topic = switches[3].cmd_topic
+        msg.payload = util.ON
+        with mock.patch('threading.Thread') as thread:
+            dispatch(client, None, msg)
+            thread.assert_called_once_with(target=switches[3].callback_on, name="callback_thread")
+
+        switches[3].stop()
+        self.assertEqual(18, router.routes)
+        client.unsubscribe.assert_called_once_with(f"{switches[3].base_topic}/#")
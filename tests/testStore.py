@@ -0,0 +1,96 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt import util
+from ha_mqtt.mqtt_device_base import MqttDeviceBase, MqttDeviceSettings
+from ha_mqtt.mqtt_sensor import MqttSensor
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.store import StateStore, StoredEntity
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "state.db")
+
+    def tearDown(self) -> None:
+        MqttDeviceBase.set_state_store(None)
+        self.dir.cleanup()
+
+    def start(self, entity_type, client, *args):
+        store = StateStore(self.path)
+        MqttDeviceBase.set_state_store(store)
+        entity = entity_type(MqttDeviceSettings("Test", "store_test", client, publisher=client), *args)
+        entity.start()
+        return store, entity
+
+    def test_persistence(self):
+        store = StateStore(self.path, flush_interval=3600)
+        store.save_state("a", b"ON")
+        store.save_digest("a", "digest")
+        store.save_availability("a", True)
+        store.save_state("b", 21.5)
+        store.remove("b")
+        store.close()
+
+        store = StateStore(self.path)
+        self.assertEqual(StoredEntity(b"ON", "digest", True), store.load("a"))
+        self.assertIsNone(store.load("b"))
+        self.assertEqual(1, len(store))
+        store.close()
+
+    def test_timed_flush(self):
+        store = StateStore(self.path, flush_interval=0.05)
+        store.save_state("sw", b"on")
+        store.flush()
+        store.save_state("sw", b"off")
+        # no later change arrives, the timer writes the pending one
+        time.sleep(0.3)
+        crashed = StateStore(self.path)
+        self.assertEqual(b"off", crashed.load("sw").state)
+        crashed.close()
+        store.close()
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_switch_restart(self, mocked_client):
+        client = mocked_client('test')
+        store, switch = self.start(MqttSwitch, client)
+        switch.set_on()
+        store.close()
+
+        client.reset_mock()
+        store, switch = self.start(MqttSwitch, client)
+        topics = [c.args[0] for c in client.publish.call_args_list]
+        # neither the unchanged config nor the state are sent again, the switch stays on
+        self.assertEqual([switch.avail_topic], topics)
+        self.assertTrue(switch.state)
+
+        switch.delete()
+        store.close()
+        self.assertIsNone(StateStore(self.path).load("store_test"))
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_sensor_restart(self, mocked_client):
+        client = mocked_client('test')
+        store, sensor = self.start(MqttSensor, client, util.HaSensorDeviceClass.POWER, "W", True)
+        sensor.update_state(100)
+        store.close()
+
+        client.reset_mock()
+        store, sensor = self.start(MqttSensor, client, util.HaSensorDeviceClass.POWER, "W", True)
+        sensor.suppress_duplicates = True
+        sensor.update_state(100)
+        sensor.update_state(101)
+        self.assertEqual([101], [c.args[1] for c in client.publish.call_args_list if c.args[0] == sensor.state_topic])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
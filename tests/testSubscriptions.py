@@ -0,0 +1,84 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import unittest
+import unittest.mock as mock
+
+from ha_mqtt.discovery import start_all
+from ha_mqtt.ha_device import HaDevice
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.subscriptions import SubscriptionManager
+
+
+class TestSubscriptions(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_batch(self, mocked_client):
+        client = mocked_client('test')
+        manager = SubscriptionManager(client, max_topics=15)
+        switches = [MqttSwitch(MqttDeviceSettings(f"sw{i}", f"batched_{i}", manager)) for i in range(10)]
+
+        start_all(switches)
+        # 10 state and 10 command topics in two packets
+        self.assertEqual(2, client.subscribe.call_count)
+        self.assertEqual(15, len(client.subscribe.call_args_list[0].args[0]))
+        self.assertEqual(20, len(manager.subscriptions))
+
+        with manager.batch():
+            for sw in switches:
+                sw.stop()
+        self.assertEqual(2, client.unsubscribe.call_count)
+        self.assertEqual(15, len(client.unsubscribe.call_args_list[0].args[0]))
+        self.assertFalse(manager.subscriptions)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_reference_counting(self, mocked_client):
+        client = mocked_client('test')
+        manager = SubscriptionManager(client)
+
+        manager.subscribe("shared")
+        manager.subscribe("shared")
+        client.subscribe.assert_called_once_with([("shared", 0)])
+
+        manager.unsubscribe("shared")
+        client.unsubscribe.assert_not_called()
+        manager.unsubscribe("shared")
+        client.unsubscribe.assert_called_once_with(["shared"])
+
+        # subscribing and unsubscribing within one batch doesn't send anything
+        with manager.batch():
+            manager.subscribe("temporary")
+            manager.unsubscribe("temporary")
+        self.assertEqual(1, client.subscribe.call_count)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_started_twice(self, mocked_client):
+        client = mocked_client('test')
+        manager = SubscriptionManager(client)
+        switch = MqttSwitch(MqttDeviceSettings("sw", "started_twice", manager))
+        switch.start()
+        switch.start()
+        switch.stop()
+        self.assertFalse(manager.subscriptions)
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_grouped_state(self, mocked_client):
+        for client in (mocked_client('test'), SubscriptionManager(mocked_client('test'))):
+            device = HaDevice("Group", f"grouped_subs_{type(client).__name__}", grouped_state=True)
+            switches = [MqttSwitch(MqttDeviceSettings(f"sw{i}", f"grouped_{type(client).__name__}_{i}",
+                                                      client, device)) for i in range(2)]
+            start_all(switches)
+            topic = switches[0].state_topic
+            upstream = client._client if isinstance(client, SubscriptionManager) else client
+
+            def unsubscribed():
+                calls = [c.args[0] for c in upstream.unsubscribe.call_args_list]
+                return [sub for topics in calls for sub in ([topics] if isinstance(topics, str) else topics)]
+
+            switches[0].stop()
+            self.assertNotIn(topic, unsubscribed())
+            switches[1].stop()
+            self.assertIn(topic, unsubscribed())
+            if isinstance(client, SubscriptionManager):
+                self.assertFalse(client.subscriptions)
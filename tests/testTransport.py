@@ -0,0 +1,103 @@
+#  Copyright (c) 2024 - Andreas Philipp
+#  This code is published under the MIT license
+
+import asyncio
+import threading
+import unittest
+import unittest.mock as mock
+from concurrent.futures import Future
+
+from ha_mqtt import util
+from ha_mqtt.discovery import start_all
+from ha_mqtt.loopback import LoopbackBroker
+from ha_mqtt.mqtt_async import ThreadsafeTransport
+from ha_mqtt.mqtt_device_base import MqttDeviceSettings
+from ha_mqtt.mqtt_switch import MqttSwitch
+from ha_mqtt.transport import FutureInfo, PahoTransport
+
+
+class FakeTransport:
+    def __init__(self):
+        self.publish = mock.AsyncMock()
+        self.subscribe = mock.AsyncMock()
+        self.unsubscribe = mock.AsyncMock()
+        self.callbacks = {}
+
+    def add_callback(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def remove_callback(self, topic):
+        self.callbacks.pop(topic, None)
+
+
+class TestTransport(unittest.TestCase):
+
+    @mock.patch('paho.mqtt.client.Client')
+    def test_paho(self, mocked_client):
+        client = mocked_client('test')
+        on_publish = client.on_publish
+        client.publish.return_value.rc = 0
+        client.publish.return_value.mid = 5
+        client.publish.return_value.is_published.return_value = False
+        transport = PahoTransport(client)
+
+        future = transport.publish_future("topic", "payload", qos=1)
+        self.assertFalse(future.done())
+        client.on_publish(client, None, 5, 0, None)
+        self.assertTrue(future.done())
+        on_publish.assert_called_once_with(client, None, 5, 0, None)
+
+        # ack arriving while the message is still being published
+        def publish(*args, **kwargs):
+            client.on_publish(client, None, 6, 0, None)
+            return mock.Mock(rc=0, mid=6, is_published=mock.Mock(return_value=False))
+        client.publish.side_effect = publish
+        self.assertTrue(transport.publish_future("topic").done())
+        self.assertEqual(0, transport.pending)
+
+        # ack arriving from the network thread after publish returned, before the future is registered
+        def is_published():
+            thread = threading.Thread(target=client.on_publish, args=(client, None, 7, 0, None))
+            thread.start()
+            thread.join()
+            return False
+        client.publish.side_effect = None
+        client.publish.return_value = mock.Mock(rc=0, mid=7, is_published=is_published)
+        self.assertTrue(transport.publish_future("topic").done())
+        self.assertEqual(0, transport.pending)
+
+        # acks of messages published without a future are not kept
+        client.on_publish(client, None, 8, 0, None)
+        self.assertEqual(set(), transport._early)
+
+    def test_cancelled(self):
+        # a cancelled message counts as not published, like a failed one
+        future = Future()
+        info = FutureInfo(future)
+        future.cancel()
+        self.assertFalse(info.is_published())
+        with self.assertRaises(RuntimeError):
+            info.wait_for_publish(1)
+
+    def test_loopback(self):
+        self.assertTrue(LoopbackBroker().client().publish_future("topic", "payload", qos=1).done())
+
+    def test_threadsafe(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        fake = FakeTransport()
+        try:
+            switch = MqttSwitch(MqttDeviceSettings("Switch", "threadsafe_switch", ThreadsafeTransport(fake, loop)))
+            done = threading.Event()
+            switch.callback_on = done.set
+            start_all([switch])
+            fake.publish.assert_any_await(switch.config_topic, switch.get_config_json(), 1, True)
+            fake.publish.assert_any_await(switch.state_topic, util.OFF, 0, True)
+
+            loop.call_soon_threadsafe(lambda: fake.callbacks[switch.cmd_topic](switch.cmd_topic, b"on"))
+            self.assertTrue(done.wait(1))
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()